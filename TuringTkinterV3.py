@@ -3,7 +3,12 @@ import tkinter.font as font
 from tkinter import ttk, filedialog, messagebox
 import json
 import simulator
+import engine
+import checkpoint
+import formats
 import re
+import threading
+from tapes import TapeDictionary
 
 # = Widget prefix naming convention =
 # d  - Frame (division)
@@ -12,6 +17,12 @@ import re
 # cd - Canvas frame (the frame that sits within a canvas)
 # b  - Button
 # e -  Entry
+# s -  Spinbox
+# k -  Checkbutton
+# p -  Progressbar
+
+MAX_TAPES = 8	# Maximum number of tapes that a machine can have (see multitape.py)
+IMPORT_POLL = 100	# Milliseconds between checks of a tape import's progress
 
 class Application(ttk.Notebook):
 	def __init__(self, master=None):
@@ -31,6 +42,11 @@ class Application(ttk.Notebook):
 		self.tapePos = 0			# Position of the cell at the center of the screen
 		self.tape = {}				# Contains the info about non-default tape cells 	key: 	position of tape (str)
 									#												  	value:	character at this position (str)
+		self.tapes = [self.tape]	# Tape dictionary of each tape (self.tape is the one shown on the tape tab)
+		self.startPositions = ['']	# Start position entered for each tape
+		self.tapeIndex = 0			# Index of the tape shown on the tape tab
+		self.tapeImport = None		# Progress and result of the tape being imported (NoneType if no tape is being imported)
+		self.binary = tk.BooleanVar(master, False)	# Whether machines and tapes are exported in the binary format (see formats.py)
 
 		# Initialise all tabs and all of their widgets
 		self.createTabs()
@@ -161,6 +177,9 @@ class Application(ttk.Notebook):
 		# Export button
 		bExport = tk.Button(dFile, text='Export Instructions', command=self.exportMachine)
 		bExport.pack(side='top', fill='x')
+		# Binary format checkbutton (shared with the tape tab)
+		kBinary = tk.Checkbutton(dFile, text='Binary Format', variable=self.binary)
+		kBinary.pack(side='top')
 
 		# Instruction buttons frame
 		dInstructionButton = tk.Frame(dInstructionScrollFrame)
@@ -199,6 +218,17 @@ class Application(ttk.Notebook):
 		w['eStartState'] = eStart = tk.Entry(dStart, width=5)
 		eStart.pack(side='left')
 
+		# Tape count control frame
+		dTapes = tk.Frame(dInput)
+		dTapes.pack(side='left', padx=(10, 0))
+
+		# Tape count label
+		lTapes = tk.Label(dTapes, text='Tapes:')
+		lTapes.pack(side='left')
+		# Tape count spinbox
+		w['sTapes'] = sTapes = tk.Spinbox(dTapes, from_=1, to=MAX_TAPES, width=3, state='readonly', command=self.updateTapeCount)
+		sTapes.pack(side='left')
+
 	# Initialises all widgets for the tape tab
 	def tapeTabWidgets(self, tab):
 		w = self.widgets
@@ -229,6 +259,14 @@ class Application(ttk.Notebook):
 		# Export button
 		bExport = tk.Button(dFileButtons, text='Export Tape', command=self.exportTape)
 		bExport.pack(side='top', fill='x')
+		# Import checkpoint button
+		bCheckpoint = tk.Button(dFileButtons, text='Import Checkpoint', command=self.importCheckpoint)
+		bCheckpoint.pack(side='top', fill='x')
+		# Binary format checkbutton (shared with the machine tab)
+		kBinary = tk.Checkbutton(dFileButtons, text='Binary Format', variable=self.binary)
+		kBinary.pack(side='top')
+		# Import progress bar (only shown while a tape is being imported)
+		w['pImport'] = ttk.Progressbar(dFileButtons, maximum=1, length=100)
 
 		# Cells frame
 		w['dCells'] = dCells = tk.Frame(dTape)
@@ -295,6 +333,17 @@ class Application(ttk.Notebook):
 		w['eBlank'] = eBlank = tk.Entry(dBlank, width=5)
 		eBlank.pack(side='left')
 
+		# Tape selector frame (for multi-tape machines)
+		dSelect = tk.Frame(dInput)
+		dSelect.pack(side='right')
+
+		# Tape selector label
+		lSelect = tk.Label(dSelect, text='Tape:')
+		lSelect.pack(side='left')
+		# Tape selector spinbox
+		w['sTape'] = sTape = tk.Spinbox(dSelect, from_=1, to=1, width=3, state='readonly', command=self.selectTape)
+		sTape.pack(side='left')
+
 		# Generate the tape character entry widgets (the dynamic aspect of the tab)
 		self.generateTapeWidgets()
 
@@ -474,6 +523,9 @@ class Application(ttk.Notebook):
 		w = self.widgets
 		i = self.instructionRows
 
+		# Parts of multi-tape instructions (lists with one entry per tape) are entered as comma-separated values
+		data = [joinParts(part) if isinstance(part, list) else part for part in data]
+
 		# Get the instruction canvas frame
 		frame = w['cdInstruction']
 
@@ -678,6 +730,8 @@ class Application(ttk.Notebook):
 			return
 
 		self.tape = {}						# Initialise tape dictionary
+		self.tapes[self.tapeIndex] = self.tape
+		self.startPositions[self.tapeIndex] = ''
 		self.tapePos = 0					# Initialise tape position
 		setEntry(w['eStartPosition'], '')	# Clear start position entry box
 		setEntry(w['eBlank'], '')			# Clear blank character entry box
@@ -690,6 +744,9 @@ class Application(ttk.Notebook):
 		c = self.tapeCells
 		t = self.tape
 
+		# Store the start position of the tape
+		self.startPositions[self.tapeIndex] = self.widgets['eStartPosition'].get()
+
 		# For every tape cell entry box on screen:
 		for index in list(c.keys()):
 			entry = c[index]			# Get the entry box object
@@ -719,6 +776,53 @@ class Application(ttk.Notebook):
 
 			setEntry(eGoto, '')			# Clear the entry box
 
+	# Returns the number of tapes that the machine has
+	def getTapeCount(self):
+		return int(self.widgets['sTapes'].get())
+
+	# Adds blank tapes or removes tapes from the end so that there are the given number of tapes
+	def setTapeCount(self, count):
+		w = self.widgets
+
+		while len(self.tapes) < count:
+			self.tapes.append({})
+			self.startPositions.append('')
+		del self.tapes[count:], self.startPositions[count:]
+
+		setSpinbox(w['sTapes'], str(count))	# Set tape count spinbox
+		w['sTape'].config(to=count)			# Limit tape selector
+
+		# If the tape that was shown has been removed:
+		if self.tapeIndex >= count:
+			self.showTape(count-1)
+
+	# Called when the tape count spinbox is changed
+	def updateTapeCount(self):
+		self.updateTapeData()	# Store any edits made to the tape shown
+		self.setTapeCount(self.getTapeCount())
+
+	# Called when the tape selector is changed
+	def selectTape(self):
+		self.updateTapeData()	# Store any edits made to the tape shown
+		self.showTape(int(self.widgets['sTape'].get()) - 1)
+
+	# Shows the tape with the given index on the tape tab
+	def showTape(self, index):
+		w = self.widgets
+
+		self.tapeIndex = index
+		self.tape = self.tapes[index]
+		startPos = self.startPositions[index]
+		setEntry(w['eStartPosition'], startPos)		# Set start position entry
+		setSpinbox(w['sTape'], str(index+1))		# Set tape selector
+
+		if isInt(startPos):							# If the start position is an integer:
+			self.tapePos = int(startPos)			# Set the tape position to the start position
+		else:										# Otherwise:
+			self.tapePos = 0						# Set the tape position to 0
+
+		self.generateTapeWidgets()
+
 	# Restores the default settings in the execute tab
 	def restoreDefaultSettings(self):
 		w = self.widgets
@@ -741,13 +845,16 @@ class Application(ttk.Notebook):
 		w = self.widgets
 
 		# Open the operating system's file explorer
-		file = filedialog.askopenfile(mode='r', filetypes =(('Machine Files', '*.machine'),))
-		if file is not None:					# If user actually selected a file (and did not close the file explorer)
-			data = json.load(file)				# Load JSON data from the file
+		path = filedialog.askopenfilename(filetypes =(('Machine Files', '*.machine'),))
+		if path:								# If user actually selected a file (and did not close the file explorer)
+			data = formats.loadMachineData(path)	# Load the file (in either the JSON or the binary format)
 			instructions = data['instructions']	# Get instructions
 			acceptStates = data['acceptStates']	# Get accept states
 			startState = data['startState']		# Get start state
+			count = data.get('tapes', 1)		# Get number of tapes
 
+			self.updateTapeData()				# Store any edits made to the tape shown
+			self.setTapeCount(count)			# Add or remove tapes
 			self.setInstructions(instructions)	# Creates instruction rows
 			self.setAcceptStates(acceptStates)	# Creates accept state rows
 
@@ -763,56 +870,160 @@ class Application(ttk.Notebook):
 		instructions = self.getInstructions()	# Get all instructions
 		acceptStates = self.getAcceptStates()	# Get all accept states
 		startState = w['eStartState'].get()		# Get start state
+		count = self.getTapeCount()				# Get number of tapes
+
+		if self.binary.get():					# If exporting in the binary format:
+			self.exportBinaryMachine(instructions, acceptStates, startState, count)
+			return
 
 		# Open the operating system's file explorer
 		file = filedialog.asksaveasfile(filetypes=(('Machine Files', '*.machine'),), defaultextension='.machine')
 		if not file is None:												# If user actually selected a file (and did not close the file explorer)
-			json.dump({'instructions':instructions,							# Compose dictionary and dump into json file
-			'acceptStates':acceptStates, 'startState':startState}, file)
+			data = {'instructions':instructions,							# Compose dictionary
+			'acceptStates':acceptStates, 'startState':startState}
+			if count > 1:													# Single-tape machines are saved without a tape count
+				data['tapes'] = count
+			json.dump(data, file)											# Dump into json file
 			file.close()
 
+	# Exports the given machine to an external file in the binary format (see formats.py)
+	def exportBinaryMachine(self, instructions, acceptStates, startState, count):
+		# Only valid instructions can be encoded
+		valid, errorCell = checkInstructions(instructions, count)
+		if not valid:
+			messagebox.showwarning('Invalid Configuration', 'Instructions must be valid to be exported in the binary format (check row '+str(errorCell[0])+').')
+			return
+
+		# Open the operating system's file explorer
+		path = filedialog.asksaveasfilename(filetypes=(('Machine Files', '*.machine'),), defaultextension='.machine')
+		if path:								# If user actually selected a file (and did not close the file explorer)
+			formats.saveBinaryMachine(path, instructions, acceptStates, startState, count)
+
 	# Imports a tape from an external file
+	# (the file is read on a separate thread, straight into an array-backed tape, so that large tapes do not freeze
+	# the editor, and the progress is shown below the file buttons)
 	def importTape(self):
 		w = self.widgets
 
+		if self.tapeImport is not None:				# If a tape is already being imported:
+			return
+
 		# Open the operating system's file explorer
-		file = filedialog.askopenfile(mode='r', filetypes =(('Tape Files', '*.tape'),))
-		if file is not None:						# If user actually selected a file (and did not close the file explorer)
-			data = json.load(file)					# Load JSON data from the file
-			tape = data['tape']						# Get tape data
-			startPos = data['startPos']				# Get start position
-			blankChar = data['blankChar']			# Get blank character
-
-			self.tape = tape						# Set tape dictionary
-			setEntry(w['eStartPosition'], startPos)	# Set start position entry
-			setEntry(w['eBlank'], blankChar)		# Set blank character entry
-
-			if isInt(startPos):						# If the start position is an integer:
-				self.tapePos = int(startPos)		# Set the tape position to the start position
-			else:									# Otherwise:
-				self.tapePos = 0					# Set the tape position to 0
+		path = filedialog.askopenfilename(filetypes =(('Tape Files', '*.tape'),))
+		if path:									# If user actually selected a file (and did not close the file explorer)
+			self.tapeImport = {'progress':0, 'data':None, 'error':None}
+			thread = threading.Thread(target=readTape, args=(path, self.tapeImport), daemon=True)
+			thread.start()
+
+			w['pImport']['value'] = 0				# Show the progress bar
+			w['pImport'].pack(side='top', fill='x')
+			self.after(IMPORT_POLL, self.pollTapeImport, thread)
+
+	# Shows the progress of the tape being imported, and sets the tape once the file has been read
+	def pollTapeImport(self, thread):
+		w = self.widgets
+		state = self.tapeImport
+
+		w['pImport']['value'] = state['progress']	# Update the progress bar
+		if thread.is_alive():						# If the file is still being read:
+			self.after(IMPORT_POLL, self.pollTapeImport, thread)
+			return
+
+		w['pImport'].pack_forget()					# Hide the progress bar
+		self.tapeImport = None
+
+		if state['error'] is not None:				# If the file could not be read:
+			messagebox.showwarning('Invalid Tape', str(state['error']))
+			return
+
+		data = state['data']
+		tape = TapeDictionary(data['tape'])			# Get tape data (kept array-backed)
+		startPos = data['startPos']					# Get start position
+		blankChar = data['blankChar']				# Get blank character
+		others = data.get('otherTapes', [])			# Get the other tapes of a multi-tape machine
+
+		self.tapes = [tape] + [other['tape'] for other in others]						# Set tape dictionaries
+		self.startPositions = [startPos] + [other['startPos'] for other in others]		# Set start positions
+		setEntry(w['eBlank'], blankChar)			# Set blank character entry
 
+		self.setTapeCount(max(self.getTapeCount(), len(self.tapes)))	# Add blank tapes if the machine has more tapes
+		self.showTape(0)							# Show the first tape
+
+	# Imports the configuration saved in a checkpoint file (see checkpoint.py) as the tape, start position and start state,
+	# so that the simulation starts from exactly where the checkpointed run was
+	def importCheckpoint(self):
+		w = self.widgets
+
+		# Open the operating system's file explorer
+		path = filedialog.askopenfilename(filetypes =(('Checkpoint Files', '*.checkpoint'), ('All Files', '*.*')))
+		if path:									# If user actually selected a file (and did not close the file explorer)
+			if self.getTapeCount() > 1:				# Checkpoints are only saved from single-tape machines
+				messagebox.showwarning('Invalid Checkpoint', 'Checkpoints can only be imported for single-tape machines.')
+				return
+
+			try:
+				data = checkpoint.loadCheckpoint(path)	# Load the checkpoint
+			except (OSError, ValueError) as error:
+				messagebox.showwarning('Invalid Checkpoint', str(error))
+				return
+
+			# Warn if the checkpoint was not saved from the machine currently entered
+			instructions = engine.Instructions(self.getInstructions())
+			if data['fingerprint'] != checkpoint.getFingerprint(instructions, self.getAcceptStates()):
+				messagebox.showwarning('Different Machine', 'The checkpoint was saved from a different machine (import its instructions before running it).')
+
+			tape = data['tape']
+			self.tape = self.tapes[0] = TapeDictionary(tape)	# Set tape dictionary
+			setEntry(w['eStartPosition'], str(data['pos']))	# Set start position entry
+			setEntry(w['eBlank'], tape.getBlank())	# Set blank character entry
+			setEntry(w['eStartState'], data['state'])	# Set start state entry
+
+			self.tapePos = data['pos']				# Set the tape position to the head position
 			self.generateTapeWidgets()
 
 	# Reads entered data and exports the tape to an external file
 	def exportTape(self):
 		w = self.widgets
 
-		startPos = w['eStartPosition'].get()	# Get start position
 		blankChar = w['eBlank'].get()			# Get blank character
 
-		self.updateTapeData()	# Store any edits made to the tape
+		self.updateTapeData()	# Store any edits made to the tape (and its start position)
+
+		if self.binary.get():	# If exporting in the binary format:
+			self.exportBinaryTape(blankChar)
+			return
 
 		# Open the operating system's file explorer
 		file = filedialog.asksaveasfile(filetypes=(('Tape Files', '*.tape'),), defaultextension='.tape')
-		if not file is None:									# If user actually selected a file (and did not close the file explorer)
-			json.dump({'tape':self.tape, 'startPos':startPos,	# Compose dictionary and dump into json file
-			'blankChar':blankChar}, file)
+		if not file is None:													# If user actually selected a file (and did not close the file explorer)
+			data = {'tape':dict(self.tapes[0]), 'startPos':self.startPositions[0],	# Compose dictionary
+			'blankChar':blankChar}
+			if len(self.tapes) > 1:												# Add the other tapes of a multi-tape machine
+				data['otherTapes'] = [{'tape':dict(tape), 'startPos':startPos} for tape, startPos in zip(self.tapes[1:], self.startPositions[1:])]
+			json.dump(data, file)												# Dump into json file
 			file.close()
 
+	# Exports the first tape to an external file in the binary format (see formats.py - the other tapes of a
+	# multi-tape machine can only be saved in the JSON format)
+	def exportBinaryTape(self, blankChar):
+		if len(self.tapes) > 1:
+			messagebox.showwarning('Multi-Tape Machine', 'Only the first tape is exported in the binary format.')
+
+		# Open the operating system's file explorer
+		path = filedialog.asksaveasfilename(filetypes=(('Tape Files', '*.tape'),), defaultextension='.tape')
+		if path:								# If user actually selected a file (and did not close the file explorer)
+			try:
+				startPos = int(self.startPositions[0] or 0)
+			except ValueError:
+				messagebox.showwarning('Invalid Configuration', 'Start position must be an integer.')
+				return
+
+			formats.saveBinaryTape(path, self.tapes[0], startPos, blankChar)
+
 	# Reads all entered instructions and compiles them into a list
 	def getInstructions(self):
 		i = self.instructionRows
+		count = self.getTapeCount()
 
 		instructions = []
 
@@ -835,6 +1046,11 @@ class Application(ttk.Notebook):
 
 					instruction.append(value)
 
+			# Split the read, write and direction parts of multi-tape instructions into one entry per tape
+			if count > 1:
+				for n in (1, 2, 3):
+					instruction[n] = splitParts(instruction[n])
+
 			instructions.append(instruction)
 
 		return instructions
@@ -881,7 +1097,8 @@ class Application(ttk.Notebook):
 		self.updateTapeData()
 
 		instructions = self.getInstructions()				# Get instructions
-		valid, errorCell = checkInstructions(instructions)	# Check instructions
+		count = self.getTapeCount()							# Get number of tapes
+		valid, errorCell = checkInstructions(instructions, count)	# Check instructions
 
 		# If the instructions are invalid:
 		if not valid:
@@ -923,19 +1140,23 @@ class Application(ttk.Notebook):
 			self.select(x['xMachine'])
 			return
 
-		tape = self.tape
+		tapes = self.tapes
 
-		# Get start position
-		startPos = w['eStartPosition'].get()
-		#If start position is not an integer:
-		if not isInt(startPos):
-			# Display an error message
-			messagebox.showwarning('Invalid Configuration', 'Starting tape position must be an integer.')
-			# Take user to the tape tab
-			self.select(x['xTape'])
-			return
+		# For the start position of each tape:
+		for n, startPos in enumerate(self.startPositions):
+			#If start position is not an integer:
+			if not isInt(startPos):
+				# Display an error message
+				if count > 1:
+					messagebox.showwarning('Invalid Configuration', 'Starting position of tape '+str(n+1)+' must be an integer.')
+				else:
+					messagebox.showwarning('Invalid Configuration', 'Starting tape position must be an integer.')
+				# Take user to the tape tab (showing the tape)
+				self.showTape(n)
+				self.select(x['xTape'])
+				return
 
-		startPos = int(startPos)	# Convert start position to an integer
+		startPositions = [int(startPos) for startPos in self.startPositions]	# Convert start positions to integers
 
 		# Get blank character
 		blankChar = w['eBlank'].get()
@@ -996,18 +1217,46 @@ class Application(ttk.Notebook):
 		FPS = int(FPS)	# Convert FPS to an integer
 
 		# Run the simulation
-		simulator.run(instructions, acceptStates, startState, tape, startPos, blankChar, (width, height), cellSize, speed, FPS)
+		if count > 1:
+			simulator.runMulti(instructions, acceptStates, startState, tapes, startPositions, blankChar, (width, height), cellSize, speed, FPS)
+		else:
+			simulator.run(instructions, acceptStates, startState, tapes[0], startPositions[0], blankChar, (width, height), cellSize, speed, FPS)
 
 # Takes a tag and applies it to all given widgets
 def tagUp(tag, *args):
 	for widget in args:
 		widget.bindtags((tag,) + widget.bindtags())
 
+# Reads a tape file into the given import state (runs on the import thread, so it must not use any widgets)
+def readTape(path, state):
+	try:
+		state['data'] = formats.streamTapeData(path, lambda fraction: state.update(progress=fraction))
+	except (OSError, ValueError) as error:
+		state['error'] = error
+
 # Sets the contents of the given entry box to the given string
 def setEntry(entry, text):
 	entry.delete(0, 'end')
 	entry.insert(0, text)
 
+# Sets the value of the given (read-only) spinbox to the given string
+def setSpinbox(spinbox, text):
+	spinbox.config(state='normal')
+	setEntry(spinbox, text)
+	spinbox.config(state='readonly')
+
+# Joins the entries of a multi-tape instruction part (one per tape) into comma-separated values (blank cells are empty)
+def joinParts(part):
+	return ','.join('' if char is None else char for char in part)
+
+# Splits comma-separated values entered for a multi-tape instruction part into one entry per tape
+# (empty values are blank cells)
+def splitParts(value):
+	if value is None:
+		return [None]
+
+	return [char if char else None for char in value.split(',')]
+
 # Checks if the given string is a valid integer
 def isInt(string, allowNegative=True, allowZero=True):
 	# If zero not allowed and string is zero of some form:
@@ -1034,7 +1283,9 @@ def isFloat(string, allowZero=True):
 # = Format of return value =
 # If all instructions valid: 			(True, None)
 # If at least one instruction invalid:	(False, (invalid instruction row number, index of column of invalid instruction part))
-def checkInstructions(instructions):
+#
+# For multi-tape machines (tapes > 1), the read, write and direction parts must be lists with one entry per tape
+def checkInstructions(instructions, tapes=1):
 	# For every instruction in the list:
 	for h, instruction in enumerate(instructions):
 		# For every part of the current instruction:
@@ -1043,8 +1294,15 @@ def checkInstructions(instructions):
 				if not part:					# If blank:
 					return (False, (h+1, i))
 
+			if tapes > 1 and i in (1, 2, 3):	# If the current part has one entry per tape:
+				if len(part) != tapes:			# If the wrong number of entries:
+					return (False, (h+1, i))
+
 			if i == 3:							# If the current part is the direction:
-				if not part in ['l', 'r']:		# If not left or right:
+				if tapes > 1:
+					if not all(d in ['l', 'r', 's'] for d in part):	# If not left, right or stay:
+						return (False, (h+1, i))
+				elif not part in ['l', 'r']:	# If not left or right:
 					return (False, (h+1, i))
 
 	return (True, None)
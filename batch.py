@@ -0,0 +1,155 @@
+import numpy as np
+from engine import Instructions, loadMachine, loadTape
+from tapes import ArrayTape
+from compiler import compileMachine, CONTINUE, ACCEPT, CRASH
+
+# Halt reason for each lane halt code
+HALTS = {0:None, 1:'accept', 2:'crash', 3:'limit'}
+
+# Batch class - runs one machine on many tapes in lockstep using vectorised NumPy operations
+#
+# Every tape is a row (lane) of one 2D array of symbol codes. Column c of the array holds tape
+# position c - origin for every lane, and the array is padded on either side whenever a head
+# reaches its edge. Each step of the batch does one step of every lane that is still running,
+# using the same rules as simulator.Machine (and engine.Engine).
+class Batch:
+    def __init__(self, instructions, acceptStates, startState, tapes):
+        # Intern the symbols of all tapes into one shared symbol table
+        self.symbolTable = symbolTable = ArrayTape('')
+        for definition, startPos in tapes:
+            for char in definition.values():
+                symbolTable.intern(char)
+
+        # Compile the machine using the shared symbols
+        self.compiled = compiled = compileMachine(instructions, acceptStates, startState, symbolTable)
+        self.writes = np.asarray(compiled.writes, dtype=np.intp)
+        self.moves = np.asarray(compiled.moves, dtype=np.intp)
+        self.nexts = np.asarray(compiled.nexts, dtype=np.intp)
+        self.outcomes = np.asarray(compiled.outcomes, dtype=np.intp)
+
+        # Find the extent of all tapes (including the start positions)
+        positions = [startPos for definition, startPos in tapes]
+        for definition, startPos in tapes:
+            positions.extend(int(pos) for pos in definition)
+        low = min(positions, default=0)
+        high = max(positions, default=0)
+        margin = max(16, high-low+1)                            # Free cells either side of the initial extent
+
+        lanes = len(tapes)
+        self.origin = margin - low                              # Column of position 0
+        self.cells = np.zeros((lanes, high-low+1 + 2*margin), dtype=np.uint16)
+
+        # Fill in the tapes
+        codes = symbolTable.codes
+        for lane, (definition, startPos) in enumerate(tapes):
+            for pos, char in definition.items():
+                self.cells[lane, int(pos) + self.origin] = codes[char]
+
+        self.heads = np.array(positions[:lanes], dtype=np.intp)                         # Head position of each lane
+        self.states = np.full(lanes, compiled.stateCodes[startState], dtype=np.intp)    # State code of each lane
+        self.steps = np.zeros(lanes, dtype=np.int64)                                    # Number of completed steps of each lane
+        self.halts = np.zeros(lanes, dtype=np.int8)                                     # Halt code of each lane (see HALTS)
+
+    # Pads the tape array so that it has at least the given number of extra columns on the left and right
+    def pad(self, left, right):
+        lanes, width = self.cells.shape
+        left = max(left, width) if left else 0      # Grow by at least doubling
+        right = max(right, width) if right else 0
+
+        cells = np.zeros((lanes, width + left + right), dtype=self.cells.dtype)
+        cells[:, left:left+width] = self.cells
+        self.cells = cells
+        self.origin += left
+
+    # Runs every lane until it halts or until maxSteps more steps have been executed (None for no limit)
+    def run(self, maxSteps=None):
+        width = self.compiled.width
+        writes, moves, nexts, outcomes = self.writes, self.moves, self.nexts, self.outcomes
+
+        lanes = np.flatnonzero((self.halts == 0) | (self.halts == 3))   # Indices of the lanes that have not halted
+        heads = self.heads[lanes]                                       # Compacted copies of the running lanes' attributes
+        states = self.states[lanes]
+        steps = self.steps[lanes]
+        n = 0
+
+        while lanes.size and n != maxSteps:
+            # Make sure that every head is on the tape array
+            columns = heads + self.origin
+            low = columns.min()
+            high = columns.max()
+            if low < 0 or high >= self.cells.shape[1]:
+                self.pad(max(0, -low), max(0, high - self.cells.shape[1] + 1))
+                columns = heads + self.origin
+
+            # Look up the transitions of every running lane
+            t = states*width + self.cells[lanes, columns]
+            outcome = outcomes[t]
+            moving = outcome == CONTINUE
+
+            # Lanes with no defined transition crash without writing
+            if not moving.all():
+                crashed = outcome == CRASH
+                self.halts[lanes[crashed]] = 2
+                self.heads[lanes[crashed]] = heads[crashed]
+                self.states[lanes[crashed]] = states[crashed]
+                self.steps[lanes[crashed]] = steps[crashed]
+
+                # Lanes entering an accept state write and change state without moving
+                accepted = outcome == ACCEPT
+                if accepted.any():
+                    t2 = t[accepted]
+                    self.cells[lanes[accepted], columns[accepted]] = writes[t2]
+                    self.halts[lanes[accepted]] = 1
+                    self.heads[lanes[accepted]] = heads[accepted]
+                    self.states[lanes[accepted]] = nexts[t2]
+                    self.steps[lanes[accepted]] = steps[accepted] + 1
+
+                # Drop the halted lanes
+                lanes, heads, states, steps = lanes[moving], heads[moving], states[moving], steps[moving]
+                columns, t = columns[moving], t[moving]
+
+            # Write, change state and move the head of every remaining lane
+            self.cells[lanes, columns] = writes[t]
+            states = nexts[t]
+            heads = heads + moves[t]
+            steps = steps + 1
+            n += 1
+
+        # Store the configurations of the lanes that are still running
+        self.heads[lanes] = heads
+        self.states[lanes] = states
+        self.steps[lanes] = steps
+        self.halts[lanes] = 3
+
+        return self.getResults()
+
+    # Returns a list with a dictionary describing the configuration of each lane (as engine.Engine.getResult does)
+    def getResults(self):
+        symbols = self.symbolTable.symbols
+        stateNames = self.compiled.stateNames
+        results = []
+
+        for lane in range(self.cells.shape[0]):
+            columns = np.flatnonzero(self.cells[lane])
+            tape = {str(int(c) - self.origin):symbols[self.cells[lane, c]] for c in columns}
+
+            results.append({
+            'tape':tape,
+            'pos':int(self.heads[lane]),
+            'state':stateNames[self.states[lane]],
+            'steps':int(self.steps[lane]),
+            'halt':HALTS[int(self.halts[lane])]
+            })
+
+        return results
+
+# Runs the given machine file on every one of the given tape files in lockstep
+def runBatchFiles(machinePath, tapePaths, maxSteps=None):
+    instructions, acceptStates, startState = loadMachine(machinePath)
+
+    tapes = []
+    for path in tapePaths:
+        tape, startPos, blankChar = loadTape(path)
+        tapes.append((tape, startPos))
+
+    return Batch(Instructions(instructions), acceptStates, startState, tapes).run(maxSteps)
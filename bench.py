@@ -0,0 +1,269 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+from engine import Engine, Instructions, Tape, loadMachine
+from tapes import ArrayTape, RunLengthTape
+from macro import MacroEngine
+
+try:
+    import resource     # Not available on Windows
+except ImportError:
+    resource = None
+
+DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Benchmarks')   # Directory of the benchmark machines
+CHUNK = 1 << 20         # Number of steps run between checks of the timeout
+MIN_TIME = 0.05         # Runs shorter than this (in seconds) are too noisy for their rates to be compared
+BACKENDS = ['dict', 'array', 'codegen', 'sweep', 'macro', 'batch']
+
+# = Benchmarks =
+# Each benchmark runs one of the machines in the Benchmarks directory on tapes of several sizes (multiplied by
+# --scale), generated by its tape function:
+#   bb2 - bb5:      the 2-symbol busy beaver champions (the longest-running halting machines with 2 to 5 states),
+#                   on a blank tape (the size is ignored)
+#   counter:        counts a binary number down to zero (the machine from DemoProjects/Decreaser)
+#   unaryadd:       adds two unary numbers of the given size
+#   unarysub:       subtracts a unary number of the given size from one twice its size
+#   palindrome:     checks whether a string of a and b of the given size is a palindrome (it is)
+#
+# = Backends =
+#   dict:       engine.Engine with engine.Tape (the plain loop over the instruction dictionary)
+#   array:      engine.Engine with tapes.ArrayTape (the compiled transition table, or a transducer)
+#   codegen:    engine.Engine with tapes.ArrayTape, running generated code (see codegen.py)
+#   sweep:      engine.Engine with tapes.RunLengthTape (see sweep.py)
+#   macro:      macro.MacroEngine with blocks of 3 cells
+#   batch:      batch.Batch with a single lane
+#
+# = Results =
+# Every benchmark is run on every backend in a new process (one at a time, so that they do not compete), and
+# each result is a dictionary:
+#   benchmark, size, backend
+#   steps:      number of steps executed
+#   halt:       halt reason ('timeout' if the run took longer than the timeout)
+#   time:       seconds from the start of the run until it stopped (not including loading the machine and tape)
+#   rate:       steps per second
+#   peakMemory: peak resident memory of the process in bytes (NoneType if it cannot be measured)
+# Each run of the suite is appended to a JSON history file, so that the latest run can be compared with earlier ones.
+
+# Returns a blank tape and start position
+def blankTape(size):
+    return {}, 0
+
+# Returns a tape with the given number in binary to the left of the start position
+def binaryTape(size):
+    bits = bin(size)[2:]
+    return {str(i - len(bits)):bit for i, bit in enumerate(bits)}, 0
+
+# Returns a tape with two unary numbers of the given size separated by +
+def unaryAddTape(size):
+    return getStringTape('1'*size + '+' + '1'*size), 0
+
+# Returns a tape with a unary number twice the given size, a - and a unary number of the given size
+def unarySubtractTape(size):
+    return getStringTape('1'*(2*size) + '-' + '1'*size), 0
+
+# Returns a tape with a palindrome of a and b of the given size (the same one every time)
+def palindromeTape(size):
+    rng = random.Random(size)
+    half = ''.join(rng.choice('ab') for n in range(size//2))
+    middle = rng.choice('ab') if size % 2 else ''
+    return getStringTape(half + middle + half[::-1]), 0
+
+# Returns a tape dictionary with the given string from position 0
+def getStringTape(string):
+    return {str(pos):char for pos, char in enumerate(string)}
+
+# Name, machine file, tape function and sizes of each benchmark
+BENCHMARKS = [
+('bb2', 'bb2.machine', blankTape, [0]),
+('bb3', 'bb3.machine', blankTape, [0]),
+('bb4', 'bb4.machine', blankTape, [0]),
+('bb5', 'bb5.machine', blankTape, [0]),
+('counter', 'counter.machine', binaryTape, [1000, 10000, 100000]),
+('unaryadd', 'unaryadd.machine', unaryAddTape, [1000, 10000, 100000]),
+('unarysub', 'unarysub.machine', unarySubtractTape, [100, 300, 1000]),
+('palindrome', 'palindrome.machine', palindromeTape, [100, 300, 1000])
+]
+
+# Returns a function that runs the given backend on a machine and tape for up to a given number of steps,
+# and returns the total number of steps and the halt reason
+def createRunner(backend, instructions, acceptStates, startState, tape, startPos):
+    if backend == 'macro':
+        engine = MacroEngine(Instructions(instructions), ArrayTape('', tape), startState, acceptStates, startPos)
+        def advance(maxSteps):
+            result = engine.run(maxSteps)
+            return result['steps'], result['halt']
+        return advance
+
+    if backend == 'batch':
+        from batch import Batch     # Imported here so that the other backends' peak memory does not include NumPy
+        engine = Batch(Instructions(instructions), acceptStates, startState, [(tape, startPos)])
+        def advance(maxSteps):
+            result = engine.run(maxSteps)[0]
+            return result['steps'], result['halt']
+        return advance
+
+    tapeClass = {'dict':Tape, 'array':ArrayTape, 'codegen':ArrayTape, 'sweep':RunLengthTape}[backend]
+    engine = Engine(Instructions(instructions), tapeClass('', tape), startState, acceptStates, startPos)
+    engine.codegen = backend == 'codegen'
+    def advance(maxSteps):
+        halt = engine.advance(maxSteps)
+        return engine.steps, halt
+    return advance
+
+# Returns the peak resident memory of the process in bytes, or NoneType
+def getPeakMemory():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024   # Bytes on macOS, kilobytes elsewhere
+
+# Runs one benchmark on one backend (in a worker process) and returns its result
+def runBenchmark(name, size, backend, maxSteps, timeout):
+    name, machine, tapeFunction, sizes = next(benchmark for benchmark in BENCHMARKS if benchmark[0] == name)
+    instructions, acceptStates, startState = loadMachine(os.path.join(DIRECTORY, machine))
+    tape, startPos = tapeFunction(size)
+    advance = createRunner(backend, instructions, acceptStates, startState, tape, startPos)
+
+    start = time.perf_counter()
+    steps = 0
+    while True:
+        chunk = CHUNK if maxSteps is None else min(CHUNK, maxSteps - steps)
+        steps, halt = advance(chunk)
+
+        if halt != 'limit' or steps == maxSteps:
+            break
+        if timeout is not None and time.perf_counter() - start >= timeout:
+            halt = 'timeout'
+            break
+    elapsed = time.perf_counter() - start
+
+    return {
+    'benchmark':name,
+    'size':size,
+    'backend':backend,
+    'steps':steps,
+    'halt':halt,
+    'time':round(elapsed, 6),
+    'rate':steps / elapsed if elapsed > 0 else None,
+    'peakMemory':getPeakMemory()
+    }
+
+# Runs the selected benchmarks on the selected backends, each in a new process, calling output with each result
+# Returns the list of results
+def runSuite(output, names=None, backends=BACKENDS, scale=1, maxSteps=None, timeout=None):
+    jobs = []
+    for name, machine, tapeFunction, sizes in BENCHMARKS:
+        if names and name not in names:
+            continue
+        for size in sizes:
+            size = round(size * scale)
+            jobs.extend((name, size, backend, maxSteps, timeout) for backend in backends)
+
+    # A new process for every job, so that each peak memory figure only covers its own run
+    results = []
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        for job in jobs:
+            result = pool.apply(runBenchmark, job)
+            output(result)
+            results.append(result)
+
+    return results
+
+# Loads a history file (a dictionary with a list of runs, oldest first), or returns an empty history if there is none
+def loadHistory(path):
+    if not os.path.exists(path):
+        return {'runs':[]}
+
+    with open(path, 'r') as file:
+        return json.load(file)
+
+# Appends a run of the suite to a history file
+def saveRun(path, results, options):
+    history = loadHistory(path)
+    history['runs'].append({
+    'date':time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'python':platform.python_version(),
+    'platform':platform.platform(),
+    'options':options,
+    'results':results
+    })
+
+    with open(path, 'w') as file:
+        json.dump(history, file, indent=1)
+
+# Compares the results of two runs, and returns a list of regressions: every result whose rate dropped or whose
+# peak memory grew by more than the threshold (as a fraction), or whose halt reason changed
+def compareRuns(baseline, latest, threshold=0.1):
+    previous = {(r['benchmark'], r['size'], r['backend']):r for r in baseline['results']}
+    regressions = []
+
+    for result in latest['results']:
+        key = (result['benchmark'], result['size'], result['backend'])
+        old = previous.get(key)
+        if old is None:
+            continue
+
+        changes = []
+        if result['halt'] != old['halt']:
+            changes.append(('halt', old['halt'], result['halt']))
+        if old['rate'] and result['rate'] is not None and min(old['time'], result['time']) >= MIN_TIME \
+                and result['rate'] < old['rate'] * (1 - threshold):
+            changes.append(('rate', old['rate'], result['rate']))
+        if old['peakMemory'] and result['peakMemory'] is not None and result['peakMemory'] > old['peakMemory'] * (1 + threshold):
+            changes.append(('peakMemory', old['peakMemory'], result['peakMemory']))
+
+        for metric, before, after in changes:
+            regression = {'benchmark':key[0], 'size':key[1], 'backend':key[2], 'metric':metric, 'baseline':before, 'latest':after}
+            if metric != 'halt':
+                regression['change'] = round(after / before - 1, 4)
+            regressions.append(regression)
+
+    return regressions
+
+# Usage: python bench.py run [options] / python bench.py compare [options] (see --help)
+# run prints each result as a line of JSON and appends the run to the history file, and compare prints the
+# regressions of the latest run as JSON (and exits with status 1 if there are any)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the engine backends on standard machines, and track regressions.')
+    parser.add_argument('--history', default='bench_history.json', help='JSON history file of benchmark runs')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run the benchmarks and append the results to the history')
+    run.add_argument('--only', nargs='+', choices=[b[0] for b in BENCHMARKS], help='benchmarks to run (default: all)')
+    run.add_argument('--backends', nargs='+', choices=BACKENDS, default=BACKENDS, help='backends to run (default: all)')
+    run.add_argument('--scale', type=float, default=1, help='multiplier for the tape sizes')
+    run.add_argument('--max-steps', type=int, default=10**8, help='step budget for each run')
+    run.add_argument('--timeout', type=float, default=60, help='seconds before a run is stopped')
+
+    compare = commands.add_parser('compare', help='compare the latest run with an earlier one')
+    compare.add_argument('--baseline', type=int, default=-2, help='index of the run to compare with (default: the one before the latest)')
+    compare.add_argument('--threshold', type=float, default=0.1, help='fraction by which a result must be worse to count as a regression')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        def output(result):
+            print(json.dumps(result), flush=True)
+
+        options = {'only':args.only, 'backends':args.backends, 'scale':args.scale, 'maxSteps':args.max_steps, 'timeout':args.timeout}
+        results = runSuite(output, args.only, args.backends, args.scale, args.max_steps, args.timeout)
+        saveRun(args.history, results, options)
+        return 0
+
+    runs = loadHistory(args.history)['runs']
+    if len(runs) < 2:
+        print('At least two runs are needed to compare', file=sys.stderr)
+        return 2
+
+    baseline = runs[args.baseline]
+    latest = runs[-1]
+    regressions = compareRuns(baseline, latest, args.threshold)
+    print(json.dumps({'baseline':baseline['date'], 'latest':latest['date'], 'regressions':regressions}))
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
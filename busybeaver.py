@@ -0,0 +1,190 @@
+import argparse
+import heapq
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from engine import Instructions, Engine
+from tapes import ArrayTape
+
+HALT = 'H'  # Name of the accept (halt) state of every enumerated machine
+
+# Returns the name of each state and the value of each symbol (symbol 0 is the blank cell) of n-state, m-symbol machines
+def getNames(n, m):
+    return [str(s) for s in range(n)], [None] + [str(c) for c in range(1, m)]
+
+# Returns the root of the search tree: the machine with no transitions, on a blank tape
+#
+# A node of the tree is a partially defined machine along with the configuration that it has reached:
+# (instructions, state, head position, steps, tape dictionary)
+def getRoot():
+    return [], '0', 0, 0, {}
+
+# Runs the machine of a node until it reaches a transition that is not defined yet
+# Returns the engine (whose halt reason is 'crash' if it reached an undefined transition, 'loop' if it was
+# proven never to halt, or 'limit' if it ran out of steps)
+def runNode(node, maxSteps):
+    instructions, state, pos, steps, tape = node
+
+    engine = Engine(Instructions(instructions), ArrayTape('0', tape), state, [HALT], pos)
+    engine.steps = steps
+    engine.advance(maxSteps - steps, True, True)
+    return engine
+
+# Returns the children of a node whose machine has reached an undefined transition, in tree-normal form
+#
+# The undefined transition is filled in with every (write, move, next state) choice, except that:
+#   the first transition always moves right (every machine that moves left first is a mirror image of one that moves right)
+#   the next state is one of the states used so far or the lowest unused state (other unused states are relabellings)
+#   the written symbol is one of the symbols used so far or the lowest unused symbol (for the same reason)
+def getChildren(instructions, engine, n, m):
+    stateNames, symbols = getNames(n, m)
+    read = engine.tape.get(engine.pos)
+
+    usedStates = len({'0'} | {i[4] for i in instructions})
+    usedSymbols = max([0] + [symbols.index(i[2]) for i in instructions]) + 1
+
+    config = (engine.state, engine.pos, engine.steps, engine.tape.toDict())
+    children = []
+    for written in symbols[:min(m, usedSymbols + 1)]:
+        for direction in ('r',) if not instructions else ('l', 'r'):
+            for next in stateNames[:min(n, usedStates + 1)]:
+                children.append((instructions + [[engine.state, read, written, direction, next]],) + config)
+
+    return children
+
+# Returns the halting machine made by filling in the undefined transition that the node's machine reached with a
+# transition to the halt state, as a champion entry (steps, non-blank cells, instructions)
+def getHalting(instructions, engine):
+    read = engine.tape.get(engine.pos)
+
+    ones = sum(1 for char in engine.tape.toDict().values() if char is not None)
+    if read is None:            # The halting transition writes 1 over the blank cell
+        ones += 1
+
+    return engine.steps + 1, ones, instructions + [[engine.state, read, '1', 'r', HALT]]
+
+# Search class - the results of searching part of the tree
+class Search:
+    def __init__(self, keep):
+        self.keep = keep            # Number of champions to keep
+        self.champions = []         # Heap of the best (steps, non-blank cells, index, instructions) found so far
+        self.count = 0              # Number of halting machines found (used to break ties in the heap)
+        self.nonHalting = 0         # Number of subtrees proven never to halt
+        self.holdouts = 0           # Number of subtrees that ran out of steps
+        self.nodes = 0              # Number of nodes run
+
+    # Adds a halting machine, keeping it if it is one of the best found so far
+    def addHalting(self, steps, ones, instructions):
+        entry = (steps, ones, -self.count, instructions)
+        self.count += 1
+
+        if len(self.champions) < self.keep:
+            heapq.heappush(self.champions, entry)
+        elif entry > self.champions[0]:
+            heapq.heapreplace(self.champions, entry)
+
+    # Adds the results of another search
+    def merge(self, other):
+        for steps, ones, index, instructions in other.champions:
+            self.addHalting(steps, ones, instructions)
+        self.count += other.count - len(other.champions)
+        self.nonHalting += other.nonHalting
+        self.holdouts += other.holdouts
+        self.nodes += other.nodes
+
+    # Runs one node and returns its children
+    def expand(self, node, n, m, maxSteps):
+        instructions = node[0]
+        engine = runNode(node, maxSteps)
+        self.nodes += 1
+
+        if engine.halt == 'loop':
+            self.nonHalting += 1
+            return []
+        if engine.halt == 'limit':
+            self.holdouts += 1
+            return []
+
+        # The machine reached an undefined transition, which could either halt or be filled in
+        self.addHalting(*getHalting(instructions, engine))
+        if len(instructions) + 1 == n*m:    # If it is the last undefined transition, it can only halt
+            return []
+        return getChildren(instructions, engine, n, m)
+
+# Searches the whole subtree below the given node (in a worker process)
+def searchSubtree(node, n, m, maxSteps, keep):
+    search = Search(keep)
+    stack = [node]
+
+    while stack:
+        stack.extend(reversed(search.expand(stack.pop(), n, m, maxSteps)))
+
+    return search
+
+# Enumerates every n-state, m-symbol machine in tree-normal form on a blank tape
+#
+# The top of the tree is expanded in this process until there are enough subtrees to share between the
+# workers, then each subtree is searched in a worker process. Every machine is run with loop and cycler
+# detection, so subtrees that never reach an undefined transition are pruned, and subtrees that run for more
+# than maxSteps steps are counted as holdouts. The keep machines that halt after the most steps are kept.
+def enumerateMachines(n, m, maxSteps=10000, keep=10, workers=None):
+    workers = workers or os.cpu_count() or 1
+    search = Search(keep)
+
+    frontier = [getRoot()]
+    while frontier and len(frontier) < 16*workers:
+        nodes = frontier
+        frontier = []
+        for node in nodes:
+            frontier.extend(search.expand(node, n, m, maxSteps))
+
+    with ProcessPoolExecutor(workers) as pool:
+        for result in pool.map(searchSubtree, frontier, *[[value]*len(frontier) for value in (n, m, maxSteps, keep)]):
+            search.merge(result)
+
+    return search
+
+# Writes each champion to a .machine file (and a blank tape to run them on) in the given directory
+# Returns a list describing each champion, best first
+def saveChampions(search, n, m, directory):
+    os.makedirs(directory, exist_ok=True)
+
+    with open(os.path.join(directory, 'blank.tape'), 'w') as file:
+        json.dump({'tape':{}, 'startPos':'0', 'blankChar':'0'}, file)
+
+    champions = []
+    for rank, (steps, ones, index, instructions) in enumerate(sorted(search.champions, reverse=True), 1):
+        path = os.path.join(directory, 'bb{}x{}-{}.machine'.format(n, m, rank))
+        with open(path, 'w') as file:
+            json.dump({'instructions':instructions, 'acceptStates':[HALT], 'startState':'0'}, file)
+
+        champions.append({'file':path, 'steps':steps, 'ones':ones})
+
+    return champions
+
+# Usage: python busybeaver.py <states> <symbols> [options] (see --help)
+# Prints a summary of the search as JSON
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Enumerate every n-state, m-symbol machine and keep the longest-running halting ones.')
+    parser.add_argument('states', type=int, help='number of states (not including the halt state)')
+    parser.add_argument('symbols', type=int, help='number of symbols (including the blank)')
+    parser.add_argument('--max-steps', type=int, default=10000, help='step budget for each machine')
+    parser.add_argument('--keep', type=int, default=10, help='number of champions to keep')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of cores)')
+    parser.add_argument('--output', default='champions', help='directory to write the champion .machine files to')
+    args = parser.parse_args(argv)
+
+    search = enumerateMachines(args.states, args.symbols, args.max_steps, args.keep, args.workers)
+
+    print(json.dumps({
+    'states':args.states,
+    'symbols':args.symbols,
+    'nodes':search.nodes,
+    'halting':search.count,
+    'nonHalting':search.nonHalting,
+    'holdouts':search.holdouts,
+    'champions':saveChampions(search, args.states, args.symbols, args.output)
+    }))
+
+if __name__ == '__main__':
+    main()
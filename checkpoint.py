@@ -0,0 +1,193 @@
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from engine import Engine, Instructions, loadMachine, loadTape
+from tapes import ArrayTape
+from formats import LENGTH, packString, unpackString
+
+MAGIC = b'TMCK'     # First bytes of every checkpoint file
+VERSION = 1
+CHUNK = 1 << 16     # Number of steps run between checks of the clock
+
+# Fixed-size header: magic, version, machine fingerprint, steps, head position, left cell count, right cell count
+HEADER = struct.Struct('<4sH32sQqQQ')
+
+# = Checkpoint file format =
+# All integers are little-endian.
+#   header:         see HEADER
+#   strings:        state, blank character, halt reason, number of symbols (as a length prefix), then each
+#                   symbol of the tape's symbol table (in code order, so symbol 0 is the blank cell)
+#   left cells:     unsigned 16-bit symbol codes of positions -1, -2, ... (see tapes.ArrayTape)
+#   right cells:    unsigned 16-bit symbol codes of positions 0, 1, ...
+# Each string is stored as a LENGTH prefix followed by its UTF-8 bytes (or just NONE for NoneType, see formats.py).
+
+# Returns a SHA-256 fingerprint of a machine's transitions and accept states (the start state and the order
+# of the instructions do not affect how a machine continues from a checkpoint, so they are not included)
+def getFingerprint(instructions, acceptStates):
+    transitions = []
+    for state, stateSet in instructions.instructions.items():
+        for read, (written, direction, next, index) in stateSet.items():
+            transitions.append(json.dumps([state, read, written, direction, next]))
+
+    data = json.dumps([sorted(transitions), sorted(acceptStates)])
+    return hashlib.sha256(data.encode('utf-8')).digest()
+
+# Returns the bytes of the given cell array up to its last non-blank cell (little-endian), and the number of cells
+def packCells(cells):
+    data = cells.tobytes()
+    count = -(-len(data.rstrip(b'\0')) // cells.itemsize)
+    if sys.byteorder == 'big':
+        cells = array(cells.typecode, cells[:count])
+        cells.byteswap()
+        data = cells.tobytes()
+
+    return data[:count*cells.itemsize], count
+
+# Returns a cell array read from the given (little-endian) data
+def unpackCells(data):
+    cells = array(ArrayTape.typecode)
+    cells.frombytes(data)
+    if sys.byteorder == 'big':
+        cells.byteswap()
+
+    return cells
+
+# Writes the engine's current configuration to a checkpoint file
+# The file is written to a temporary file first and then moved into place, so an existing checkpoint is
+# never left half-written if the process is killed
+def saveCheckpoint(engine, path):
+    tape = engine.tape
+    if not isinstance(tape, ArrayTape):
+        tape = ArrayTape(tape.getBlank(), tape.definition)
+
+    left, leftCount = packCells(tape.left)
+    right, rightCount = packCells(tape.right)
+
+    parts = [
+    HEADER.pack(MAGIC, VERSION, getFingerprint(engine.instructions, engine.acceptStates), engine.steps, engine.pos, leftCount, rightCount),
+    packString(engine.state),
+    packString(tape.getBlank()),
+    packString(engine.halt),
+    LENGTH.pack(len(tape.symbols))
+    ]
+    parts.extend(packString(char) for char in tape.symbols)
+    parts.append(left)
+    parts.append(right)
+
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(b''.join(parts))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+# Reads a checkpoint file
+# Returns a dictionary with its machine fingerprint, state, head position, step count, halt reason and tape
+# (a tapes.ArrayTape with the same symbol codes as when it was saved)
+def loadCheckpoint(path):
+    with open(path, 'rb') as file:
+        data = memoryview(file.read())
+
+    if len(data) < HEADER.size or bytes(data[:4]) != MAGIC:
+        raise ValueError('Not a checkpoint file')
+    magic, version, fingerprint, steps, pos, leftCount, rightCount = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError('Unsupported checkpoint version {}'.format(version))
+
+    offset = HEADER.size
+    state, offset = unpackString(data, offset)
+    blank, offset = unpackString(data, offset)
+    halt, offset = unpackString(data, offset)
+
+    # Rebuild the symbol table
+    tape = ArrayTape(blank)
+    count, = LENGTH.unpack_from(data, offset)
+    offset += LENGTH.size
+    symbols = []
+    for n in range(count):
+        char, offset = unpackString(data, offset)
+        symbols.append(char)
+    tape.symbols = symbols
+    tape.codes = {char:code for code, char in enumerate(symbols)}
+
+    # Copy the cells
+    itemsize = tape.left.itemsize
+    tape.left = unpackCells(data[offset:offset + leftCount*itemsize])
+    offset += leftCount*itemsize
+    tape.right = unpackCells(data[offset:offset + rightCount*itemsize])
+
+    return {
+    'fingerprint':fingerprint,
+    'state':state,
+    'pos':pos,
+    'steps':steps,
+    'halt':halt,
+    'tape':tape
+    }
+
+# Creates an engine for the given machine that continues from the configuration in the given checkpoint file
+# (raises ValueError if the checkpoint was saved from a different machine)
+def resumeEngine(instructions, acceptStates, path):
+    checkpoint = loadCheckpoint(path)
+    if checkpoint['fingerprint'] != getFingerprint(instructions, acceptStates):
+        raise ValueError('The checkpoint was saved from a different machine')
+
+    engine = Engine(instructions, checkpoint['tape'], checkpoint['state'], acceptStates, checkpoint['pos'])
+    engine.steps = checkpoint['steps']
+    engine.halt = checkpoint['halt']
+    engine.running = engine.halt in (None, 'limit')
+
+    return engine
+
+# Runs an engine until it halts or until maxSteps more steps have been executed (None for no limit), saving
+# a checkpoint every interval seconds and once it stops
+# Loop and cycler detection (see Engine.run) restart from the last checkpoint when a run is resumed
+def runCheckpointed(engine, path, interval=60, maxSteps=None, detectLoops=False, detectCyclers=False):
+    end = None if maxSteps is None else engine.steps + maxSteps
+    saved = time.monotonic()
+
+    while True:
+        chunk = CHUNK if end is None else min(CHUNK, end - engine.steps)
+        halt = engine.advance(chunk, detectLoops, detectCyclers)
+        if halt != 'limit' or engine.steps == end:
+            break
+
+        if time.monotonic() - saved >= interval:
+            saveCheckpoint(engine, path)
+            saved = time.monotonic()
+
+    saveCheckpoint(engine, path)
+    return engine.getResult()
+
+# Usage: python checkpoint.py <machine file> <tape file> <checkpoint file> [options] (see --help)
+# Continues from the checkpoint file if it exists, so the same command resumes a run that was killed
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a machine, saving its configuration to a checkpoint file as it goes.')
+    parser.add_argument('machine', help='.machine file')
+    parser.add_argument('tape', help='.tape file to start from (if there is no checkpoint yet)')
+    parser.add_argument('checkpoint', help='checkpoint file to resume from and save to')
+    parser.add_argument('--interval', type=float, default=60, help='seconds between checkpoints')
+    parser.add_argument('--max-steps', type=int, default=None, help='step budget (counting from step 0, not from the checkpoint)')
+    parser.add_argument('--loops', action='store_true', help='stop machines whose configuration repeats')
+    parser.add_argument('--cyclers', action='store_true', help='stop machines that repeat a pattern while drifting along the tape')
+    args = parser.parse_args(argv)
+
+    instructions, acceptStates, startState = loadMachine(args.machine)
+    instructions = Instructions(instructions)
+
+    if os.path.exists(args.checkpoint):
+        engine = resumeEngine(instructions, acceptStates, args.checkpoint)
+    else:
+        tape, startPos, blankChar = loadTape(args.tape)
+        engine = Engine(instructions, ArrayTape(blankChar, tape), startState, acceptStates, startPos)
+
+    maxSteps = None if args.max_steps is None else max(0, args.max_steps - engine.steps)
+    print(json.dumps(runCheckpointed(engine, args.checkpoint, args.interval, maxSteps, args.loops, args.cyclers)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import hashlib
+from compiler import ACCEPT, CRASH
+
+cache = {}  # Generated run function for each machine hash
+
+# Returns a hash of a compiled machine's transition table (machines with the same hash generate the same code)
+def getMachineHash(compiled):
+    table = hashlib.sha256(str(compiled.width).encode('ascii'))
+    for part in (compiled.writes, compiled.moves, compiled.nexts, compiled.outcomes):
+        table.update(part.tobytes())
+
+    return table.hexdigest()
+
+# Generates the Python source of a run function specialised for the given compiled machine
+#
+# The generated function has the same interface as compiler.runCompiled (apart from taking the tape arrays
+# directly): run(left, right, grow, state, pos, steps, end) -> (state, pos, steps, halt)
+#
+# Each state becomes its own function, with a loop and one branch per symbol that it has a transition for.
+# Transitions that stay in the same state just go round the state's loop again, and transitions to another state
+# return the new state to run, which dispatches on the state code by indexing a list of the state functions (so
+# dispatching takes the same time however many states the machine has). Writes that do not change the cell, and
+# the outcome of each transition (accept or crash), are resolved when the code is generated.
+def generateSource(compiled):
+    width = compiled.width
+    lines = []
+
+    for s in range(len(compiled.stateNames)):
+        lines += [
+        'def state{}(left, right, grow, pos, steps, end):'.format(s),
+        '    while True:',
+        '        if steps == end:',
+        '            return {}, pos, steps, \'limit\''.format(s)
+        ]
+
+        # If no transition is defined for the state at all (e.g. it is an accept state), it always crashes
+        if all(compiled.outcomes[s*width + c] == CRASH for c in range(width)):
+            lines.append('        return {}, pos, steps, \'crash\''.format(s))
+            continue
+
+        lines += [
+        '        if pos >= 0:',
+        '            cells = right',
+        '            i = pos',
+        '        else:',
+        '            cells = left',
+        '            i = -pos - 1',
+        '        if i >= len(cells):',
+        '            grow(cells, i)',
+        '        c = cells[i]'
+        ]
+
+        first = True
+        for c in range(width):
+            t = s*width + c
+            outcome = compiled.outcomes[t]
+            if outcome == CRASH:
+                continue
+
+            lines.append('        {} c == {}:'.format('if' if first else 'elif', c))
+            first = False
+
+            written = compiled.writes[t]
+            next = compiled.nexts[t]
+            if written != c:
+                lines.append('            cells[i] = {}'.format(written))
+            lines.append('            steps += 1')
+
+            if outcome == ACCEPT:       # The head does not move on the final step
+                lines.append('            return {}, pos, steps, \'accept\''.format(next))
+                continue
+
+            lines.append('            pos {} 1'.format('+=' if compiled.moves[t] > 0 else '-='))
+            if next != s:
+                lines.append('            return {}, pos, steps, None'.format(next))
+
+        # No transition is defined for any other symbol
+        lines += [
+        '        else:',
+        '            return {}, pos, steps, \'crash\''.format(s)
+        ]
+
+    lines += [
+    'states = [{}]'.format(', '.join('state{}'.format(s) for s in range(len(compiled.stateNames)))),
+    'def run(left, right, grow, state, pos, steps, end):',
+    '    halt = None',
+    '    while halt is None:',
+    '        state, pos, steps, halt = states[state](left, right, grow, pos, steps, end)',
+    '    return state, pos, steps, halt',
+    ''
+    ]
+
+    return '\n'.join(lines)
+
+# Returns the generated run function for the given compiled machine, generating and loading it if it is not cached
+def getRunFunction(compiled):
+    key = getMachineHash(compiled)
+    function = cache.get(key)
+    if function is None:
+        namespace = {}
+        exec(compile(generateSource(compiled), '<machine {}>'.format(key[:12]), 'exec'), namespace)
+        function = cache[key] = namespace['run']
+
+    return function
+
+# Runs a compiled machine on its tape with generated code (the same as compiler.runCompiled, but faster)
+# Returns the final state code, head position, step count and halt reason ('accept', 'crash' or 'limit')
+def runGenerated(compiled, state, pos, steps, maxSteps=None):
+    tape = compiled.tape
+    end = None if maxSteps is None else steps + maxSteps
+    return getRunFunction(compiled)(tape.left, tape.right, tape.grow, state, pos, steps, end)
@@ -0,0 +1,147 @@
+from array import array
+
+# Outcome codes stored in the transition table
+CONTINUE = 0    # Write, change state and move the head
+ACCEPT = 1      # Write and change state, then stop (the next state is an accept state, so the head does not move)
+CRASH = 2       # No transition is defined, so stop without writing
+
+# Compiled Machine class - a dense integer transition table compiled from an Instructions object
+#
+# States and symbols are interned to integers. The transition for state code s reading symbol code c
+# is stored at index t = s*width + c of the flat arrays:
+#   writes[t]:   symbol code to write
+#   moves[t]:    head movement (-1 or 1)
+#   nexts[t]:    next state code
+#   indices[t]:  index of the instruction in the instruction list (-1 if undefined)
+#   outcomes[t]: CONTINUE, ACCEPT or CRASH
+# Symbol codes are shared with the given tape (see tapes.ArrayTape), so the table can be indexed
+# directly with the codes stored on the tape.
+class CompiledMachine:
+    def __init__(self, instructions, acceptStates, startState, tape):
+        table = instructions.instructions
+
+        # Intern states (start state first)
+        self.stateNames = []    # State name for each code
+        self.stateCodes = {}    # Code for each state name
+        self.internState(startState)
+        for state, stateSet in table.items():
+            self.internState(state)
+            for written, direction, next, index in stateSet.values():
+                self.internState(next)
+        for state in acceptStates:
+            self.internState(state)
+
+        # Intern symbols into the tape's symbol table
+        for stateSet in table.values():
+            for read, (written, direction, next, index) in stateSet.items():
+                tape.intern(read)
+                tape.intern(written)
+
+        self.tape = tape                                                # Tape whose symbol codes the table uses
+        self.width = width = len(tape.symbols)                          # Number of symbols (row width of the table)
+        self.accepting = [s in acceptStates for s in self.stateNames]   # Accept flag for each state code
+        size = len(self.stateNames) * width
+
+        # Initialise every transition as undefined
+        self.writes = array('i', [0]) * size
+        self.moves = array('i', [0]) * size
+        self.nexts = array('i', [0]) * size
+        self.indices = array('i', [-1]) * size
+        self.outcomes = array('i', [CRASH]) * size
+        self.rightOnly = None                                           # Analysis and tables for running as a transducer (see transducer.py)
+        self.transducerTables = None
+
+        # Fill in the defined transitions
+        for state, stateSet in table.items():
+            base = self.stateCodes[state] * width
+            for read, (written, direction, next, index) in stateSet.items():
+                t = base + tape.codes[read]
+                nextCode = self.stateCodes[next]
+
+                self.writes[t] = tape.codes[written]
+                self.moves[t] = {'l':-1, 'r':1}[direction]
+                self.nexts[t] = nextCode
+                self.indices[t] = index
+                self.outcomes[t] = ACCEPT if self.accepting[nextCode] else CONTINUE
+
+    # Returns the code for the given state name, interning it if it has not been seen before
+    def internState(self, state):
+        code = self.stateCodes.get(state)
+        if code is None:
+            code = len(self.stateNames)
+            self.stateNames.append(state)
+            self.stateCodes[state] = code
+
+        return code
+
+    # Lookup function with the same interface as Instructions.getInstruction
+    def getInstruction(self, state, read):
+        stateCode = self.stateCodes.get(state)
+        readCode = self.tape.codes.get(read)
+        if stateCode is None or readCode is None:   # If the state or symbol never appears in the instructions:
+            return None
+
+        t = stateCode*self.width + readCode
+        if self.outcomes[t] == CRASH:
+            return None
+
+        direction = 'l' if self.moves[t] < 0 else 'r'
+        return self.tape.symbols[self.writes[t]], direction, self.stateNames[self.nexts[t]], self.indices[t]
+
+    # Returns whether the given state is an accept state
+    def isAccept(self, state):
+        code = self.stateCodes.get(state)
+        return code is not None and self.accepting[code]
+
+# Compiles the given Instructions object for use with the given tape
+def compileMachine(instructions, acceptStates, startState, tape):
+    return CompiledMachine(instructions, acceptStates, startState, tape)
+
+# Runs a compiled machine on its tape from the given configuration until it halts or until maxSteps
+# more steps have been executed (None for no limit)
+# Returns the final state code, head position, step count and halt reason ('accept', 'crash' or 'limit')
+def runCompiled(compiled, state, pos, steps, maxSteps=None):
+    tape = compiled.tape
+    right = tape.right
+    left = tape.left
+    grow = tape.grow
+
+    # Local references to avoid attribute lookups in the main loop
+    width = compiled.width
+    writes = compiled.writes.tolist()
+    moves = compiled.moves.tolist()
+    nexts = compiled.nexts.tolist()
+    outcomes = compiled.outcomes.tolist()
+
+    end = None if maxSteps is None else steps + maxSteps
+    halt = 'limit'
+
+    while steps != end:
+        # Find the array and index of the current cell
+        if pos >= 0:
+            cells = right
+            i = pos
+        else:
+            cells = left
+            i = -pos - 1
+        if i >= len(cells):
+            grow(cells, i)
+
+        t = state*width + cells[i]      # Index of the transition
+
+        outcome = outcomes[t]
+        if outcome == CRASH:            # If transition not defined:
+            halt = 'crash'
+            break
+
+        cells[i] = writes[t]            # Write
+        state = nexts[t]                # Change state
+        steps += 1
+
+        if outcome == ACCEPT:           # If reached an accept state:
+            halt = 'accept'
+            break
+
+        pos += moves[t]                 # Move head
+
+    return state, pos, steps, halt
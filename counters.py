@@ -0,0 +1,208 @@
+import csv
+import json
+from math import log1p
+from tapes import ArrayTape
+from compiler import ACCEPT, CRASH
+
+# = Counters =
+# A Counters object records how many times each instruction was executed (by its index in the instruction list,
+# as stored by engine.Instructions), and how many times the head visited (read) and changed each cell of the tape.
+# Instructions that are never executed (such as instructions overridden by a later one for the same state and
+# read character) keep a count of 0.
+#
+# An engine only records into counters when it is given some (engine.Engine.counters), in which case it runs
+# the counting loop below instead of its other backends, so runs without counters are not slowed down at all.
+class Counters:
+    def __init__(self, count):
+        self.hits = [0] * count     # Number of times each instruction was executed
+        self.visits = {}            # Number of steps that read each cell (by position)
+        self.writes = {}            # Number of steps that changed each cell (by position)
+        self.maxHits = 0            # Largest number of hits of an instruction
+        self.maxVisits = 0          # Largest number of visits to a cell
+
+    # Records one step that executed the instruction with the given index at the given position
+    # (changed is whether the value of the cell changed)
+    def record(self, index, pos, changed):
+        hits = self.hits[index] = self.hits[index] + 1
+        visits = self.visits[pos] = self.visits.get(pos, 0) + 1
+        if changed:
+            self.writes[pos] = self.writes.get(pos, 0) + 1
+
+        self.maxHits = max(self.maxHits, hits)
+        self.maxVisits = max(self.maxVisits, visits)
+
+    # Recalculates the largest counts (after counting without record)
+    def updateMaxima(self):
+        self.maxHits = max(self.hits, default=0)
+        self.maxVisits = max(self.visits.values(), default=0)
+
+    # Returns the heat of the instruction with the given index, from 0 (never executed) to 1 (executed the most)
+    # on a logarithmic scale, so that instructions executed a few times still show up next to the hottest ones
+    def getInstructionHeat(self, index):
+        return getHeat(self.hits[index], self.maxHits)
+
+    # Returns the heat of the cell at the given position (by number of visits, in the same way)
+    def getCellHeat(self, pos):
+        return getHeat(self.visits.get(pos, 0), self.maxVisits)
+
+    # Returns a dictionary of the counts of each instruction in the given list of instructions, and of each
+    # visited cell (in order of position)
+    def toDict(self, instructions):
+        return {
+        'instructions':[{'index':n, 'instruction':i, 'hits':self.hits[n]} for n, i in enumerate(instructions)],
+        'cells':[{'pos':pos, 'visits':self.visits[pos], 'writes':self.writes.get(pos, 0)} for pos in sorted(self.visits)]
+        }
+
+    # Writes the counts to a JSON file (see toDict)
+    def saveJSON(self, path, instructions):
+        with open(path, 'w') as file:
+            json.dump(self.toDict(instructions), file)
+
+    # Writes the counts to two CSV files: one row per instruction to instructionPath, and one row per visited cell
+    # to cellPath (blank cells are written as empty values)
+    def saveCSV(self, instructionPath, cellPath, instructions):
+        with open(instructionPath, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['index', 'state', 'read', 'write', 'direction', 'next', 'hits'])
+            for n, i in enumerate(instructions):
+                writer.writerow([n] + [','.join('' if p is None else p for p in part) if isinstance(part, list) else part for part in i] + [self.hits[n]])
+
+        with open(cellPath, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['pos', 'visits', 'writes'])
+            for pos in sorted(self.visits):
+                writer.writerow([pos, self.visits[pos], self.writes.get(pos, 0)])
+
+    # Writes the counts to the given path, as JSON if it ends in .json and otherwise as CSV (with the cells
+    # written next to it, to the same name ending in -cells.csv)
+    def save(self, path, instructions):
+        if path.endswith('.json'):
+            self.saveJSON(path, instructions)
+        else:
+            base = path[:-4] if path.endswith('.csv') else path
+            self.saveCSV(path, base + '-cells.csv', instructions)
+
+# Returns a count's heat (from 0 to 1) relative to the largest count
+def getHeat(count, maximum):
+    if not count:
+        return 0
+    return log1p(count) / log1p(maximum)
+
+# Runs an engine (see engine.Engine) until it halts or until maxSteps more steps have been executed (None for no
+# limit), recording every step into the engine's counters
+# Returns the halt reason ('accept', 'crash' or 'limit')
+def runCounted(engine, maxSteps=None):
+    counters = engine.counters
+    hits = counters.hits
+    visits = counters.visits
+    writeCounts = counters.writes
+
+    steps = engine.steps
+    end = None if maxSteps is None else steps + maxSteps
+    halt = 'limit'
+
+    # If the tape is array-backed, count using the compiled transition table (see compiler.runCompiled)
+    if isinstance(engine.tape, ArrayTape):
+        compiled = engine.getCompiled()
+        tape = compiled.tape
+        right = tape.right
+        left = tape.left
+        grow = tape.grow
+
+        # Local references to avoid attribute lookups in the main loop
+        width = compiled.width
+        writes = compiled.writes.tolist()
+        moves = compiled.moves.tolist()
+        nexts = compiled.nexts.tolist()
+        indices = compiled.indices.tolist()
+        outcomes = compiled.outcomes.tolist()
+
+        state = compiled.stateCodes[engine.state]
+        pos = engine.pos
+
+        while steps != end:
+            # Find the array and index of the current cell
+            if pos >= 0:
+                cells = right
+                i = pos
+            else:
+                cells = left
+                i = -pos - 1
+            if i >= len(cells):
+                grow(cells, i)
+
+            code = cells[i]
+            t = state*width + code          # Index of the transition
+
+            outcome = outcomes[t]
+            if outcome == CRASH:            # If transition not defined:
+                halt = 'crash'
+                break
+
+            # Count the step
+            hits[indices[t]] += 1
+            visits[pos] = visits.get(pos, 0) + 1
+            if writes[t] != code:
+                writeCounts[pos] = writeCounts.get(pos, 0) + 1
+
+            cells[i] = writes[t]            # Write
+            state = nexts[t]                # Change state
+            steps += 1
+
+            if outcome == ACCEPT:           # If reached an accept state:
+                halt = 'accept'
+                break
+
+            pos += moves[t]                 # Move head
+
+        state = compiled.stateNames[state]
+
+    # Otherwise, count using the instruction lookup table with any kind of tape
+    else:
+        table = engine.instructions.instructions
+        tape = engine.tape
+        acceptStates = engine.acceptStates
+        moves = {'l':-1, 'r':1}
+
+        state = engine.state
+        pos = engine.pos
+
+        while steps != end:
+            cell = tape.get(pos)
+            stateSet = table.get(state)
+            instruction = None if stateSet is None else stateSet.get(cell)
+
+            # If transition not defined:
+            if instruction is None:
+                halt = 'crash'
+                break
+
+            written, direction, state, index = instruction
+
+            # Count the step
+            hits[index] += 1
+            visits[pos] = visits.get(pos, 0) + 1
+            if written != cell:
+                writeCounts[pos] = writeCounts.get(pos, 0) + 1
+
+            tape.set(pos, written)
+            steps += 1
+
+            # If reached an accept state:
+            if state in acceptStates:
+                halt = 'accept'
+                break
+
+            pos += moves[direction]
+
+    counters.updateMaxima()
+
+    # Store the final configuration
+    engine.state = state
+    engine.pos = pos
+    engine.steps = steps
+    engine.halt = halt
+    if halt != 'limit':
+        engine.running = False
+
+    return halt
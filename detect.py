@@ -0,0 +1,320 @@
+from array import array
+from tapes import ArrayTape
+from compiler import ACCEPT, CRASH
+
+MASK = (1 << 64) - 1    # Hashes are 64-bit
+
+# Mixes the bits of a 64-bit integer (the splitmix64 finaliser)
+def mix(x):
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & MASK
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & MASK
+    return x ^ (x >> 31)
+
+# Returns the Zobrist key of a cell with the given symbol code at the given position
+# (blank cells have the key 0, so they never affect the hash)
+def cellKey(pos, code):
+    if code == 0:
+        return 0
+    return mix(((pos << 16) + code + 0x9E3779B97F4A7C15) & MASK)
+
+# Returns the Zobrist hash of the given array-backed tape cells (as stored by tapes.ArrayTape)
+def hashCells(left, right):
+    tapeHash = 0
+    for i, code in enumerate(right):
+        tapeHash ^= cellKey(i, code)
+    for i, code in enumerate(left):
+        tapeHash ^= cellKey(-i-1, code)
+
+    return tapeHash
+
+# Runner class - steps a compiled machine over a pair of tape arrays while keeping an incrementally
+# updated (Zobrist) hash of the tape
+class Runner:
+    def __init__(self, compiled, state, pos, steps, left, right, grow):
+        self.compiled = compiled
+        self.state = state          # Current state code
+        self.pos = pos
+        self.steps = steps
+        self.left = left            # Tape arrays (see tapes.ArrayTape)
+        self.right = right
+        self.grow = grow            # Function that grows a tape array
+        self.tapeHash = hashCells(left, right)
+
+    # Executes one step and returns its outcome (CONTINUE, ACCEPT or CRASH)
+    def step(self):
+        compiled = self.compiled
+        pos = self.pos
+
+        # Find the array and index of the current cell
+        if pos >= 0:
+            cells = self.right
+            i = pos
+        else:
+            cells = self.left
+            i = -pos - 1
+        if i >= len(cells):
+            self.grow(cells, i)
+
+        old = cells[i]
+        t = self.state*compiled.width + old
+        outcome = compiled.outcomes[t]
+        if outcome == CRASH:                    # If transition not defined:
+            return outcome
+
+        new = compiled.writes[t]
+        if new != old:                          # Write (and update the hash)
+            cells[i] = new
+            self.tapeHash ^= cellKey(pos, old) ^ cellKey(pos, new)
+
+        self.state = compiled.nexts[t]          # Change state
+        self.steps += 1
+        if outcome != ACCEPT:
+            self.pos = pos + compiled.moves[t]  # Move head
+
+        return outcome
+
+    # Gets the code of the cell at the given position
+    def getCode(self, pos):
+        if pos >= 0:
+            cells = self.right
+        else:
+            cells = self.left
+            pos = -pos - 1
+
+        if pos < len(cells):
+            return cells[pos]
+        return 0
+
+    # Returns the codes of the cells from position a to position b (inclusive)
+    def readCells(self, a, b):
+        cells = []
+
+        # Negative positions (slice the left array, which is stored in reverse)
+        if a < 0:
+            low, high = -min(b, -1) - 1, -a - 1
+            part = self.left[low:high+1].tolist()
+            part += [0] * (high+1 - low - len(part))    # Cells beyond the end of the array are blank
+            cells = part[::-1]
+
+        # Non-negative positions
+        if b >= 0:
+            low, high = max(a, 0), b
+            part = self.right[low:high+1].tolist()
+            part += [0] * (high+1 - low - len(part))
+            cells += part
+
+        return cells
+
+    # Returns the lowest and highest positions of non-blank cells (or None if the tape is blank)
+    def getExtent(self):
+        positions = [i for i, code in enumerate(self.right) if code] + [-i-1 for i, code in enumerate(self.left) if code]
+        if not positions:
+            return None
+        return min(positions), max(positions)
+
+    # Returns a key that is equal for equal configurations (and very rarely for different ones)
+    def getKey(self):
+        return self.state, self.pos, self.tapeHash
+
+    # Returns an exact, compact copy of the configuration
+    def snapshot(self):
+        # Trailing zero bytes are stripped so that the copy does not depend on how far the arrays have grown
+        return self.state, self.pos, self.left.tobytes().rstrip(b'\0'), self.right.tobytes().rstrip(b'\0')
+
+# Cycler Detector class - detects translated cyclers: machines that repeat the same pattern of behaviour
+# forever while drifting along the tape into fresh blank cells
+#
+# Whenever the head breaks its record for the furthest position reached on one side (beyond the initial
+# contents of the tape, so all cells from the head outwards are blank), the record is compared with earlier
+# records on the same side. If an earlier record at step t1 and position p1 had the same state as the new
+# record at step t2 and position p2, and the tape between the head and the furthest point that the head
+# backtracked to between the two records is the same at both (shifted by d = p2 - p1), then from t2 the
+# machine repeats exactly what it did from t1, shifted by d, and so on forever.
+#
+# Only the last maxRecords records on each side are kept, each with a copy of the window cells behind the
+# head, so memory is bounded. Backtracks longer than the window are never compared, so the detector can miss
+# cyclers but never reports a false one.
+class CyclerDetector:
+    def __init__(self, runner, window=256, maxRecords=256):
+        self.window = window
+        self.maxRecords = maxRecords
+
+        # Records must be beyond the furthest positions reached and the initial contents of the tape
+        extent = runner.getExtent()
+        self.lowest = runner.pos if extent is None else min(runner.pos, extent[0])
+        self.highest = runner.pos if extent is None else max(runner.pos, extent[1])
+
+        self.records = {1:[], -1:[]}                    # [step, position, state, cells behind the head, furthest backtrack until the next record] for each side
+        self.backtrack = {1:runner.pos, -1:runner.pos}  # Furthest backtrack since the last record on each side
+
+    # Called after every step - returns (period, shift, step at which the cycle starts) once a cycler is found
+    def update(self, runner):
+        pos = runner.pos
+        backtrack = self.backtrack
+
+        if pos < backtrack[1]:
+            backtrack[1] = pos
+        if pos > backtrack[-1]:
+            backtrack[-1] = pos
+
+        if pos > self.highest:                  # If a new record on the right:
+            self.highest = pos
+            return self.record(runner, 1)
+        if pos < self.lowest:                   # If a new record on the left:
+            self.lowest = pos
+            return self.record(runner, -1)
+
+        return None
+
+    # Adds a record for the current configuration on the given side and compares it with the earlier ones
+    def record(self, runner, side):
+        records = self.records[side]
+        pos = runner.pos
+        state = runner.state
+
+        if records:
+            records[-1][4] = self.backtrack[side]
+        self.backtrack[side] = pos
+
+        # Compare with earlier records (latest first)
+        furthest = pos                          # Furthest backtrack between the earlier record and now
+        for steps, recordPos, recordState, cells, backtrack in reversed(records):
+            furthest = min(furthest, backtrack) if side == 1 else max(furthest, backtrack)
+            length = (recordPos - furthest)*side + 1
+
+            if recordState == state and length <= len(cells):
+                shift = pos - recordPos
+                if side == 1:
+                    same = cells[-length:] == runner.readCells(furthest + shift, pos)
+                else:
+                    same = cells[:length] == runner.readCells(pos, furthest + shift)
+
+                if same:
+                    return runner.steps - steps, shift, steps
+
+        # Store the new record
+        if side == 1:
+            cells = runner.readCells(pos - self.window, pos)
+        else:
+            cells = runner.readCells(pos, pos + self.window)
+        records.append([runner.steps, pos, state, cells, None])
+        if len(records) > self.maxRecords:
+            del records[0]
+
+        return None
+
+# Detection class - the state of loop and cycler detection for an engine, kept between runs so that
+# detection carries on where it left off when a run that ran out of steps is resumed
+class Detection:
+    def __init__(self, runner, loops, cyclers, window, maxRecords):
+        self.runner = runner
+        self.loops = loops
+        self.cyclers = cyclers
+        self.detector = CyclerDetector(runner, window, maxRecords) if cyclers else None
+
+        self.initial = runner.snapshot()            # Configuration to search for the start of the loop from
+        self.initialSteps = runner.steps
+
+        self.checkpointKey = runner.getKey()        # Brent's algorithm checkpoint
+        self.checkpoint = self.initial
+        self.checkpointSteps = runner.steps
+        self.power = 1
+
+# Runs an engine (see engine.Engine, which must use a tapes.ArrayTape) until it halts, until maxSteps more
+# steps have been executed, or until it is proven never to halt, and returns the halt reason
+#
+# If loops is True, the engine stops when its configuration repeats exactly. Repeats are found with Brent's
+# algorithm: one checkpoint configuration is kept, and is moved to the current configuration whenever the
+# distance to it reaches the next power of two, so memory is bounded by one copy of the tape. Hash matches
+# are confirmed by comparing the full configurations, so there are no false positives.
+#
+# If cyclers is True, the engine stops when it is found to be a translated cycler (see CyclerDetector).
+#
+# If either is found, the engine halts with the reason 'loop', and its loopPeriod, loopShift and loopStart
+# attributes are set to the period of the loop, the distance that the pattern moves along the tape each period
+# (0 for an exact repeat), and the step from which the machine is known to be in the loop (for exact repeats,
+# the first step at which it entered the loop).
+def runDetecting(engine, maxSteps=None, loops=True, cyclers=False, window=256, maxRecords=256):
+    if not engine.running:
+        return engine.halt
+
+    compiled = engine.getCompiled()
+    tape = engine.tape
+
+    # Carry on with the previous detection if the engine has not been run any other way since
+    detection = engine.detection
+    if detection is None or detection.loops != loops or detection.cyclers != cyclers or detection.runner.compiled is not compiled \
+            or detection.runner.steps != engine.steps or detection.runner.left is not tape.left or detection.runner.right is not tape.right:
+        runner = Runner(compiled, compiled.stateCodes[engine.state], engine.pos, engine.steps, tape.left, tape.right, tape.grow)
+        detection = engine.detection = Detection(runner, loops, cyclers, window, maxRecords)
+
+    runner = detection.runner
+    detector = detection.detector
+    end = None if maxSteps is None else runner.steps + maxSteps
+    halt = 'limit'
+
+    while runner.steps != end:
+        outcome = runner.step()
+        if outcome == CRASH:
+            halt = 'crash'
+            break
+        if outcome == ACCEPT:
+            halt = 'accept'
+            break
+
+        # If the configuration matches the checkpoint (confirming hash matches):
+        if loops and runner.getKey() == detection.checkpointKey and runner.snapshot() == detection.checkpoint:
+            halt = 'loop'
+            engine.loopPeriod = runner.steps - detection.checkpointSteps
+            engine.loopShift = 0
+            engine.loopStart = findLoopStart(compiled, detection.initial, detection.initialSteps, engine.loopPeriod, tape.grow)
+            break
+
+        # If the machine is a translated cycler:
+        if detector is not None:
+            cycle = detector.update(runner)
+            if cycle is not None:
+                halt = 'loop'
+                engine.loopPeriod, engine.loopShift, engine.loopStart = cycle
+                break
+
+        # Move the checkpoint
+        if loops and runner.steps - detection.checkpointSteps == detection.power:
+            detection.checkpointKey = runner.getKey()
+            detection.checkpoint = runner.snapshot()
+            detection.checkpointSteps = runner.steps
+            detection.power *= 2
+
+    # Store the final configuration
+    engine.state = compiled.stateNames[runner.state]
+    engine.pos = runner.pos
+    engine.steps = runner.steps
+    engine.halt = halt
+    if halt != 'limit':
+        engine.running = False
+
+    return halt
+
+# Restores a tape array from the bytes stored in a snapshot
+def restoreCells(data):
+    cells = array(ArrayTape.typecode)
+    cells.frombytes(data + bytes(-len(data) % cells.itemsize))
+    return cells
+
+# Returns the first step at which a machine with a loop of the given period enters the loop, by running two
+# copies of the machine (one the period ahead of the other) from the given configuration until they match
+def findLoopStart(compiled, configuration, steps, period, grow):
+    state, pos, left, right = configuration
+    runners = []
+    for n in range(2):
+        runners.append(Runner(compiled, state, pos, steps, restoreCells(left), restoreCells(right), grow))
+
+    behind, ahead = runners
+    for n in range(period):
+        ahead.step()
+
+    while behind.getKey() != ahead.getKey() or behind.snapshot() != ahead.snapshot():
+        behind.step()
+        ahead.step()
+
+    return behind.steps
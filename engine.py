@@ -0,0 +1,314 @@
+import json
+import sys
+from tapes import ArrayTape, RunLengthTape, MmapTape
+from compiler import compileMachine, runCompiled
+from codegen import runGenerated
+from transducer import isRightOnly, runTransducer
+from detect import runDetecting
+from sweep import runSweeping
+from counters import Counters, runCounted
+from formats import TAPE_MAGIC, isBinary, loadBinaryTape, loadMachineData, loadTapeData
+
+# Instructions class - acts as a lookup table for machine instructions
+class Instructions:
+    def __init__(self, instructions):
+        # Initialise instruction dictionary
+        self.instructions = {}
+
+        # Add an entry for each instruction in the given list of instructions
+        for n, i in enumerate(instructions):
+            self.setInstruction(i[0], i[1], i[2], i[3], i[4], n)
+
+    # Adds an entry for the given instruction
+    def setInstruction(self, state, read, written, direction, next, index):
+        stateSet = self.instructions.get(state)             # Try to get the inner dictionary that represents the given current state
+        if stateSet is None:                                # If dictionary does not yet exist:
+            stateSet = {}                                   # Create the dictionary
+            self.instructions[state] = stateSet             # Create new entry in outer dictionary for the new dictionary
+
+        stateSet[read] = (written, direction, next, index)  # Create a new entry in the inner dictionary for the given read character
+
+    # Lookup function - returns the write character, move direction and next
+    # state for the given current state and read character
+    def getInstruction(self, state, read):
+        stateSet = self.instructions.get(state)     # Try to get the inner dictionary for the current state
+        if stateSet is None:                        # If the inner dictionary does not exist:
+            return None
+
+        return stateSet.get(read)                   # Return the instruction information (returns none if there is no defined
+                                                    # instruction for the given current state and read character)
+
+# Tape class - handles reading from and writing to the tape
+class Tape:
+    def __init__(self, blank, definition={}):
+        self.blank = blank              # Set blank character
+        self.definition = definition    # Set the dictionary that stores the values of (non-blank) cells
+
+    # Gets the value of the cell at the given position (returns NoneType if cell is blank)
+    def get(self, pos):
+        char = self.definition.get(str(pos))
+
+        return char
+
+    # Sets the value of the cell at the given position to the given value
+    def set(self, pos, char):
+        self.definition[str(pos)] = char
+
+    # Returns the string that represents a blank cell
+    def getBlank(self):
+        return self.blank
+
+# Engine class - Executes a machine headlessly (no animation, no graphics) with the same rules as simulator.Machine
+#
+# = Halt reasons =
+# accept:   The machine entered an accept state
+# crash:    No transition is defined for the current state and read character
+# limit:    The step budget ran out before the machine halted (the engine can be resumed)
+# loop:     The machine was proven never to halt (only with loop or cycler detection, or for machines that
+#           only move right, which are run as transducers - see transducer.py - or that sweep into the blank
+#           tape forever on a tapes.RunLengthTape - see sweep.py)
+class Engine:
+    def __init__(self, instructions, tape, startState, acceptStates, startPos):
+        # Initialise internal attributes
+        self.instructions = instructions            # Instructions object
+        self.tape = tape                            # Tape object
+        self.state = startState
+        self.acceptStates = set(acceptStates)       # Set of accept states
+        self.pos = startPos
+
+        self.steps = 0                              # Number of completed steps
+        self.running = True                         # False once the machine enters an accept state (or crashes)
+        self.halt = None                            # Reason the machine stopped (see above)
+        self.compiled = None                        # Compiled transition table (only used with an ArrayTape)
+        self.codegen = False                        # Whether to run the compiled machine as generated Python code (see codegen.py)
+        self.loopPeriod = None                      # Period of the loop that the machine is stuck in (see detect.runDetecting)
+        self.loopShift = None                       # Distance the loop moves along the tape each period
+        self.loopStart = None                       # Step from which the machine is in the loop
+        self.detection = None                       # State of loop detection, kept so that resumed runs carry on with it
+        self.counters = None                        # Counters that every step is recorded into (see counters.py, None to not count)
+
+    # Executes one full step (read, write, change state, move head)
+    def step(self):
+        if not self.running:
+            return False
+
+        cell = self.tape.get(self.pos)                                      # Read the current cell's value
+        instruction = self.instructions.getInstruction(self.state, cell)    # Get the instruction
+
+        # If transition not defined:
+        if instruction is None:
+            self.running = False
+            self.halt = 'crash'
+            return False
+
+        written, direction, next, index = instruction   # Parse instruction
+
+        if self.counters is not None:                   # Count the step
+            self.counters.record(index, self.pos, written != cell)
+
+        self.tape.set(self.pos, written)    # Write
+        self.state = next                   # Change state
+        self.steps += 1
+
+        # If reached an accept state (the head does not move on the final step):
+        if next in self.acceptStates:
+            self.running = False
+            self.halt = 'accept'
+            return False
+
+        self.pos += {'l':-1, 'r':1}[direction]  # Move head
+        return True
+
+    # Runs the machine until it halts or until maxSteps more steps have been executed (None for no limit),
+    # and returns a dictionary describing the final configuration
+    # If detectLoops is True, the engine also stops if the machine's configuration repeats, and if detectCyclers
+    # is True, it also stops if the machine repeats a pattern while drifting along the tape (see detect.py)
+    def run(self, maxSteps=None, detectLoops=False, detectCyclers=False):
+        self.advance(maxSteps, detectLoops, detectCyclers)
+        return self.getResult()
+
+    # Runs the machine like run, but only returns the halt reason (so it does not have to convert the tape)
+    def advance(self, maxSteps=None, detectLoops=False, detectCyclers=False):
+        if not self.running:
+            return self.halt
+
+        # If counting, run the counting loop instead (see counters.py)
+        if self.counters is not None:
+            if detectLoops or detectCyclers:
+                raise ValueError('Loop detection cannot be combined with counters')
+            return runCounted(self, maxSteps)
+
+        if detectLoops or detectCyclers:
+            if not isinstance(self.tape, ArrayTape):
+                raise TypeError('Loop detection requires an ArrayTape')
+            return runDetecting(self, maxSteps, detectLoops, detectCyclers)
+
+        # If the tape is array-backed, run the compiled integer transition table instead
+        if isinstance(self.tape, ArrayTape):
+            return self.runCompiled(maxSteps)
+
+        # If the tape stores runs of identical cells, skip over runs that the machine sweeps across
+        if isinstance(self.tape, RunLengthTape):
+            return runSweeping(self, maxSteps)
+
+        # Local references to avoid attribute lookups in the main loop
+        table = self.instructions.instructions
+        tape = self.tape
+        acceptStates = self.acceptStates
+        moves = {'l':-1, 'r':1}
+
+        state = self.state
+        pos = self.pos
+        steps = self.steps
+        end = None if maxSteps is None else steps + maxSteps
+        halt = 'limit'
+
+        while steps != end:
+            stateSet = table.get(state)                         # Get the instructions for the current state
+            instruction = None if stateSet is None else stateSet.get(tape.get(pos))
+
+            # If transition not defined:
+            if instruction is None:
+                halt = 'crash'
+                break
+
+            written, direction, state, index = instruction      # Parse instruction
+            tape.set(pos, written)
+            steps += 1
+
+            # If reached an accept state:
+            if state in acceptStates:
+                halt = 'accept'
+                break
+
+            pos += moves[direction]
+
+        # Store the final configuration
+        self.state = state
+        self.pos = pos
+        self.steps = steps
+        self.halt = halt
+        if halt != 'limit':
+            self.running = False
+
+        return halt
+
+    # Returns the compiled transition table for the engine's tape, (re)compiling it if there is no table yet,
+    # or if the tape or current state is not covered by it
+    def getCompiled(self):
+        compiled = self.compiled
+        if compiled is None or compiled.tape is not self.tape or compiled.width != len(self.tape.symbols) \
+                or self.state not in compiled.stateCodes:
+            compiled = self.compiled = compileMachine(self.instructions, self.acceptStates, self.state, self.tape)
+
+        return compiled
+
+    # Runs the machine using the compiled integer transition table (or code generated from it)
+    # Machines that can only move right from the current state are run as transducers instead
+    def runCompiled(self, maxSteps=None):
+        compiled = self.getCompiled()
+        stateCode = compiled.stateCodes[self.state]
+
+        if isRightOnly(compiled, stateCode):
+            stateCode, self.pos, self.steps, self.halt, loop = runTransducer(compiled, stateCode, self.pos, self.steps, maxSteps)
+            if loop is not None:
+                self.loopPeriod, self.loopShift, self.loopStart = loop
+        else:
+            run = runGenerated if self.codegen else runCompiled
+            stateCode, self.pos, self.steps, self.halt = run(compiled, stateCode, self.pos, self.steps, maxSteps)
+        self.state = compiled.stateNames[stateCode]
+        if self.halt != 'limit':
+            self.running = False
+
+        return self.halt
+
+    # Returns a dictionary describing the current configuration (without the tape if includeTape is False)
+    def getResult(self, includeTape=True):
+        result = {}
+        if includeTape:
+            result['tape'] = {p:c for p, c in self.tape.definition.items() if c is not None}    # Blank cells are not stored in the .tape format
+
+        result['pos'] = self.pos
+        result['state'] = self.state
+        result['steps'] = self.steps
+        result['halt'] = self.halt
+
+        if self.halt == 'loop':     # Describe the loop
+            result['period'] = self.loopPeriod
+            result['shift'] = self.loopShift
+            result['loopStart'] = self.loopStart
+
+        return result
+
+# Loads a .machine file and returns its instructions, accept states and start state (single-tape machines only,
+# see multitape.py for machines with several tapes)
+# The file can be in either the JSON or the binary format (see formats.py)
+def loadMachine(path):
+    data = loadMachineData(path)
+
+    if data.get('tapes', 1) != 1:
+        raise ValueError('Multi-tape machines must be run with multitape.py')
+
+    return data['instructions'], data['acceptStates'], data['startState']
+
+# Loads a .tape file (in either format) and returns its tape dictionary, start position (as an integer) and blank character
+def loadTape(path):
+    data = loadTapeData(path)
+
+    return data['tape'], int(data['startPos']), data['blankChar']
+
+# Creates an engine for the given machine and tape files
+# (tapeClass can be any class with the same interface as Tape, such as tapes.RunLengthTape, and codegen
+# selects the generated code backend for array tapes)
+def createEngine(machinePath, tapePath, tapeClass=ArrayTape, codegen=False):
+    instructions, acceptStates, startState = loadMachine(machinePath)
+
+    # Binary tapes are loaded straight into an ArrayTape, without building a dictionary first
+    if tapeClass is ArrayTape and isBinary(tapePath, TAPE_MAGIC):
+        tape, startPos, blankChar = loadBinaryTape(tapePath)
+    else:
+        tape, startPos, blankChar = loadTape(tapePath)
+        tape = tapeClass(blankChar, tape)
+
+    engine = Engine(Instructions(instructions), tape, startState, acceptStates, startPos)
+    engine.codegen = codegen
+    return engine
+
+# Creates an engine for the given machine file that uses the raw bytes of the given data file as its tape
+# (see tapes.MmapTape - each field of width bytes is a cell, and the file is not loaded into memory)
+def createRawEngine(machinePath, dataPath, startPos=0, width=1, blankChar=''):
+    instructions, acceptStates, startState = loadMachine(machinePath)
+    return Engine(Instructions(instructions), MmapTape(blankChar, dataPath, width), startState, acceptStates, startPos)
+
+# Runs the given machine file on the given tape file until it halts or the step budget runs out
+def runFiles(machinePath, tapePath, maxSteps=None, tapeClass=ArrayTape, codegen=False):
+    return createEngine(machinePath, tapePath, tapeClass, codegen).run(maxSteps)
+
+# Usage: python engine.py <machine file> <tape file> [max steps] [--loops] [--cyclers] [--codegen] [--sweep] [--raw] [--counters=<file>]
+# With --raw, the tape file is a raw binary file with one byte per cell (starting at position 0), and only the
+# cells that were written are output (as 'changes'), so that the whole file never has to be loaded
+# With --counters, the number of times each instruction was executed and each cell was visited and changed are
+# written to the given file (see counters.Counters.save)
+if __name__ == '__main__':
+    detectLoops = '--loops' in sys.argv
+    detectCyclers = '--cyclers' in sys.argv
+    codegen = '--codegen' in sys.argv
+    tapeClass = RunLengthTape if '--sweep' in sys.argv else ArrayTape
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    maxSteps = int(args[2]) if len(args) > 2 else None
+    countersPath = next((arg[11:] for arg in sys.argv if arg.startswith('--counters=')), None)
+
+    if countersPath is not None:
+        instructions = loadMachine(args[0])[0]
+        engine = createEngine(args[0], args[1], tapeClass)
+        engine.counters = Counters(len(instructions))
+        print(json.dumps(engine.run(maxSteps)))
+        engine.counters.save(countersPath, instructions)
+    elif '--raw' in sys.argv:
+        engine = createRawEngine(args[0], args[1])
+        engine.advance(maxSteps)
+        result = engine.getResult(False)
+        result['changes'] = engine.tape.getChanges()
+        print(json.dumps(result))
+    else:
+        print(json.dumps(createEngine(args[0], args[1], tapeClass, codegen).run(maxSteps, detectLoops, detectCyclers)))
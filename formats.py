@@ -0,0 +1,509 @@
+import argparse
+import codecs
+import json
+import os
+import re
+import struct
+import sys
+import zlib
+from array import array
+from itertools import groupby
+from tapes import ArrayTape
+
+TAPE_MAGIC = b'TMTP'    # First bytes of every binary .tape file
+MACHINE_MAGIC = b'TMMC' # First bytes of every binary .machine file
+VERSION = 1
+
+# Compression methods of the payload
+RAW = 0     # Stored as it is
+ZLIB = 1    # Compressed with zlib
+RLE = 2     # Stored as runs of identical cells (tapes only)
+COMPRESSIONS = {'none':RAW, 'zlib':ZLIB, 'rle':RLE}
+
+# Fixed-size tape header: magic, version, compression, bytes per cell, position of the first cell, number of cells, start position
+TAPE_HEADER = struct.Struct('<4sHBBqQq')
+# Fixed-size machine header: magic, version, compression, number of tapes
+MACHINE_HEADER = struct.Struct('<4sHBB')
+LENGTH = struct.Struct('<I')     # Length prefix of a string (or count of a table)
+NONE = 0xFFFFFFFF                # Length prefix that stands for NoneType
+DIRECTIONS = ['l', 'r', 's']     # Direction for each direction code
+CHUNK = 1 << 20                  # Number of bytes read at a time when streaming a JSON .tape file
+
+# One entry of a tape dictionary in the JSON format (position, then a string or null, then the comma or closing brace after it)
+ENTRY = re.compile(r'\s*"((?:[^"\\]|\\.)*)"\s*:\s*(?:"((?:[^"\\]|\\.)*)"|(null))\s*([,}])')
+WHITESPACE = re.compile(r'\s*')
+
+# = Binary .tape format =
+# All integers are little-endian.
+#   header:     see TAPE_HEADER
+#   strings:    blank character, number of symbols (as a length prefix), then each symbol (in code order, so
+#               symbol 0 is the blank cell)
+#   payload:    the symbol code of every cell from the first to the last non-blank cell (1 byte per cell if
+#               there are at most 256 symbols, otherwise 2), compressed with zlib if the compression is ZLIB.
+#               If the compression is RLE, the payload is instead the number of runs (as a length prefix),
+#               the length of each run (unsigned 32-bit), then the symbol code of each run.
+#
+# = Binary .machine format =
+#   header:     see MACHINE_HEADER
+#   payload:    (compressed with zlib if the compression is ZLIB)
+#               symbol table:   number of symbols, then each symbol (symbol 0 is the blank cell)
+#               state table:    number of states, then each state name
+#               start state:    state code (unsigned 32-bit)
+#               accept states:  number of accept states, then the state code of each
+#               instructions:   number of instructions, then each one as the state code, the symbol code read
+#                               from each tape, the symbol code written to each tape, the direction code of
+#                               each tape (unsigned 8-bit, see DIRECTIONS) and the next state code
+# Each string is stored as a LENGTH prefix followed by its UTF-8 bytes (or just NONE for NoneType), and each
+# count and code is unsigned 32-bit unless stated otherwise.
+#
+# Both formats use the same extensions as the JSON formats, and are told apart from them by their magic.
+
+# Returns the given string (or NoneType) encoded with its length prefix
+def packString(string):
+    if string is None:
+        return LENGTH.pack(NONE)
+
+    data = string.encode('utf-8')
+    return LENGTH.pack(len(data)) + data
+
+# Reads a string (or NoneType) with a length prefix from the given data at the given offset
+# Returns the string and the offset after it
+def unpackString(data, offset):
+    length, = LENGTH.unpack_from(data, offset)
+    offset += LENGTH.size
+    if length == NONE:
+        return None, offset
+
+    return str(data[offset:offset+length], 'utf-8'), offset + length
+
+# Returns a table of strings (count, then each string) encoded
+def packTable(strings):
+    return LENGTH.pack(len(strings)) + b''.join(packString(string) for string in strings)
+
+# Reads a table of strings from the given data at the given offset
+# Returns the list of strings and the offset after it
+def unpackTable(data, offset):
+    count, = LENGTH.unpack_from(data, offset)
+    offset += LENGTH.size
+    strings = []
+    for n in range(count):
+        string, offset = unpackString(data, offset)
+        strings.append(string)
+
+    return strings, offset
+
+# Returns the bytes of the given integer array in little-endian order
+def packArray(values):
+    if sys.byteorder == 'big' and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+
+    return values.tobytes()
+
+# Returns an integer array with the given typecode read from the given (little-endian) data
+def unpackArray(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big' and values.itemsize > 1:
+        values.byteswap()
+
+    return values
+
+# Returns whether the file at the given path starts with the given magic
+def isBinary(path, magic):
+    with open(path, 'rb') as file:
+        return file.read(len(magic)) == magic
+
+# Returns the symbol codes of an array tape's cells from the first to the last non-blank cell, and the position of the first
+def getCells(tape):
+    itemsize = tape.right.itemsize
+    left = tape.left.tobytes().rstrip(b'\0')
+    right = tape.right.tobytes().rstrip(b'\0')
+    left = tape.left[:-(-len(left) // itemsize)]
+    right = tape.right[:-(-len(right) // itemsize)]
+
+    cells = left[::-1] + right
+    start = -len(left)
+
+    # Skip the blank cells before the first non-blank cell
+    data = cells.tobytes()
+    skip = (len(data) - len(data.lstrip(b'\0'))) // itemsize
+    if skip == len(cells):      # If the tape is blank:
+        return cells[:0], 0
+
+    return cells[skip:], start + skip
+
+# Writes a tape (a tapes.ArrayTape or a dictionary in the .tape format) to a binary .tape file
+def saveBinaryTape(path, tape, startPos, blankChar, compression=ZLIB):
+    if not isinstance(tape, ArrayTape):
+        tape = ArrayTape(blankChar, tape)
+
+    cells, start = getCells(tape)
+    itemsize = 1 if len(tape.symbols) <= 256 else 2
+    if itemsize == 1:
+        cells = array('B', cells)
+
+    if compression == RLE:
+        runs = [(code, len(list(run))) for code, run in groupby(cells)]
+        payload = LENGTH.pack(len(runs)) + packArray(array('I', [length for code, length in runs])) \
+            + packArray(array(cells.typecode, [code for code, length in runs]))
+    else:
+        payload = packArray(cells)
+        if compression == ZLIB:
+            payload = zlib.compress(payload)
+
+    parts = [
+    TAPE_HEADER.pack(TAPE_MAGIC, VERSION, compression, itemsize, start, len(cells), startPos),
+    packString(blankChar),
+    packTable(tape.symbols),
+    payload
+    ]
+
+    with open(path, 'wb') as file:
+        file.write(b''.join(parts))
+
+# Reads a binary .tape file
+# Returns a tapes.ArrayTape that holds its cells (built straight from the payload), its start position and blank character
+def loadBinaryTape(path):
+    with open(path, 'rb') as file:
+        data = memoryview(file.read())
+
+    try:
+        return parseBinaryTape(data)
+    except (struct.error, zlib.error, IndexError) as error:     # Raised by a truncated or corrupt payload
+        raise ValueError('The tape file is corrupt') from error
+
+# Parses the contents of a binary .tape file (see loadBinaryTape)
+def parseBinaryTape(data):
+    if len(data) < TAPE_HEADER.size or bytes(data[:4]) != TAPE_MAGIC:
+        raise ValueError('Not a binary tape file')
+    magic, version, compression, itemsize, start, length, startPos = TAPE_HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError('Unsupported tape version {}'.format(version))
+
+    blankChar, offset = unpackString(data, TAPE_HEADER.size)
+    symbols, offset = unpackTable(data, offset)
+    payload = data[offset:]
+    typecode = 'B' if itemsize == 1 else 'H'
+
+    if compression == RLE:
+        count, = LENGTH.unpack_from(payload)
+        lengths = unpackArray('I', payload[LENGTH.size:LENGTH.size + 4*count])
+        codes = unpackArray(typecode, payload[LENGTH.size + 4*count:])
+        cells = array(typecode)
+        for code, run in zip(codes, lengths):
+            cells.extend(array(typecode, [code]) * run)
+    else:
+        if compression == ZLIB:
+            payload = zlib.decompress(payload)
+        cells = unpackArray(typecode, payload)
+
+    if len(cells) != length:
+        raise ValueError('The tape file is truncated')
+    if typecode != ArrayTape.typecode:
+        cells = array(ArrayTape.typecode, cells)
+
+    # Split the cells into the tape's arrays (see tapes.ArrayTape)
+    tape = ArrayTape(blankChar)
+    tape.symbols = symbols
+    tape.codes = {char:code for code, char in enumerate(symbols)}
+    end = start + length
+    if end > 0:
+        tape.right = array(ArrayTape.typecode, bytes(tape.right.itemsize * max(start, 0))) + cells[max(-start, 0):]
+    if start < 0:
+        tape.left = array(ArrayTape.typecode, bytes(tape.left.itemsize * max(-end, 0))) + cells[:min(length, -start)][::-1]
+
+    return tape, startPos, blankChar
+
+# Writes a machine (as in the .machine format: instructions, accept states, start state and number of tapes) to a
+# binary .machine file (compression is RAW or ZLIB)
+def saveBinaryMachine(path, instructions, acceptStates, startState, tapes=1, compression=ZLIB):
+    if compression == RLE:
+        raise ValueError('Machines cannot be run-length encoded')
+
+    # Intern symbols and states
+    symbols = [None]
+    states = [startState]
+    for i in instructions:
+        parts = (i[1], i[2]) if tapes > 1 else ([i[1]], [i[2]])
+        for part in parts:
+            symbols.extend(char for char in part if char not in symbols)
+        states.extend(state for state in (i[0], i[4]) if state not in states)
+    states.extend(state for state in acceptStates if state not in states)
+    symbolCodes = {char:code for code, char in enumerate(symbols)}
+    stateCodes = {state:code for code, state in enumerate(states)}
+
+    record = struct.Struct('<I{0}I{0}I{0}BI'.format(tapes))
+    parts = [
+    packTable(symbols),
+    packTable(states),
+    LENGTH.pack(stateCodes[startState]),
+    LENGTH.pack(len(acceptStates))
+    ]
+    parts.extend(LENGTH.pack(stateCodes[state]) for state in acceptStates)
+    parts.append(LENGTH.pack(len(instructions)))
+    for state, read, written, direction, next in instructions:
+        if tapes == 1:
+            read, written, direction = [read], [written], [direction]
+        parts.append(record.pack(stateCodes[state], *[symbolCodes[char] for char in read], *[symbolCodes[char] for char in written],
+                                 *[DIRECTIONS.index(d) for d in direction], stateCodes[next]))
+
+    payload = b''.join(parts)
+    if compression == ZLIB:
+        payload = zlib.compress(payload)
+
+    with open(path, 'wb') as file:
+        file.write(MACHINE_HEADER.pack(MACHINE_MAGIC, VERSION, compression, tapes) + payload)
+
+# Reads a binary .machine file
+# Returns a dictionary with the same contents as a JSON .machine file
+def loadBinaryMachine(path):
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    try:
+        return parseBinaryMachine(data)
+    except (struct.error, zlib.error, IndexError) as error:     # Raised by a truncated or corrupt payload
+        raise ValueError('The machine file is corrupt') from error
+
+# Parses the contents of a binary .machine file (see loadBinaryMachine)
+def parseBinaryMachine(data):
+    if len(data) < MACHINE_HEADER.size or data[:4] != MACHINE_MAGIC:
+        raise ValueError('Not a binary machine file')
+    magic, version, compression, tapes = MACHINE_HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError('Unsupported machine version {}'.format(version))
+
+    payload = data[MACHINE_HEADER.size:]
+    if compression == ZLIB:
+        payload = zlib.decompress(payload)
+
+    symbols, offset = unpackTable(payload, 0)
+    states, offset = unpackTable(payload, offset)
+    start, count = struct.unpack_from('<II', payload, offset)
+    offset += 8
+    acceptStates = [states[code] for code in struct.unpack_from('<{}I'.format(count), payload, offset)]
+    offset += 4*count
+
+    count, = LENGTH.unpack_from(payload, offset)
+    offset += LENGTH.size
+    record = struct.Struct('<I{0}I{0}I{0}BI'.format(tapes))
+    instructions = []
+    for values in record.iter_unpack(payload[offset:offset + count*record.size]):
+        read = [symbols[code] for code in values[1:1+tapes]]
+        written = [symbols[code] for code in values[1+tapes:1+2*tapes]]
+        direction = [DIRECTIONS[code] for code in values[1+2*tapes:1+3*tapes]]
+        if tapes == 1:
+            read, written, direction = read[0], written[0], direction[0]
+        instructions.append([states[values[0]], read, written, direction, states[values[-1]]])
+
+    data = {'instructions':instructions, 'acceptStates':acceptStates, 'startState':states[start]}
+    if tapes > 1:
+        data['tapes'] = tapes
+
+    return data
+
+# Reads a .machine file in either format, and returns its contents as a dictionary (as in the JSON format)
+def loadMachineData(path):
+    if isBinary(path, MACHINE_MAGIC):
+        return loadBinaryMachine(path)
+
+    with open(path, 'r') as file:
+        return json.load(file)
+
+# Reads a .tape file in either format, and returns its contents as a dictionary (as in the JSON format)
+def loadTapeData(path):
+    if isBinary(path, TAPE_MAGIC):
+        tape, startPos, blankChar = loadBinaryTape(path)
+        return {'tape':tape.toDict(), 'startPos':str(startPos), 'blankChar':blankChar}
+
+    with open(path, 'r') as file:
+        return json.load(file)
+
+# JSON Stream class - reads a JSON file a chunk at a time, so that large values (the tape dictionary of a .tape
+# file) can be parsed entry by entry instead of being loaded all at once
+class JsonStream:
+    def __init__(self, file, size, progress=None):
+        self.file = file                                            # File opened in binary mode
+        self.size = size                                            # Size of the file in bytes
+        self.progress = progress                                    # Function called with the fraction of the file read so far
+        self.decoder = codecs.getincrementaldecoder('utf-8')()      # Decodes characters split across chunks
+        self.json = json.JSONDecoder()
+        self.buffer = ''                                            # Text read but not yet parsed (from pos)
+        self.pos = 0
+        self.read = 0                                               # Number of bytes read
+        self.done = False                                           # Whether the whole file has been read
+
+    # Reads the next chunk of the file into the buffer (dropping the text already parsed)
+    # Returns False if the whole file has already been read
+    def fill(self):
+        if self.done:
+            return False
+
+        data = self.file.read(CHUNK)
+        self.done = not data
+        self.read += len(data)
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(data, self.done)
+        self.pos = 0
+
+        if self.progress is not None:
+            self.progress(self.read / self.size if self.size else 1)
+        return True
+
+    # Matches the given pattern at the current position, reading more of the file if the match could be cut off
+    # (at most one more chunk if it does not match at all)
+    # Returns the match (or NoneType if the pattern does not match), and moves past it
+    def match(self, pattern):
+        while True:
+            match = pattern.match(self.buffer, self.pos)
+            if match is None:
+                if len(self.buffer) - self.pos >= CHUNK:
+                    break
+            elif match.end() < len(self.buffer):
+                break
+            if not self.fill():
+                break
+
+        if match is not None:
+            self.pos = match.end()
+        return match
+
+    # Skips whitespace and returns the next character (without moving past it), or '' at the end of the file
+    def peek(self):
+        self.match(WHITESPACE)
+        return self.buffer[self.pos:self.pos+1]
+
+    # Moves past the given character (after any whitespace)
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('Expected {!r} in the tape file'.format(char))
+        self.pos += 1
+
+    # Parses the next JSON value and returns it
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.done:     # Numbers at the end of the buffer may be cut off
+                    break
+            except json.JSONDecodeError:
+                if self.done:
+                    raise
+            self.fill()
+
+        self.pos = end
+        return value
+
+    # Parses a tape dictionary, setting each of its cells on the given tapes.ArrayTape
+    def tape(self, tape):
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+
+        set = tape.set
+        end = ','
+        while end == ',':
+            # Parse the entries that are complete in the buffer
+            buffer = self.buffer
+            size = len(buffer)
+            match = ENTRY.match(buffer, self.pos)
+            while match is not None and (match.end() < size or self.done):
+                pos, char, null, end = match.groups()
+                if '\\' in pos:                   # Only unescape strings with escape sequences
+                    pos = json.loads('"' + pos + '"')
+                if null:
+                    char = None
+                elif '\\' in char:
+                    char = json.loads('"' + char + '"')
+                set(int(pos), char)
+
+                self.pos = match.end()
+                if end == '}':
+                    return
+                match = ENTRY.match(buffer, self.pos)
+
+            # Parse the next entry after reading more of the file
+            match = self.match(ENTRY)
+            if match is not None:
+                self.pos = match.start()    # Parsed by the loop above, now that the entry is complete
+                continue
+
+            # Any other entry is parsed as a general key and value
+            pos = self.value()
+            self.expect(':')
+            char = self.value()
+            end = self.peek()
+            if end not in (',', '}'):
+                raise ValueError('Invalid tape dictionary')
+            self.pos += 1
+            set(int(pos), char)
+
+# Reads a .tape file in either format without loading the whole file at once (the tape dictionary of a JSON
+# file is parsed a chunk at a time, straight into a tapes.ArrayTape, so the memory used is about the size of
+# the tape), calling progress with the fraction of the file read so far after each chunk
+# Returns the file's contents as a dictionary (as in the JSON format), but with the tape as a tapes.ArrayTape
+def streamTapeData(path, progress=None):
+    if isBinary(path, TAPE_MAGIC):
+        tape, startPos, blankChar = loadBinaryTape(path)
+        if progress is not None:
+            progress(1)
+        return {'tape':tape, 'startPos':str(startPos), 'blankChar':blankChar}
+
+    with open(path, 'rb') as file:
+        stream = JsonStream(file, os.fstat(file.fileno()).st_size, progress)
+        tape = ArrayTape(None)
+        data = {}
+
+        stream.expect('{')
+        if stream.peek() != '}':
+            while True:
+                key = stream.value()
+                stream.expect(':')
+                if key == 'tape':
+                    stream.tape(tape)
+                else:
+                    data[key] = stream.value()
+
+                if stream.peek() != ',':
+                    break
+                stream.pos += 1
+        stream.expect('}')
+
+    tape.blank = data.get('blankChar')
+    data['tape'] = tape
+    return data
+
+# Usage: python formats.py <input file> <output file> [--compression none|zlib|rle] [--json]
+# Converts a .tape or .machine file to the binary format (or back to JSON with --json)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert .tape and .machine files between the JSON and binary formats.')
+    parser.add_argument('input', help='.tape or .machine file (in either format)')
+    parser.add_argument('output', help='file to write')
+    parser.add_argument('--compression', choices=sorted(COMPRESSIONS), default='zlib', help='compression of the binary file (rle is only for tapes)')
+    parser.add_argument('--json', action='store_true', help='write the JSON format instead')
+    args = parser.parse_args(argv)
+
+    if args.input.endswith('.machine'):
+        data = loadMachineData(args.input)
+        if args.json:
+            with open(args.output, 'w') as file:
+                json.dump(data, file)
+        else:
+            saveBinaryMachine(args.output, data['instructions'], data['acceptStates'], data['startState'], data.get('tapes', 1), COMPRESSIONS[args.compression])
+
+    elif args.json:
+        with open(args.output, 'w') as file:
+            json.dump(loadTapeData(args.input), file)
+
+    else:
+        if isBinary(args.input, TAPE_MAGIC):
+            tape, startPos, blankChar = loadBinaryTape(args.input)
+        else:
+            data = loadTapeData(args.input)
+            tape, startPos, blankChar = data['tape'], int(data['startPos']), data['blankChar']
+        saveBinaryTape(args.output, tape, startPos, blankChar, COMPRESSIONS[args.compression])
+
+if __name__ == '__main__':
+    main()
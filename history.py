@@ -0,0 +1,152 @@
+from array import array
+from detect import restoreCells
+
+DEFAULT_BUDGET = 64 << 20   # Default memory budget of a history (bytes)
+
+# History class - records every step of a machine so that it can be stepped backwards or jump to any step
+#
+# For each step, the journal stores what is needed to undo it: the symbol code that was overwritten, the
+# state before the step and the direction the head moved (0 if the machine entered an accept state). Every
+# interval steps, a keyframe (a full copy of the configuration) is stored as well. Going to a step either
+# undoes steps from the journal, or restores the nearest keyframe before it and executes the machine forward
+# from there, whichever is fewer steps, so it takes time proportional to the distance to the nearest keyframe.
+#
+# When the journal and keyframes take up more memory than the budget, every other keyframe in the older half
+# of the history is dropped (so recent steps stay quick to reach), and if that is not enough, the oldest half
+# of the journal is dropped (those steps can still be reached from the keyframe at step 0, which is always kept).
+class History:
+    def __init__(self, instructions, tape, acceptStates, state, pos, budget=DEFAULT_BUDGET, interval=1000):
+        self.instructions = instructions    # Instructions object (or compiled transition table)
+        self.tape = tape                    # Tape object (must be a tapes.ArrayTape)
+        self.acceptStates = set(acceptStates)
+        self.budget = budget                # Maximum number of bytes used by the journal and keyframes
+        self.interval = interval            # Number of steps between keyframes
+
+        self.state = state                  # Configuration after the last recorded step
+        self.pos = pos
+        self.steps = 0
+        self.furthest = 0                   # Furthest step reached so far
+        self.halted = False                 # Whether the last recorded step entered an accept state
+
+        self.stateNames = []                # State name for each state code used in the journal
+        self.stateCodes = {}                # State code for each state name
+
+        self.first = 0                      # Step that the first journal entry undoes back to
+        self.symbols = array('H')           # Overwritten symbol code of each step
+        self.states = array('I')            # State code before each step
+        self.moves = array('b')             # Head movement of each step
+
+        self.keyframes = {}                 # (state, position, left cells, right cells) at each keyframe step
+        self.keyframeBytes = 0              # Memory used by the keyframes
+        self.addKeyframe()
+
+    # Stores a keyframe of the current configuration
+    def addKeyframe(self):
+        keyframe = (self.state, self.pos, self.tape.left.tobytes().rstrip(b'\0'), self.tape.right.tobytes().rstrip(b'\0'))
+        self.keyframes[self.steps] = keyframe
+        self.keyframeBytes += len(keyframe[2]) + len(keyframe[3])
+
+    # Returns the number of bytes used by the journal and keyframes
+    def getSize(self):
+        journal = self.symbols.itemsize + self.states.itemsize + self.moves.itemsize
+        return len(self.moves) * journal + self.keyframeBytes
+
+    # Records a step that is about to be executed from the current configuration (before anything is written)
+    def record(self, next, move):
+        if self.steps % self.interval == 0 and self.steps not in self.keyframes:
+            self.addKeyframe()
+
+        code = self.stateCodes.get(self.state)
+        if code is None:                    # If the state is new:
+            code = self.stateCodes[self.state] = len(self.stateNames)
+            self.stateNames.append(self.state)
+
+        self.symbols.append(self.tape.getCode(self.pos))
+        self.states.append(code)
+        self.moves.append(move)
+
+        self.state = next
+        self.pos += move
+        self.steps += 1
+        self.furthest = max(self.furthest, self.steps)
+        self.halted = move == 0             # The head only stays put on a step that enters an accept state
+
+        if self.getSize() > self.budget:
+            self.thin()
+
+    # Drops keyframes (and then journal entries) until the history fits in its budget
+    def thin(self):
+        while self.getSize() > self.budget:
+            steps = sorted(self.keyframes)
+            older = steps[1:len(steps)//2]  # The older half (not including step 0)
+            if older:
+                for step in older[::2]:
+                    keyframe = self.keyframes.pop(step)
+                    self.keyframeBytes -= len(keyframe[2]) + len(keyframe[3])
+                continue
+
+            # Drop the oldest half of the journal
+            count = (len(self.moves) + 1) // 2
+            if not count:
+                break
+            del self.symbols[:count], self.states[:count], self.moves[:count]
+            self.first += count
+
+    # Undoes the last recorded step
+    def undo(self):
+        self.pos -= self.moves.pop()
+        self.state = self.stateNames[self.states.pop()]
+        self.tape.setCode(self.pos, self.symbols.pop())
+        self.steps -= 1
+        self.halted = False                 # A step was executed after this one, so it did not halt
+
+    # Executes and records one step of the machine
+    # Returns False if the machine could not execute a step (because it has halted)
+    # (whether it has halted depends on how the last step ended, not on the current state, as a machine that
+    # starts in an accept state still executes its first step)
+    def forward(self):
+        if self.halted:
+            return False
+
+        instruction = self.instructions.getInstruction(self.state, self.tape.get(self.pos))
+        if instruction is None:             # If transition not defined:
+            return False
+
+        written, direction, next, index = instruction
+        move = 0 if next in self.acceptStates else {'l':-1, 'r':1}[direction]
+        pos = self.pos
+        self.record(next, move)
+        self.tape.set(pos, written)
+        return True
+
+    # Restores the keyframe at the given step (the journal is cleared, as it no longer follows on)
+    def restore(self, step):
+        self.state, self.pos, left, right = self.keyframes[step]
+        self.tape.left = restoreCells(left)
+        self.tape.right = restoreCells(right)
+        self.steps = step
+        self.halted = False                 # Keyframes are only stored before a step is executed
+
+        self.first = step
+        del self.symbols[:], self.states[:], self.moves[:]
+
+    # Goes to the configuration after the given number of steps (or the last configuration before the machine
+    # halted, if it halts before then)
+    # Returns the step that was reached
+    def seek(self, target):
+        target = max(0, target)
+        keyframe = max(step for step in self.keyframes if step <= target)
+
+        # Take whichever route needs the fewest steps
+        if target < self.steps:
+            if target < self.first or target - keyframe < self.steps - target:
+                self.restore(keyframe)
+        elif target - keyframe < target - self.steps:
+            self.restore(keyframe)
+
+        while self.steps > target:
+            self.undo()
+        while self.steps < target and self.forward():
+            pass
+
+        return self.steps
@@ -0,0 +1,258 @@
+import json
+import sys
+from engine import Instructions, loadMachine, loadTape
+from tapes import ArrayTape
+from compiler import compileMachine, ACCEPT, CRASH
+
+# Results of simulating the base machine within one block
+EXIT = 0        # The head left the block (to the left or right)
+ACCEPTED = 1    # The machine entered an accept state within the block
+CRASHED = 2     # The machine crashed within the block
+LIMIT = 3       # The step budget ran out within the block
+LOOP = 4        # The machine can never leave the block (it is stuck in a loop)
+
+# Macro Engine class - an accelerated engine for very long runs
+#
+# The tape is grouped into blocks of k cells (aligned with the start position) and stored as two
+# run-length encoded stacks of [block, repeat count], one either side of the head. The head always
+# sits on the boundary between two blocks, facing the block it is about to enter.
+#
+# A macro-transition takes (state, direction, block) to the block, state and direction that the base
+# machine leaves the block with, along with the number of base steps that it took. Macro-transitions
+# are memoised, and when one leaves the state and direction unchanged it is applied to a whole run of
+# identical blocks in one operation. Step counts are exact, so the results match engine.Engine on
+# anything that halts (or runs out of steps).
+#
+# = Halt reasons =
+# As engine.Engine, plus:
+# loop:     The machine has been proven never to halt (it is stuck within one block, or it sweeps
+#           into the blank part of the tape forever without changing state)
+class MacroEngine:
+    def __init__(self, instructions, tape, startState, acceptStates, startPos, blockSize=3):
+        # Copy the tape into a new symbol table and compile the machine with it
+        self.symbolTable = symbolTable = ArrayTape(tape.getBlank(), tape.definition)
+        self.compiled = compiled = compileMachine(instructions, acceptStates, startState, symbolTable)
+
+        self.k = k = blockSize
+        self.blank = (0,) * k                                                   # The blank block
+        self.loopBound = len(compiled.stateNames) * k * compiled.width**k       # Number of distinct configurations within a block
+        self.memo = {}                                                          # Memoised macro-transitions
+
+        self.left = []      # Runs of blocks to the left of the head (the top is adjacent to the head)
+        self.right = []     # Runs of blocks to the right of the head (the top is adjacent to the head)
+        self.inner = None   # (start position, block, offset) if the machine stopped within a block
+
+        # Split the tape into blocks (from the furthest block inwards, so the nearest block ends up on top)
+        positions = [int(pos) for pos, char in symbolTable.toDict().items()]
+        if positions:
+            first = (min(positions) - startPos) // k
+            last = (max(positions) - startPos) // k
+            for j in range(first, 0):
+                self.push(self.left, self.readBlock(startPos + j*k), 1)
+            for j in range(last, -1, -1):
+                self.push(self.right, self.readBlock(startPos + j*k), 1)
+
+        self.state = compiled.stateCodes[startState]    # Current state code
+        self.pos = startPos                             # Position of the boundary that the head sits on
+        self.dir = 1                                    # Direction the head is facing (-1 left, 1 right)
+        self.steps = 0                                  # Number of completed (base) steps
+        self.running = True
+        self.halt = None
+
+    # Returns the block of k cells starting at the given position of the initial tape
+    def readBlock(self, start):
+        return tuple(self.symbolTable.getCode(p) for p in range(start, start+self.k))
+
+    # Pushes a run of blocks on to the given stack (merging it with the top run if possible)
+    def push(self, stack, block, count):
+        if stack and stack[-1][0] == block:
+            stack[-1][1] += count
+        elif stack or block != self.blank:      # Blank blocks beyond the end of the stack are implicit
+            stack.append([block, count])
+
+    # Removes the given number of blocks from the top of the given stack
+    def pop(self, stack, count):
+        if stack:
+            top = stack[-1]
+            top[1] -= count
+            if top[1] == 0:
+                stack.pop()
+
+    # Simulates the base machine from the given offset within the given block until it leaves the block,
+    # halts, or maxSteps steps have been executed
+    # Returns (result, block, state, direction (if EXIT) or offset (otherwise), steps)
+    def simulateBlock(self, state, block, offset, maxSteps=None):
+        compiled = self.compiled
+        width = compiled.width
+        writes, moves, nexts, outcomes = compiled.writes, compiled.moves, compiled.nexts, compiled.outcomes
+
+        k = self.k
+        bound = self.loopBound
+        cells = list(block)
+        steps = 0
+
+        while True:
+            if steps == maxSteps:
+                return LIMIT, tuple(cells), state, offset, steps
+            if steps > bound:                           # If a configuration must have repeated:
+                return LOOP, tuple(cells), state, offset, steps
+
+            t = state*width + cells[offset]
+            outcome = outcomes[t]
+            if outcome == CRASH:                        # If transition not defined:
+                return CRASHED, tuple(cells), state, offset, steps
+
+            cells[offset] = writes[t]                   # Write
+            state = nexts[t]                            # Change state
+            steps += 1
+            if outcome == ACCEPT:                       # If reached an accept state:
+                return ACCEPTED, tuple(cells), state, offset, steps
+
+            offset += moves[t]                          # Move head
+            if offset < 0:
+                return EXIT, tuple(cells), state, -1, steps
+            if offset >= k:
+                return EXIT, tuple(cells), state, 1, steps
+
+    # Runs the machine until it halts or until maxSteps more steps have been executed (None for no limit)
+    def run(self, maxSteps=None):
+        if not self.running:
+            return self.getResult()
+
+        k = self.k
+        memo = self.memo
+        end = None if maxSteps is None else self.steps + maxSteps
+
+        while True:
+            remaining = None if end is None else end - self.steps
+            if remaining == 0:
+                self.halt = 'limit'
+                break
+
+            dir = self.dir
+
+            # If resuming from within a block:
+            if self.inner is not None:
+                start, block, offset = self.inner
+                self.inner = None
+                result = self.simulateBlock(self.state, block, offset, remaining)
+
+            else:
+                stack = self.right if dir == 1 else self.left
+                if stack:
+                    block, count = stack[-1]
+                else:
+                    block, count = self.blank, None     # Infinite run of blank blocks
+                start = self.pos if dir == 1 else self.pos - k
+                offset = 0 if dir == 1 else k-1
+
+                # Get the macro-transition
+                key = (self.state, dir, block)
+                result = memo.get(key)
+                if result is None:
+                    result = memo[key] = self.simulateBlock(self.state, block, offset)
+                kind, newBlock, newState, out, n = result
+
+                # If the machine passes straight through the block, pass through the whole run at once
+                if kind == EXIT and newState == self.state and out == dir and count != 1:
+                    if count is None and remaining is None:     # If sweeping into the blank tape forever:
+                        self.halt = 'loop'
+                        self.running = False
+                        break
+
+                    reps = count
+                    if remaining is not None:
+                        reps = remaining // n if count is None else min(count, remaining // n)
+
+                    if reps:
+                        self.pop(stack, reps)
+                        self.push(self.left if dir == 1 else self.right, newBlock, reps)
+                        self.pos += dir * reps * k
+                        self.steps += reps * n
+                        continue
+
+                # If the machine does not leave the block within the budget, simulate only what is left of the budget
+                if remaining is not None and (kind != EXIT or n > remaining):
+                    result = self.simulateBlock(self.state, block, offset, remaining)
+
+                self.pop(stack, 1)
+
+            kind, newBlock, self.state, out, n = result
+            self.steps += n
+
+            # If the head left the block, put the block back on the side that the head left it from
+            if kind == EXIT:
+                if out == 1:
+                    self.push(self.left, newBlock, 1)
+                    self.pos = start + k
+                else:
+                    self.push(self.right, newBlock, 1)
+                    self.pos = start
+                self.dir = out
+                continue
+
+            # Otherwise the machine stopped within the block
+            self.inner = (start, newBlock, out)
+            self.halt = {ACCEPTED:'accept', CRASHED:'crash', LIMIT:'limit', LOOP:'loop'}[kind]
+            if kind != LIMIT:
+                self.running = False
+            break
+
+        return self.getResult()
+
+    # Returns a dictionary describing the current configuration (as engine.Engine.getResult does)
+    def getResult(self):
+        symbols = self.symbolTable.symbols
+        k = self.k
+        tape = {}
+
+        # Find the boundaries of the two stacks and the head position
+        if self.inner is not None:
+            start, block, offset = self.inner
+            leftEnd = start
+            rightStart = start + k
+            head = start + offset
+            for i, code in enumerate(block):
+                if code:
+                    tape[str(start+i)] = symbols[code]
+        else:
+            leftEnd = rightStart = self.pos
+            head = self.pos if self.dir == 1 else self.pos - 1
+
+        # Expand the runs
+        p = leftEnd
+        for block, count in reversed(self.left):
+            for rep in range(count):
+                p -= k
+                for i, code in enumerate(block):
+                    if code:
+                        tape[str(p+i)] = symbols[code]
+
+        p = rightStart
+        for block, count in reversed(self.right):
+            for rep in range(count):
+                for i, code in enumerate(block):
+                    if code:
+                        tape[str(p+i)] = symbols[code]
+                p += k
+
+        return {
+        'tape':tape,
+        'pos':head,
+        'state':self.compiled.stateNames[self.state],
+        'steps':self.steps,
+        'halt':self.halt
+        }
+
+# Creates a macro engine for the given machine and tape files
+def createMacroEngine(machinePath, tapePath, blockSize=3):
+    instructions, acceptStates, startState = loadMachine(machinePath)
+    tape, startPos, blankChar = loadTape(tapePath)
+
+    return MacroEngine(Instructions(instructions), ArrayTape(blankChar, tape), startState, acceptStates, startPos, blockSize)
+
+# Usage: python macro.py <machine file> <tape file> [max steps] [block size]
+if __name__ == '__main__':
+    maxSteps = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    blockSize = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+    print(json.dumps(createMacroEngine(sys.argv[1], sys.argv[2], blockSize).run(maxSteps)))
@@ -0,0 +1,278 @@
+import json
+import sys
+from tapes import ArrayTape
+from compiler import CONTINUE, ACCEPT
+from formats import loadMachineData, loadTapeData
+
+# = Multi-tape machines =
+# A .machine file with a "tapes" entry greater than 1 describes a machine with that many tapes, each with its
+# own head. Its instructions have the same five parts as single-tape instructions, but the read, write and
+# direction parts are lists with one entry per tape, and a head can also stay where it is:
+#   ["q0", ["1", null], ["1", "1"], ["r", "r"], "q0"]
+#   directions:     l (left), r (right) or s (stay)
+# A .tape file holds the first tape as usual (tape, startPos, blankChar), and the other tapes (if any) are
+# listed in order under "otherTapes", each as {"tape":{...}, "startPos":"0"}. Tapes that are not given are blank,
+# and all tapes share the same blank character.
+
+MOVES = {'l':-1, 'r':1, 's':0}  # Head movement for each direction
+
+# Multi Instructions class - acts as a lookup table for the instructions of a multi-tape machine
+# (the same as engine.Instructions, but the read characters are looked up as a tuple with one entry per tape)
+class MultiInstructions:
+    def __init__(self, instructions):
+        # Initialise instruction dictionary
+        self.instructions = {}
+
+        # Add an entry for each instruction in the given list of instructions
+        for n, i in enumerate(instructions):
+            self.setInstruction(i[0], tuple(i[1]), tuple(i[2]), tuple(i[3]), i[4], n)
+
+    # Adds an entry for the given instruction
+    def setInstruction(self, state, reads, writes, directions, next, index):
+        stateSet = self.instructions.get(state)
+        if stateSet is None:
+            stateSet = self.instructions[state] = {}
+
+        stateSet[reads] = (writes, directions, next, index)
+
+    # Lookup function - returns the write characters, move directions and next state for the given current
+    # state and tuple of read characters (returns NoneType if there is no defined instruction)
+    def getInstruction(self, state, reads):
+        stateSet = self.instructions.get(state)
+        if stateSet is None:
+            return None
+
+        return stateSet.get(reads)
+
+# Compiled Multi Machine class - an integer transition index compiled from a MultiInstructions object
+#
+# All tapes share one symbol table (see createTapes), so a tuple of symbol codes read by the heads is packed
+# into a single integer, and the transition for state code s reading codes (c0, c1, ...) is stored under the key
+#   s*stride + c0 + c1*width + c2*width**2 + ...     (stride = width**tapes)
+# of a dictionary, as (write codes, head movements, next state code, outcome). Only the defined transitions
+# are stored, so the index stays small even though the number of possible tuples grows as width**tapes.
+class CompiledMultiMachine:
+    def __init__(self, instructions, acceptStates, startState, tapes):
+        table = instructions.instructions
+        symbolTape = tapes[0]   # Tape that owns the shared symbol table
+
+        # Intern states (start state first)
+        self.stateNames = []
+        self.stateCodes = {}
+        self.internState(startState)
+        for state, stateSet in table.items():
+            self.internState(state)
+            for writes, directions, next, index in stateSet.values():
+                self.internState(next)
+        for state in acceptStates:
+            self.internState(state)
+
+        # Intern symbols into the shared symbol table
+        for stateSet in table.values():
+            for reads, (writes, directions, next, index) in stateSet.items():
+                for char in reads + writes:
+                    symbolTape.intern(char)
+
+        self.tapes = tapes                                          # Tapes whose symbol codes the index uses
+        self.width = width = len(symbolTape.symbols)                # Number of symbols
+        self.weights = [width**i for i in range(len(tapes))]        # Multiplier of each tape's code in a key
+        self.stride = width**len(tapes)                             # Number of keys per state
+        self.accepting = [s in acceptStates for s in self.stateNames]
+
+        # Fill in the defined transitions
+        codes = symbolTape.codes
+        self.index = {}
+        for state, stateSet in table.items():
+            base = self.stateCodes[state] * self.stride
+            for reads, (writes, directions, next, index) in stateSet.items():
+                key = base + sum(codes[char]*weight for char, weight in zip(reads, self.weights))
+                nextCode = self.stateCodes[next]
+                outcome = ACCEPT if self.accepting[nextCode] else CONTINUE
+                self.index[key] = (tuple(codes[char] for char in writes), tuple(MOVES[d] for d in directions), nextCode, outcome)
+
+    # Returns the code for the given state name, interning it if it has not been seen before
+    def internState(self, state):
+        code = self.stateCodes.get(state)
+        if code is None:
+            code = len(self.stateNames)
+            self.stateNames.append(state)
+            self.stateCodes[state] = code
+
+        return code
+
+# Multi Engine class - executes a multi-tape machine headlessly with the same rules as engine.Engine
+# (every head reads, writes and moves in the same step, and the heads do not move on the final step)
+class MultiEngine:
+    def __init__(self, instructions, tapes, startState, acceptStates, startPositions):
+        # Initialise internal attributes
+        self.instructions = instructions            # MultiInstructions object
+        self.tapes = tapes                          # List of tapes.ArrayTape objects that share a symbol table (see createTapes)
+        self.state = startState
+        self.acceptStates = set(acceptStates)       # Set of accept states
+        self.positions = list(startPositions)       # Position of each head
+
+        self.steps = 0                              # Number of completed steps
+        self.running = True                         # False once the machine enters an accept state (or crashes)
+        self.halt = None                            # Reason the machine stopped ('accept', 'crash' or 'limit')
+        self.compiled = None                        # Compiled transition index
+
+    # Executes one full step (read, write, change state, move heads)
+    def step(self):
+        if not self.running:
+            return False
+
+        reads = tuple(tape.get(pos) for tape, pos in zip(self.tapes, self.positions))
+        instruction = self.instructions.getInstruction(self.state, reads)
+
+        # If transition not defined:
+        if instruction is None:
+            self.running = False
+            self.halt = 'crash'
+            return False
+
+        writes, directions, next, index = instruction   # Parse instruction
+
+        for tape, pos, char in zip(self.tapes, self.positions, writes):
+            tape.set(pos, char)             # Write
+        self.state = next                   # Change state
+        self.steps += 1
+
+        # If reached an accept state (the heads do not move on the final step):
+        if next in self.acceptStates:
+            self.running = False
+            self.halt = 'accept'
+            return False
+
+        self.positions = [pos + MOVES[d] for pos, d in zip(self.positions, directions)]     # Move heads
+        return True
+
+    # Runs the machine until it halts or until maxSteps more steps have been executed (None for no limit),
+    # and returns a dictionary describing the final configuration
+    def run(self, maxSteps=None):
+        self.advance(maxSteps)
+        return self.getResult()
+
+    # Returns the compiled transition index, (re)compiling it if there is no index yet, or if the symbol table
+    # or current state is not covered by it
+    def getCompiled(self):
+        compiled = self.compiled
+        if compiled is None or compiled.width != len(self.tapes[0].symbols) or self.state not in compiled.stateCodes:
+            compiled = self.compiled = CompiledMultiMachine(self.instructions, self.acceptStates, self.state, self.tapes)
+
+        return compiled
+
+    # Runs the machine like run, but only returns the halt reason (so it does not have to convert the tapes)
+    def advance(self, maxSteps=None):
+        if not self.running:
+            return self.halt
+
+        compiled = self.getCompiled()
+
+        # Local references to avoid attribute lookups in the main loop
+        index = compiled.index
+        stride = compiled.stride
+        heads = list(zip(self.tapes, compiled.weights))
+        getCode = ArrayTape.getCode
+        setCode = ArrayTape.setCode
+
+        state = compiled.stateCodes[self.state]
+        positions = self.positions
+        steps = self.steps
+        end = None if maxSteps is None else steps + maxSteps
+        halt = 'limit'
+
+        while steps != end:
+            # Pack the codes read by the heads into a key
+            key = state*stride
+            for (tape, weight), pos in zip(heads, positions):
+                key += getCode(tape, pos)*weight
+
+            transition = index.get(key)
+            if transition is None:          # If transition not defined:
+                halt = 'crash'
+                break
+
+            writes, moves, state, outcome = transition
+            for (tape, weight), pos, code in zip(heads, positions, writes):
+                setCode(tape, pos, code)
+            steps += 1
+
+            if outcome == ACCEPT:           # If reached an accept state:
+                halt = 'accept'
+                break
+
+            positions = [pos + move for pos, move in zip(positions, moves)]
+
+        # Store the final configuration
+        self.state = compiled.stateNames[state]
+        self.positions = positions
+        self.steps = steps
+        self.halt = halt
+        if halt != 'limit':
+            self.running = False
+
+        return halt
+
+    # Returns a dictionary describing the current configuration
+    def getResult(self):
+        return {
+        'tapes':[tape.toDict() for tape in self.tapes],
+        'positions':self.positions,
+        'state':self.state,
+        'steps':self.steps,
+        'halt':self.halt
+        }
+
+# Creates one tapes.ArrayTape for each of the given tape dictionaries, all sharing one symbol table
+def createTapes(blankChar, definitions):
+    tapes = []
+    for definition in definitions:
+        tape = ArrayTape(blankChar)
+        if tapes:                                   # Share the first tape's symbol table
+            tape.symbols = tapes[0].symbols
+            tape.codes = tapes[0].codes
+        for pos, char in definition.items():
+            tape.set(int(pos), char)
+        tapes.append(tape)
+
+    return tapes
+
+# Loads a .machine file (single-tape or multi-tape, in either format) and returns its instructions in the
+# multi-tape format, accept states, start state and number of tapes
+def loadMachine(path):
+    data = loadMachineData(path)
+
+    count = data.get('tapes', 1)
+    instructions = data['instructions']
+    if count == 1 and instructions and not isinstance(instructions[0][1], list):   # If a single-tape machine:
+        instructions = [[i[0], [i[1]], [i[2]], [i[3]], i[4]] for i in instructions]
+
+    return instructions, data['acceptStates'], data['startState'], count
+
+# Loads a .tape file for a machine with the given number of tapes, and returns its tape dictionaries, start
+# positions (as integers) and blank character (tapes that are not in the file are blank, starting at 0)
+# (a binary .tape file only holds the first tape - see formats.py)
+def loadTapes(path, count):
+    data = loadTapeData(path)
+
+    others = data.get('otherTapes', [])
+    if len(others) >= count:
+        raise ValueError('The tape file has {} tapes, but the machine only has {}'.format(len(others) + 1, count))
+
+    tapes = [data['tape']] + [other['tape'] for other in others]
+    startPositions = [int(data['startPos'])] + [int(other['startPos']) for other in others]
+    padding = count - len(tapes)
+
+    return tapes + [{}]*padding, startPositions + [0]*padding, data['blankChar']
+
+# Creates a multi-tape engine for the given machine and tape files
+def createEngine(machinePath, tapePath):
+    instructions, acceptStates, startState, count = loadMachine(machinePath)
+    tapes, startPositions, blankChar = loadTapes(tapePath, count)
+
+    return MultiEngine(MultiInstructions(instructions), createTapes(blankChar, tapes), startState, acceptStates, startPositions)
+
+# Usage: python multitape.py <machine file> <tape file> [max steps]
+if __name__ == '__main__':
+    maxSteps = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    print(json.dumps(createEngine(sys.argv[1], sys.argv[2]).run(maxSteps)))
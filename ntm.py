@@ -0,0 +1,336 @@
+import argparse
+import hashlib
+import json
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from engine import loadMachine, loadTape
+
+DEFAULT_FRONTIER = 1 << 20  # Default maximum number of configurations kept (visited by bfs, or explored by iddfs)
+PARALLEL = 1024             # Smallest frontier that is shared between worker processes
+HEAD = struct.Struct('<Ii') # State code and head index at the start of an encoded configuration
+MOVES = {'l':-1, 'r':1}
+
+# = Nondeterministic machines =
+# A nondeterministic machine can have several instructions for the same state and read character, and it
+# accepts a tape if any sequence of choices leads to an accept state. The .machine format is the same as for
+# deterministic machines (engine.Instructions keeps only the last of several such instructions, so they have
+# to be run with ntm.py).
+#
+# A configuration is encoded as bytes: HEAD (state code and the index of the head in the cells), followed by
+# one byte per cell (its symbol code) from the first to the last non-blank cell. The encoding does not include
+# where the cells are on the tape, so configurations that differ only by where they are on the tape (which
+# behave the same from then on) are the same. Visited configurations are remembered by a 16-byte hash.
+#
+# = Halt reasons =
+# accept:   Some sequence of choices reaches an accept state (the shortest such sequence is reported)
+# reject:   Every sequence of choices crashes or comes back to a configuration that was already explored
+# limit:    No sequence of choices reaches an accept state within the step budget
+# frontier: The search needed to keep more configurations than the frontier cap
+
+# Nondeterministic Instructions class - acts as a lookup table for the instructions of a nondeterministic machine
+# (the same as engine.Instructions, but every instruction for a state and read character is kept)
+class NondeterministicInstructions:
+    def __init__(self, instructions):
+        # Initialise instruction dictionary
+        self.instructions = {}
+
+        # Add an entry for each instruction in the given list of instructions
+        for n, i in enumerate(instructions):
+            self.addInstruction(i[0], i[1], i[2], i[3], i[4], n)
+
+    # Adds an entry for the given instruction
+    def addInstruction(self, state, read, written, direction, next, index):
+        stateSet = self.instructions.get(state)
+        if stateSet is None:
+            stateSet = self.instructions[state] = {}
+
+        stateSet.setdefault(read, []).append((written, direction, next, index))
+
+    # Lookup function - returns a list of every (write character, move direction, next state, index) choice
+    # for the given current state and read character (empty if there is no defined instruction)
+    def getInstructions(self, state, read):
+        stateSet = self.instructions.get(state)
+        if stateSet is None:
+            return []
+
+        return stateSet.get(read, [])
+
+# Nondeterministic Machine class - the transitions of a nondeterministic machine compiled to symbol and state codes
+#
+# table[(state code, symbol code)] is a tuple of the choices for that transition, each of which is
+# (write code, head movement, next state code, whether the next state is an accept state, instruction index)
+class NondeterministicMachine:
+    def __init__(self, instructions, acceptStates, startState, tape):
+        self.symbols = [None]   # Symbol for each code (code 0 is the blank cell)
+        self.codes = {None:0}   # Code for each symbol
+        self.stateNames = []    # State name for each code
+        self.stateCodes = {}    # Code for each state name
+
+        self.internState(startState)
+        for char in tape.values():
+            self.intern(char)
+
+        self.table = {}
+        for state, stateSet in instructions.instructions.items():
+            for read, choices in stateSet.items():
+                key = (self.internState(state), self.intern(read))
+                self.table[key] = tuple((self.intern(written), MOVES[direction], self.internState(next), next in acceptStates, index)
+                                        for written, direction, next, index in choices)
+
+    # Returns the code for the given symbol, interning it if it has not been seen before
+    def intern(self, char):
+        code = self.codes.get(char)
+        if code is None:
+            code = len(self.symbols)
+            if code > 255:
+                raise ValueError('Too many distinct tape symbols')
+            self.symbols.append(char)
+            self.codes[char] = code
+
+        return code
+
+    # Returns the code for the given state name, interning it if it has not been seen before
+    def internState(self, state):
+        code = self.stateCodes.get(state)
+        if code is None:
+            code = len(self.stateNames)
+            self.stateNames.append(state)
+            self.stateCodes[state] = code
+
+        return code
+
+    # Returns the encoded start configuration for the given tape dictionary, start position and start state
+    def getRoot(self, tape, startPos, startState):
+        cells = {int(pos):self.codes[char] for pos, char in tape.items() if char is not None}
+        if not cells:
+            return encode(self.stateCodes[startState], 0, b'')
+
+        start = min(cells)
+        data = bytearray(max(cells) - start + 1)
+        for pos, code in cells.items():
+            data[pos - start] = code
+
+        return encode(self.stateCodes[startState], startPos - start, bytes(data))
+
+# Returns the encoding of a configuration (see above), trimming the blank cells from both ends of the cells
+def encode(state, head, cells):
+    trimmed = cells.lstrip(b'\0')
+    head -= len(cells) - len(trimmed)
+    trimmed = trimmed.rstrip(b'\0')
+    if not trimmed:                 # The head position does not matter on a blank tape
+        head = 0
+
+    return HEAD.pack(state, head) + trimmed
+
+# Returns the hash that a visited configuration is remembered by
+def getDigest(config):
+    return hashlib.blake2b(config, digest_size=16).digest()
+
+# Returns every configuration that an encoded configuration can step to, as a list of
+# (configuration, instruction index, whether it is in an accept state)
+def getSuccessors(config, table):
+    state, head = HEAD.unpack_from(config)
+    cells = config[HEAD.size:]
+    read = cells[head] if 0 <= head < len(cells) else 0
+
+    successors = []
+    for written, move, next, accepting, index in table.get((state, read), ()):
+        data = bytearray(cells)
+        i = head
+        if i < 0:                       # Extend the cells to reach the head
+            data[0:0] = bytes(-i)
+            i = 0
+        elif i >= len(data):
+            data.extend(bytes(i - len(data) + 1))
+
+        data[i] = written
+        if not accepting:               # The head does not move on the final step
+            i += move
+
+        successors.append((encode(next, i, bytes(data)), index, accepting))
+
+    return successors
+
+workerTable = None  # Transition table of the machine being explored (in worker processes)
+
+# Initialises a worker process with the transition table of the machine being explored
+def setWorkerTable(table):
+    global workerTable
+    workerTable = table
+
+# Returns the successors of each of a chunk of configurations (in a worker process)
+def expandChunk(configs):
+    return [getSuccessors(config, workerTable) for config in configs]
+
+# Returns the instruction indices of the steps that lead from the start configuration to the given one
+def tracePath(parents, digest):
+    path = []
+    while parents[digest] is not None:
+        digest, index = parents[digest]
+        path.append(index)
+
+    return path[::-1]
+
+# Explores the configurations of a machine breadth-first, one step at a time, until one of them reaches an accept
+# state, there are none left, maxSteps steps have been explored (None for no limit), or more than frontierCap
+# configurations have been visited (every visited configuration is kept, to trace the path back from the accept
+# state and so that none is explored twice, so the cap bounds the memory used)
+# With more than one worker, each large enough step is shared between worker processes
+# Returns the halt reason, the path to the accept state (None if not accepted), the number of steps explored and
+# the number of distinct configurations visited
+def exploreBreadthFirst(machine, root, maxSteps=None, frontierCap=DEFAULT_FRONTIER, workers=1):
+    parents = {getDigest(root):None}    # Parent hash and instruction index of each visited configuration (None for the root)
+    frontier = [root]
+    depth = 0
+
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(workers, initializer=setWorkerTable, initargs=(machine.table,))
+
+    try:
+        while frontier:
+            if depth == maxSteps:
+                return 'limit', None, depth, len(parents)
+
+            if pool is not None and len(frontier) >= PARALLEL:
+                size = -(-len(frontier) // (4*workers))
+                chunks = [frontier[i:i+size] for i in range(0, len(frontier), size)]
+                successors = [s for result in pool.map(expandChunk, chunks) for s in result]
+            else:
+                successors = [getSuccessors(config, machine.table) for config in frontier]
+            depth += 1
+
+            nextFrontier = []
+            for config, children in zip(frontier, successors):
+                parent = getDigest(config)
+                for child, index, accepting in children:
+                    digest = getDigest(child)
+                    if digest in parents:       # If the configuration was already visited:
+                        continue
+
+                    parents[digest] = (parent, index)
+                    if accepting:
+                        return 'accept', tracePath(parents, digest), depth, len(parents)
+                    if len(parents) > frontierCap:
+                        return 'frontier', None, depth, len(parents)
+                    nextFrontier.append(child)
+
+            frontier = nextFrontier
+
+        return 'reject', None, depth, len(parents)
+
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+# Explores the configurations of a machine by iterative deepening: a depth-first search up to 1 step, then up to
+# 2 steps, and so on, until one of them reaches an accept state, there is nothing deeper to explore, or maxSteps
+# steps have been explored (None for no limit)
+# Memory only grows with the length of the path being explored, apart from a table of explored configurations
+# (so that they are not explored again in the same iteration), which holds at most frontierCap configurations
+# Returns the same as exploreBreadthFirst
+def exploreDepthFirst(machine, root, maxSteps=None, frontierCap=DEFAULT_FRONTIER):
+    table = machine.table
+    limit = 0
+    visited = 1
+
+    while True:
+        if limit == maxSteps:
+            return 'limit', None, limit, visited
+        limit += 1
+
+        explored = {getDigest(root):limit}  # Number of steps that were left to explore from each explored configuration
+        deeper = False                      # Whether any configuration was cut off by the limit
+        path = []                           # Instruction index of each step to the current configuration
+        stack = [iter(getSuccessors(root, table))]
+
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:               # If every choice has been explored:
+                stack.pop()
+                if path:
+                    path.pop()
+                continue
+
+            config, index, accepting = child
+            if accepting:
+                return 'accept', path + [index], len(path) + 1, max(visited, len(explored))
+
+            remaining = limit - len(path) - 1
+            successors = getSuccessors(config, table)
+            if not successors:              # If every choice crashes:
+                continue
+            if remaining == 0:
+                deeper = True
+                continue
+
+            digest = getDigest(config)
+            if explored.get(digest, -1) >= remaining:   # If already explored at least as deep:
+                continue
+            if digest in explored or len(explored) < frontierCap:
+                explored[digest] = remaining
+
+            path.append(index)
+            stack.append(iter(successors))
+
+        visited = max(visited, len(explored))
+        if not deeper:
+            return 'reject', None, limit, visited
+
+# Returns the configuration reached by following the given path of instruction indices from the given start configuration
+# (as the tape dictionary, head position and state)
+def replay(instructions, tape, startPos, startState, path):
+    tape = dict(tape)
+    pos = startPos
+    state = startState
+
+    for n, index in enumerate(path):
+        current, read, written, direction, state = instructions[index]
+        tape[str(pos)] = written
+        if n < len(path) - 1:       # The head does not move on the final step
+            pos += MOVES[direction]
+
+    return {p:c for p, c in tape.items() if c is not None}, pos, state
+
+# Explores every computation of a nondeterministic machine on a tape (strategy is 'bfs' or 'iddfs') and returns a
+# dictionary describing the result (along with the path of instruction indices and the final configuration if accepted)
+def explore(instructions, acceptStates, startState, tape, startPos, maxSteps=None, frontierCap=DEFAULT_FRONTIER, strategy='bfs', workers=1):
+    machine = NondeterministicMachine(NondeterministicInstructions(instructions), set(acceptStates), startState, tape)
+    root = machine.getRoot(tape, startPos, startState)
+
+    if strategy == 'bfs':
+        halt, path, depth, visited = exploreBreadthFirst(machine, root, maxSteps, frontierCap, workers)
+    elif strategy == 'iddfs':
+        halt, path, depth, visited = exploreDepthFirst(machine, root, maxSteps, frontierCap)
+    else:
+        raise ValueError('Unknown strategy {}'.format(strategy))
+
+    result = {
+    'halt':halt,
+    'steps':depth,
+    'configurations':visited
+    }
+
+    if halt == 'accept':            # Describe the accepting computation
+        result['path'] = path
+        result['tape'], result['pos'], result['state'] = replay(instructions, tape, startPos, startState, path)
+
+    return result
+
+# Usage: python ntm.py <machine file> <tape file> [options] (see --help)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Explore every computation of a nondeterministic machine.')
+    parser.add_argument('machine', help='.machine file (may have several instructions for the same state and read character)')
+    parser.add_argument('tape', help='.tape file')
+    parser.add_argument('--max-steps', type=int, default=None, help='step budget')
+    parser.add_argument('--frontier-cap', type=int, default=DEFAULT_FRONTIER, help='maximum number of configurations to keep')
+    parser.add_argument('--strategy', choices=('bfs', 'iddfs'), default='bfs', help='breadth-first search or iterative deepening')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes (bfs only)')
+    args = parser.parse_args(argv)
+
+    instructions, acceptStates, startState = loadMachine(args.machine)
+    tape, startPos, blankChar = loadTape(args.tape)
+    print(json.dumps(explore(instructions, acceptStates, startState, tape, startPos, args.max_steps, args.frontier_cap, args.strategy, args.workers)))
+
+if __name__ == '__main__':
+    main()
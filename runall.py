@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import sys
+import time
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+from engine import createEngine
+
+CHUNK = 1 << 16     # Number of steps that a job runs between checks of the wall-clock timeout
+GRACE = 1           # Seconds after its timeout before a job that has not stopped by itself is killed
+
+# Finds every (machine file, tape file) pair under the given paths
+# Every .machine file is paired with every .tape file in the same directory (as in DemoProjects), and every
+# .machine file given directly is paired with every .tape file given directly
+def discover(paths):
+    directories = []
+    given = []      # Files given directly
+
+    for path in paths:
+        if os.path.isfile(path):
+            given.append(path)
+        else:
+            directories += sorted((root, [os.path.join(root, f) for f in sorted(files)]) for root, dirs, files in os.walk(path))
+    if given:
+        directories.append(('', given))
+
+    jobs = []
+    for root, files in directories:
+        machines = [f for f in files if f.endswith('.machine')]
+        tapes = [f for f in files if f.endswith('.tape')]
+        for machine in machines:
+            for tape in tapes:
+                jobs.append((machine, tape))
+
+    return jobs
+
+# Runs one job until it halts, runs out of steps or runs out of time (in a worker process)
+def runJob(job, maxSteps, timeout, detectLoops, detectCyclers, includeTape):
+    machinePath, tapePath = job
+    start = time.monotonic()
+
+    try:
+        engine = createEngine(machinePath, tapePath)
+
+        # Run in chunks so that the timeout can be checked
+        while True:
+            chunk = CHUNK if maxSteps is None else min(CHUNK, maxSteps - engine.steps)
+            halt = engine.advance(chunk, detectLoops, detectCyclers)
+
+            if halt != 'limit' or engine.steps == maxSteps:
+                break
+            if timeout is not None and time.monotonic() - start >= timeout:
+                halt = 'timeout'
+                break
+
+        result = engine.getResult()
+        result['halt'] = halt
+
+    except Exception as error:
+        result = {'halt':None, 'error':'{}: {}'.format(type(error).__name__, error)}
+
+    if not includeTape:
+        result.pop('tape', None)
+
+    result['machineFile'] = machinePath
+    result['tapeFile'] = tapePath
+    result['time'] = round(time.monotonic() - start, 6)
+    return result
+
+# Runs a job in a worker process, and sends its result back through the given connection
+def runWorker(connection, job, *options):
+    connection.send(runJob(job, *options))
+    connection.close()
+
+# Runs every job in worker processes, at most workers at a time, calling output with each result as it finishes
+#
+# Every job runs in its own process, so a job that kills its worker (e.g. by running out of memory) is reported
+# as an error without affecting the others. A job checks its own timeout between chunks of steps, so that its
+# result can still be reported, but the deadline is enforced here as well: a job that is still running GRACE
+# seconds after its timeout (e.g. because it is stuck loading a huge tape) is killed and reported as a timeout.
+def runAll(jobs, output, workers=None, maxSteps=None, timeout=None, detectLoops=False, detectCyclers=False, includeTape=False):
+    workers = workers or os.cpu_count() or 1
+    options = (maxSteps, timeout, detectLoops, detectCyclers, includeTape)
+    queue = deque(jobs)     # Jobs that have not been run yet
+    running = {}            # Process, job, start time and deadline of each running job (by the connection of its result)
+
+    while queue or running:
+        # Keep every worker busy
+        while queue and len(running) < workers:
+            job = queue.popleft()
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=runWorker, args=(sender, job) + options, daemon=True)
+            process.start()
+            sender.close()      # Only the worker writes to it, so receiving fails once the worker has exited
+
+            start = time.monotonic()
+            running[receiver] = (process, job, start, None if timeout is None else start + timeout + GRACE)
+
+        # Wait until a job finishes or the next deadline passes
+        deadlines = [deadline for process, job, start, deadline in running.values() if deadline is not None]
+        ready = wait(list(running), None if not deadlines else max(0, min(deadlines) - time.monotonic()))
+
+        for receiver in ready:
+            process, job, start, deadline = running.pop(receiver)
+            try:
+                result = receiver.recv()
+            except EOFError:    # The worker died without sending a result
+                result = {'halt':None, 'error':'Worker process died', 'machineFile':job[0], 'tapeFile':job[1]}
+            receiver.close()
+            process.join()
+            output(result)
+
+        # Kill the jobs that are past their deadline
+        now = time.monotonic()
+        for receiver, (process, job, start, deadline) in list(running.items()):
+            if deadline is not None and now >= deadline:
+                process.kill()
+                process.join()
+                receiver.close()
+                del running[receiver]
+                output({'halt':'timeout', 'machineFile':job[0], 'tapeFile':job[1], 'time':round(now - start, 6)})
+
+# Usage: python runall.py <directory or file>... [options] (see --help)
+# Prints the result of each job as a line of JSON as soon as it finishes
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run every machine on every tape in the same directory, in parallel.')
+    parser.add_argument('paths', nargs='+', help='directories to search for .machine and .tape files, or .machine and .tape files to pair with each other')
+    parser.add_argument('--max-steps', type=int, default=None, help='step budget for each job')
+    parser.add_argument('--timeout', type=float, default=None, help='wall-clock time limit for each job (seconds)')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of cores)')
+    parser.add_argument('--loops', action='store_true', help='stop machines whose configuration repeats')
+    parser.add_argument('--cyclers', action='store_true', help='stop machines that repeat a pattern while drifting along the tape')
+    parser.add_argument('--tape', action='store_true', help='include the final tape in the results')
+    parser.add_argument('--output', default=None, help='file to write the results to (default: standard output)')
+    args = parser.parse_args(argv)
+
+    file = sys.stdout if args.output is None else open(args.output, 'w')
+
+    # Writes one result as a line of JSON
+    def output(result):
+        file.write(json.dumps(result) + '\n')
+        file.flush()
+
+    try:
+        runAll(discover(args.paths), output, args.workers, args.max_steps, args.timeout, args.loops, args.cyclers, args.tape)
+    finally:
+        if file is not sys.stdout:
+            file.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,15 @@
 import pygame
 from math import ceil, floor, sin, pi
+from engine import Instructions
+from tapes import ArrayTape
+from compiler import compileMachine
+from history import History, DEFAULT_BUDGET
+from multitape import MultiInstructions, MOVES, createTapes
+from counters import Counters
+from collections import OrderedDict
+
+GLYPH_BUDGET = 4 << 20      # Memory budget of the rendered text cache (bytes)
+TILE_ROWS = 16              # Number of instruction table rows rendered onto each tile
 
 # Initialises simulation by calculating values and setting defaults
 def initialise(dim, cellSize):
@@ -22,10 +32,11 @@ def initialise(dim, cellSize):
     'cell':tapeFonts['cell'],
     'table1':tableFonts['table1'],
     'table2':tableFonts['table2'],
+    'ui':pygame.font.SysFont('consolas', 16, True)
     }
 
     palette = {'bg':(240, 240, 240), 'main':(0, 0, 0), 'error':(255, 0, 0),     # Colour palette
-    'accept':(0, 255, 0), 'state':(255, 255, 255), 'secondary':(200, 200, 200)}
+    'accept':(0, 255, 0), 'state':(255, 255, 255), 'secondary':(200, 200, 200), 'heat':(255, 120, 0)}
 
     # Output dictionary
     sim = {
@@ -45,6 +56,7 @@ def initialise(dim, cellSize):
 
 # Generates the tape fonts based on the size of the tape's cells
 def generateTapeFonts(cellSize):
+    glyphCache.clear()      # Text rendered in the old fonts will not be drawn again
     return {
     'detail':pygame.font.SysFont('consolas', 20*cellSize//80, True),
     'cell':pygame.font.SysFont('consolas', 40*cellSize//70, True)
@@ -58,71 +70,26 @@ def generateTableFonts(rowHeight):
     'table2':pygame.font.SysFont('consolas', rowHeight//2, True)
     }
 
-# Instructions class - acts as a lookup table for machine instructions
-class Instructions:
-    def __init__(self, instructions):
-        # Initialise instruction dictionary
-        self.instructions = {}
-
-        # Add an entry for each instruction in the given list of instructions
-        for n, i in enumerate(instructions):
-            self.setInstruction(i[0], i[1], i[2], i[3], i[4], n)
-
-    # Adds an entry for the given instruction
-    def setInstruction(self, state, read, written, direction, next, index):
-        stateSet = self.instructions.get(state)             # Try to get the inner dictionary that represents the given current state
-        if stateSet is None:                                # If dictionary does not yet exist:
-            stateSet = {}                                   # Create the dictionary
-            self.instructions[state] = stateSet             # Create new entry in outer dictionary for the new dictionary
-
-        stateSet[read] = (written, direction, next, index)  # Create a new entry in the inner dictionary for the given read character
-
-    # Lookup function - returns the write character, move direction and next
-    # state for the given current state and read character
-    def getInstruction(self, state, read):
-        stateSet = self.instructions.get(state)     # Try to get the inner dictionary for the current state
-        if stateSet is None:                        # If the inner dictionary does not exist:
-            return None
-
-        return stateSet.get(read)                   # Return the instruction information (returns none if there is no defined
-                                                    # instruction for the given current state and read character)
-
-# Tape class - handles reading from and writing to the tape
-class Tape:
-    def __init__(self, blank, definition={}):
-        self.blank = blank              # Set blank character
-        self.definition = definition    # Set the dictionary that stores the values of (non-blank) cells
-
-    # Gets the value of the cell at the given position (returns NoneType if cell is blank)
-    def get(self, pos):
-        char = self.definition.get(str(pos))
-
-        return char
-
-    # Sets the value of the cell at the given position to the given value
-    def set(self, pos, char):
-        self.definition[str(pos)] = char
-
-    # Returns the string that represents a blank cell
-    def getBlank(self):
-        return self.blank
-
 # Machine class - Handles animation, execution and Turing Machine logic
 class Machine:
-    def __init__(self, instructions, tape, startState, acceptStates, startPos, palette, instructionTable, speed=1):
+    def __init__(self, instructions, tape, startState, acceptStates, startPos, palette, instructionTable, speed=1, historyBudget=DEFAULT_BUDGET):
         # Initialise internal attributes
-        self.instructions = instructions            # Instructions object
+        self.instructions = instructions            # Instructions object (or compiled transition table)
         self.tape = tape                            # Tape object
         self.state = startState
-        self.acceptStates = acceptStates            # List of accept states
+        self.acceptStates = set(acceptStates)       # Set of accept states
         self.pos = startPos
         self.instructionTable = instructionTable    # Instruction table object
+        self.history = None                         # Record of every step (for stepping backwards, None if not recorded)
+        if historyBudget is not None:
+            self.history = History(instructions, tape, acceptStates, startState, startPos, historyBudget)
 
         self.direction = None                       # The direction that the head is going to move
         self.written = None                         # The string that the head is going to write
         self.next = None                            # The next state that the machine is going to enter
         self.instructionIndex = None                # The index of the instruction currently being executed
         self.running = True                         # False once the machine enters an accept state (or crashes)
+        self.counters = None                        # Counters shown as a heatmap (see counters.py, None while the heatmap is hidden)
 
         self.speed = speed                          # Speed of animation
         self.phase = 0                              # The current phase of animation
@@ -132,6 +99,10 @@ class Machine:
         self.colour = palette['main']               # Set head colour to default colour
         self.phaseCtr = 0                           # Stores how many more parts of a step the machine has to execute (-1 if runnung continuously)
 
+        self.resetAnim()
+
+    # Sets the animation parameters to their resting values
+    def resetAnim(self):
         self.anim = {                               # Animation parameters - keeps track of how things should look at any given time
         'tapeOffset': 0,
         'headOffset': 0,
@@ -153,6 +124,53 @@ class Machine:
     def isStandby(self):
         return self.phaseCtr == 0 and self.running and not self.animating
 
+    # Machine able to jump to another step? (a step is recorded as soon as its instruction is read, before
+    # its cell is written, so the machine can only jump between steps, not from partway through one)
+    def canSeek(self):
+        return self.history is not None and (not self.running or (self.isStandby() and self.phase == 0))
+
+    # Jumps to the configuration after the given number of steps (see history.History.seek)
+    def seek(self, target, palette):
+        self.history.seek(target)
+        self.state = self.history.state
+        self.pos = self.history.pos
+
+        # Reset the animation to the start of a step
+        self.direction = None
+        self.written = None
+        self.next = None
+        self.instructionIndex = None
+        self.instructionTable.currentIndex = -1
+        self.phase = 0
+        self.phaseCtr = 0
+        self.animating = None
+        self.resetAnim()
+
+        if self.counters is not None:           # Start counting again from this step
+            self.counters = self.instructionTable.counters = Counters(len(self.counters.hits))
+
+        self.colour = palette['main']
+        self.running = True
+        if self.history.halted:                 # If the machine has halted at this step:
+            self.colour = palette['accept']
+            self.running = False
+
+    # Returns the value of the cell under the head
+    def read(self):
+        return self.tape.get(self.pos)
+
+    # Records a step that read cell and writes written with the instruction with the given index into the counters
+    def count(self, cell, written, index):
+        self.counters.record(index, self.pos, written != cell)
+
+    # Shows the heatmap of how often each instruction and cell is used from now on, or hides it if it is shown
+    def toggleHeatmap(self):
+        if self.counters is None:
+            self.counters = Counters(self.instructionTable.numInstructions)
+        else:
+            self.counters = None
+        self.instructionTable.counters = self.counters
+
     # Actually writes value to tape
     def writeAct(self):
         self.tape.set(self.pos, self.written)
@@ -270,25 +288,43 @@ class Machine:
         midY = centre[1]
 
         # = Tape =
-        offset = self.anim['tapeOffset']                    # Get tape offset parameter
+        written = None
+        if not self.animating is None and self.animating[0] == 'w':     # If in the middle of the write animation:
+            written = self.animating[1:]                                # Get value currently being written
+        self.drawTape(display, fonts, palette, dim, (midX, midY), cellSize, self.tape, self.pos, self.anim['tapeOffset'], written, drawDetail)
+
+        # = Read/Write Head =
+        self.drawHead(display, fonts, palette, (midX, midY), cellSize, drawDetail)
+
+    # Draws a tape with the given head position, centred at the given coordinates
+    # offset is the tape offset parameter, and written is the value being written at the head (None if not writing)
+    def drawTape(self, display, fonts, palette, dim, centre, cellSize, tape, pos, offset, written, drawDetail=False):
+        midX = centre[0]
+        midY = centre[1]
+
         pOffset = offset * cellSize                         # Calculate the actual offset in pixels
-        truePos = self.pos - offset                         # Calculate the true positin of the read/write head for this frame of animation
         sideCells = ceil((dim[0]/cellSize - 1) / 2) + 1     # Calculate the number of cells either side of the central one that must be drawn
 
+        counters = self.counters if tape is self.tape else None     # Only the first tape has a heatmap
+
         # For each cell that must be drawn:
         for c in range(-sideCells, sideCells+1):
             x = midX + c*cellSize   # Calculate the x coordinate of the center of the current cell
+            # Heatmap tint
+            if counters is not None:
+                heat = counters.getCellHeat(c + pos)
+                if heat:
+                    pygame.draw.rect(display, getHeatColour(palette, heat), (x-cellSize//2 + pOffset, midY-cellSize//2, cellSize, cellSize))
             # Cell border
             pygame.draw.rect(display, palette['main'], (x-cellSize//2 + pOffset, midY-cellSize//2, cellSize, cellSize), 1)
 
-            p = c + self.pos                    # Get the tape position of the current cell
-            char = self.tape.get(p)             # Get the character at this cell
+            p = c + pos                         # Get the tape position of the current cell
+            char = tape.get(p)                  # Get the character at this cell
             if char is None:                    # If the blank character:
-                char = self.tape.getBlank()     # Get the blank character
+                char = tape.getBlank()          # Get the blank character
 
             # If in the middle of the write animation the current cell is the middle one:
-            if c == 0 and not self.animating is None and self.animating[0] == 'w':
-                written = self.animating[1:]            # Get value currently being written
+            if c == 0 and not written is None:
                 charOffset = self.anim['charOffset']    # Get character offset parameter
                 pCharOffset = charOffset * cellSize     # Calculate the actual offset in pixels
 
@@ -310,7 +346,11 @@ class Machine:
                 # Draw the cell position label
                 drawCentredText(display, str(p), fonts['detail'], palette['main'], (x + pOffset, midY+ 2*cellSize//3))
 
-        # = Read/Write Head =
+    # Draws the read/write head above a tape centred at the given coordinates
+    def drawHead(self, display, fonts, palette, centre, cellSize, drawDetail=False):
+        midX = centre[0]
+        midY = centre[1]
+
         offset = self.anim['headOffset']                # Get head offset parameter
         pOffset = offset * cellSize//4                  # Calculate the actual offset in pixels
         arrowTop = midY - 5*cellSize//4 + pOffset       # Calculate the y coordinate of the top of the arrow
@@ -366,7 +406,7 @@ class Machine:
 
             # = Read =
             elif self.phase == 1:
-                cell = self.tape.get(self.pos)                                      # Read the current cell's value
+                cell = self.read()                                                  # Read the current cell's value
                 instruction = self.instructions.getInstruction(self.state, cell)    # Get the instruction
 
                 # If transition not defined:
@@ -377,6 +417,13 @@ class Machine:
 
                 written, direction, next, index = instruction   # Parse instruction
 
+                if self.counters is not None:                   # Count the step for the heatmap
+                    self.count(cell, written, index)
+
+                # Record the step (the head does not move on the final step)
+                if self.history is not None:
+                    self.history.record(next, 0 if next in self.acceptStates else {'l':-1, 'r':1}[direction])
+
                 # Update internal attributes
                 self.next = next
                 self.direction = direction
@@ -435,6 +482,79 @@ class Machine:
 
         return 'standby'    # Machine is waiting for a nudge
 
+# Multi Machine class - a Machine with several tapes (see multitape.py), which are drawn stacked above each other
+# with a head each (tape 1 at the top). Every head reads, writes and moves in the same step. Steps are not
+# recorded, so the machine cannot be stepped backwards.
+class MultiMachine(Machine):
+    def __init__(self, instructions, tapes, startState, acceptStates, startPositions, palette, instructionTable, speed=1):
+        super().__init__(instructions, tapes[0], startState, acceptStates, startPositions[0], palette, instructionTable, speed, None)
+
+        self.tapes = tapes                          # List of tape objects
+        self.positions = list(startPositions)       # Position of each head
+        self.moving = None                          # The directions that the heads are moving in (during the move head animation)
+
+    # Returns the values of the cells under the heads (as a tuple)
+    def read(self):
+        return tuple(tape.get(pos) for tape, pos in zip(self.tapes, self.positions))
+
+    # Records a step into the counters (cells are only counted on the first tape)
+    def count(self, cells, written, index):
+        self.counters.record(index, self.positions[0], written[0] != cells[0])
+
+    # Actually writes values to the tapes
+    def writeAct(self):
+        for tape, pos, char in zip(self.tapes, self.positions, self.written):
+            tape.set(pos, char)
+
+    # Called each tick that the machine is writing to the tapes (chars has one value per tape)
+    def write(self, chars, animate=True):
+        if animate:
+            if self.animating is None:
+                self.animating = 'w'                # The values being written are drawn from self.written
+        else:
+            self.writeAct()
+
+    # Actually moves the heads across the tapes
+    def moveHeadAct(self, direction):
+        self.positions = [pos + MOVES[d] for pos, d in zip(self.positions, self.moving)]
+        self.moving = None
+
+    # Called each tick that the machine is moving the heads across the tapes
+    # (directions has one direction per tape, or is a single direction to move every head in)
+    def moveHead(self, directions, animate=True):
+        if self.animating is not None:
+            return
+        if isinstance(directions, str):
+            directions = [directions] * len(self.tapes)
+        self.moving = list(directions)
+
+        if animate and any(d != 's' for d in directions):   # If any head is actually moving:
+            self.animating = 'mr'                           # Animate the tape offset parameter from 0 to -1
+        else:
+            self.moveHeadAct(None)
+
+    # Draws the machine, tapes and instruction table onto the display
+    def draw(self, display, fonts, palette, dim, centre, cellSize, drawDetail=False):
+        # = Instruction Table =
+        self.instructionTable.draw(display, fonts, palette, self.instructionIndex, self.anim['instructionTableOffset'])
+
+        offset = self.anim['tapeOffset']
+        writing = not self.animating is None and self.animating[0] == 'w'
+
+        # For each tape (tape 1 at the top):
+        for i, (tape, pos) in enumerate(zip(self.tapes, self.positions)):
+            tapeCentre = (centre[0], centre[1] - (len(self.tapes)-1-i) * 5*cellSize//2)
+
+            move = 0 if self.moving is None else MOVES[self.moving[i]]
+            written = None
+            if writing:                                     # If in the middle of the write animation:
+                written = self.written[i]
+                if written is None:
+                    written = tape.getBlank()
+
+            self.drawTape(display, fonts, palette, dim, tapeCentre, cellSize, tape, pos, offset*move, written, drawDetail)
+            self.drawHead(display, fonts, palette, tapeCentre, cellSize, drawDetail)
+
 # Instruction Table class - handles the graphics and animation of the instruction table
 class InstructionTable:
     def __init__(self, instructions, blankChar, centre, width, height, rowHeight):
@@ -447,6 +567,9 @@ class InstructionTable:
         self.rowHeight = rowHeight                  # Height of each row
 
         self.currentIndex = -1                      # Current instruction index (-1 means at the resting position)
+        self.counters = None                        # Counters to tint the rows with (see counters.py, None for no heatmap)
+        self.tiles = OrderedDict()                  # Rendered tile of each group of TILE_ROWS rows, least recently drawn first
+        self.maxTiles = ceil((height - rowHeight) / (TILE_ROWS * rowHeight)) + 2   # Number of tiles kept (every tile that can be visible at once, and one more)
 
     # Get the
     def getDrawOffsets(self, index):
@@ -474,6 +597,47 @@ class InstructionTable:
 
         return topScroll, arrowOffset
 
+    # Returns the tile with the given index, which has rows k*TILE_ROWS to (k+1)*TILE_ROWS - 1 drawn onto it (their
+    # instruction numbers, labels and bottom borders), rendering it if it is not kept
+    # Tiles are rendered once and then blitted at the scroll offset every frame, so drawing the table takes the same
+    # time however many instructions it has
+    def getTile(self, k, fonts, palette):
+        tile = self.tiles.get(k)
+        if tile is not None:
+            self.tiles.move_to_end(k)
+            return tile
+
+        width = self.width
+        rowHeight = self.rowHeight
+        rows = self.instructions[k*TILE_ROWS:(k+1)*TILE_ROWS]
+
+        # Transparent in the colour of the labels, so that their antialiased edges blend with whatever is beneath
+        tile = pygame.Surface((width, ceil(len(rows) * rowHeight) + 1), pygame.SRCALPHA)
+        tile.fill(tuple(palette['main']) + (0,))
+
+        # For each instruction on the tile:
+        for j, i in enumerate(rows):
+            y = (j+0.5) * rowHeight                                                                             # Calculate y coordinate of center of row
+            drawCentredText(tile, str(k*TILE_ROWS + j + 1), fonts['table2'], palette['main'], (2.5*width/24, y))  # Draw instruction number
+
+            for x, part in enumerate(i):                                                                        # For each part of the instruction:
+                if part is None:                                                                                # If part is the blank character:
+                    part = self.blankChar                                                                       # Set part to blank character
+                elif isinstance(part, list):                                                                    # If part has one entry per tape:
+                    part = ','.join(self.blankChar if p is None else p for p in part)                           # Join the entries
+
+                xp = (3 + x*2) * width//12                                                                      # Calculate x coordinate of center of label
+                drawCentredText(tile, str(part), fonts['table1'], palette['main'], (xp, y))                     # Draw label for current part of instruction
+
+            yl = y + rowHeight/2                                                                                # Calculate y coordinate of bottom border of instruction
+            pygame.draw.line(tile, palette['main'], (2*width//12, yl), (width-1, yl))                           # Draw border
+
+        self.tiles[k] = tile
+        if len(self.tiles) > self.maxTiles: # Drop the least recently drawn tile
+            self.tiles.popitem(last=False)
+
+        return tile
+
     # Draws the instruction table
     def draw(self, display, fonts, palette, newIndex, animProg):
         if newIndex is None:                # If not in the middle of an animation:
@@ -500,27 +664,30 @@ class InstructionTable:
         animTopScroll = linearProgression(currentTopScroll, newTopScroll, animProg)         # Calculate top scroll for current frame of animation
         animArrowOffset = linearProgression(currentArrowOffset, newArrowOffset, animProg)   # Calculate arrow offset for current frame of animation
 
-        # For each instruction:
-        for n, i in enumerate(self.instructions):
-            y = animTopScroll + (n+0.5) * rowHeight                                                             # Calculate y coordinate of center of row
-
-            if top + rowHeight/2 < y < bottom + rowHeight/2:                                                    # If the row is withn the table viewing region:
-                drawCentredText(display, str(n+1), fonts['table2'], palette['main'], (left + 2.5*width/24, y))  # Draw instruction number
-
-                for x, part in enumerate(i):                                                                    # For each part of the instruction:
-                    if part is None:                                                                            # If part is the blank character:
-                        part = self.blankChar                                                                   # Set part to blank character
-
-                    xp = left + (3 + x*2) * self.width//12                                                      # Calculate x coordinate of center of label
-                    drawCentredText(display, str(part), fonts['table1'], palette['main'], (xp, y))              # Draw label for current part of instruction
-
-            yl = y + rowHeight/2                                                                                # Calculate y coordinate of bottom border of instruction
-            if top + rowHeight/2 < yl < bottom + rowHeight/2:                                                   # If border is within the viewing region:
-                pygame.draw.line(display, palette['main'], (left + 2*width//12, yl), (right-1, yl))             # Draw border
+        # Only draw within the table viewing region (rows slide under the header and out of the bottom)
+        clip = display.get_clip()
+        display.set_clip((left, top + rowHeight, width, viewHeight))
+
+        # Tint each visible row by its heat (underneath the tiles, which are transparent between their lines and labels)
+        if self.counters is not None:
+            first = max(0, floor((top - animTopScroll) / rowHeight))                     # Index of the first visible row
+            last = min(self.numInstructions, ceil((bottom - animTopScroll) / rowHeight))  # Index after the last visible row
+            for n in range(first, last):
+                heat = self.counters.getInstructionHeat(n)
+                if heat:
+                    y = animTopScroll + n * rowHeight
+                    pygame.draw.rect(display, getHeatColour(palette, heat), (left + 2*width//12, y + 1, 10*width//12, rowHeight - 1))
+
+        # Blit each visible tile of rows, rendering it if it has not been rendered yet
+        tileHeight = TILE_ROWS * rowHeight
+        first = max(0, floor((top + rowHeight - animTopScroll) / tileHeight))
+        last = min(ceil(self.numInstructions / TILE_ROWS), ceil((bottom - animTopScroll) / tileHeight))
+        for k in range(first, last):
+            display.blit(self.getTile(k, fonts, palette), (left, round(animTopScroll + k * tileHeight)))
+
+        display.set_clip(clip)
 
         pygame.draw.rect(display, palette['secondary'], (left + 2*width//12, top, 10*width//12, rowHeight))         # Header background
-        pygame.draw.rect(display, palette['bg'], (left, bottom, width, rowHeight))                                  # Bottom mask for rows that are sliding out of viewing region
-        pygame.draw.rect(display, palette['bg'], (left + 1*width//24, top, 3*width//24, rowHeight))                 #  Top-left mask for instruction numbers that are sliding out of viewing region
         pygame.draw.line(display, palette['main'], (left + 2*width//12, top), (right-1, top))                       # Header top border
         pygame.draw.line(display, palette['main'], (left + 2*width//12, top+rowHeight), (right-1, top+rowHeight))   # Header bottom border
 
@@ -556,9 +723,54 @@ class InstructionTable:
 def linearProgression(a, b, p):
     return a + p * (b-a)
 
+# Returns the colour of a heatmap tint with the given heat (from 0 to 1)
+def getHeatColour(palette, heat):
+    return tuple(round(linearProgression(b, h, heat)) for b, h in zip(palette['bg'], palette['heat']))
+
+# = Glyph cache =
+# Rendering text is the slowest part of drawing a frame, and the same few strings (cell characters, positions,
+# states and instruction table labels) are drawn in the same fonts and colours frame after frame, so each rendered
+# surface is kept, keyed by (string, font, colour), and blitted again instead of being rendered again.
+# When the surfaces take up more memory than the budget, the least recently drawn ones are dropped.
+class GlyphCache:
+    def __init__(self, budget=GLYPH_BUDGET):
+        self.surfaces = OrderedDict()   # Rendered surface of each key, least recently used first
+        self.budget = budget            # Maximum number of bytes used by the surfaces
+        self.size = 0                   # Number of bytes used by the surfaces
+
+    # Returns the surface of a string rendered in the given font and colour, rendering it if it is not cached
+    def render(self, string, font, colour):
+        key = (string, font, colour)
+        text = self.surfaces.get(key)
+        if text is not None:
+            self.surfaces.move_to_end(key)
+            return text
+
+        text = font.render(string, True, colour)
+        self.surfaces[key] = text
+        self.size += getSurfaceSize(text)
+
+        # Drop the least recently used surfaces (but never the new one) until the cache fits in its budget
+        while self.size > self.budget and len(self.surfaces) > 1:
+            key, dropped = self.surfaces.popitem(last=False)
+            self.size -= getSurfaceSize(dropped)
+
+        return text
+
+    # Drops every surface (when the fonts are regenerated)
+    def clear(self):
+        self.surfaces.clear()
+        self.size = 0
+
+# Returns the number of bytes used by a surface's pixels
+def getSurfaceSize(surface):
+    return surface.get_pitch() * surface.get_height()
+
+glyphCache = GlyphCache()
+
 # Draws text which is centered at the given coordinates
 def drawCentredText(display, string, font, colour, centre):
-    text = font.render(string, True, colour)
+    text = glyphCache.render(string, font, tuple(colour))
     rect = text.get_rect(center = centre)
     display.blit(text, rect)
 
@@ -579,10 +791,32 @@ def drawStatusIndicator(display, status):
     elif status == 'stopped':   # Stop symbol
         pygame.draw.rect(display, (0, 0, 0), (20, 20, 20, 20))
 
+# Returns the rectangle of the seek bar
+def getSeekBarRect(dim):
+    return pygame.Rect(20, dim[1]-30, dim[0]-40, 10)
+
+# Draws the seek bar, which shows the current step out of the furthest step reached
+def drawSeekBar(display, history, fonts, palette, dim, seekInput=None):
+    rect = getSeekBarRect(dim)
+    filled = rect.width * history.steps // max(1, history.furthest)     # Width of the part of the bar up to the current step
+
+    pygame.draw.rect(display, palette['secondary'], rect)
+    pygame.draw.rect(display, palette['main'], (rect.left, rect.top, filled, rect.height))
+
+    # Step label (or the step being typed in)
+    if seekInput is None:
+        label = 'Step {} / {}'.format(history.steps, history.furthest)
+    else:
+        label = 'Go to step: ' + seekInput + '_'
+    text = fonts['ui'].render(label, True, palette['main'])
+    display.blit(text, (rect.left, rect.top - text.get_height() - 4))
+
 # Draws everything onto the display
-def blitAll(machine, paused, display, clock, fonts, palette, dim, dimMachine, centreMachine, cellSize, drawDetail=False):
+def blitAll(machine, paused, display, clock, fonts, palette, dim, dimMachine, centreMachine, cellSize, drawDetail=False, seekInput=None):
     display.fill(palette['bg'])                                                             # Background
     machine.draw(display, fonts, palette, dimMachine, centreMachine, cellSize, drawDetail)  # Draws machine, tape and instruction table
+    if machine.history is not None:
+        drawSeekBar(display, machine.history, fonts, palette, dim, seekInput)               # Draws the seek bar
 
     if paused:                                                                              # If the simulation is paused:
         status = 'paused'
@@ -594,6 +828,7 @@ def blitAll(machine, paused, display, clock, fonts, palette, dim, dimMachine, ce
 def main(machine, display, FPS, clock, fonts, palette, dim, dimMachine, centreMachine, cellSize):
     paused = False                                          # Initialised paused flag
     drawDetail = False                                      # Initialise draw detail flag
+    seekInput = None                                        # Step number being typed in (None if not typing one)
 
     # Main loop
     while True:
@@ -602,10 +837,36 @@ def main(machine, display, FPS, clock, fonts, palette, dim, dimMachine, centreMa
                 pygame.quit()                               # Close pygame
                 return                                      # Finish loop
 
+            elif event.type == pygame.MOUSEBUTTONDOWN:      # If user clicked:
+                rect = getSeekBarRect(dim)
+                if event.button == 1 and rect.collidepoint(event.pos) and machine.canSeek():                 # If user clicked on the seek bar:
+                    machine.seek(round((event.pos[0] - rect.left) / rect.width * machine.history.furthest), palette)  # Jump to that step
+
             elif event.type == pygame.KEYDOWN:              # If user pressed a key:
-                if event.key == pygame.K_TAB:               # If user pressed TAB key:
+                if seekInput is not None:                   # If user is typing a step number:
+                    if event.key == pygame.K_RETURN:        # If user pressed RETURN key:
+                        if seekInput:
+                            machine.seek(int(seekInput), palette)   # Jump to the step
+                        seekInput = None
+                    elif event.key == pygame.K_ESCAPE:      # If user pressed ESCAPE key:
+                        seekInput = None                    # Stop typing
+                    elif event.key == pygame.K_BACKSPACE:   # If user pressed BACKSPACE key:
+                        seekInput = seekInput[:-1]          # Delete the last digit
+                    elif event.unicode.isdigit():           # If user typed a digit:
+                        seekInput += event.unicode          # Add the digit
+
+                elif event.key == pygame.K_TAB:             # If user pressed TAB key:
                     drawDetail = not drawDetail             # Toggle draw detail flag
 
+                elif event.key == pygame.K_h:               # If user pressed H key:
+                    machine.toggleHeatmap()                 # Show or hide the heatmap
+
+                elif event.key == pygame.K_BACKSPACE and machine.canSeek():     # If user pressed BACKSPACE key between steps:
+                    machine.seek(machine.history.steps - 1, palette)            # Step backwards
+
+                elif event.key == pygame.K_g and machine.canSeek():             # If user pressed G key between steps:
+                    seekInput = ''                                              # Start typing a step number
+
                 elif machine.running:                       # If the machine is running:
                     if not machine.isStandby():             # If the machine is not in standby:
                         if event.key == pygame.K_p:         # If the user pressed P key:
@@ -647,7 +908,7 @@ def main(machine, display, FPS, clock, fonts, palette, dim, dimMachine, centreMa
             fonts['cell'] = tapeFonts['cell']
 
         # Draw everything
-        blitAll(machine, paused, display, clock, fonts, palette, dim, dimMachine, centreMachine, cellSize, drawDetail)
+        blitAll(machine, paused, display, clock, fonts, palette, dim, dimMachine, centreMachine, cellSize, drawDetail, seekInput)
         pygame.display.update()
 
         clock.tick(FPS) # Maintain FPS
@@ -656,18 +917,33 @@ def main(machine, display, FPS, clock, fonts, palette, dim, dimMachine, centreMa
             machine.update(palette)     # Update the machine
 
 # Initialises and begins the simulation
-def run(instructions, acceptStates, startState, tape, startPos, blankChar, dim, cellSize, speed, FPS):
+def run(instructions, acceptStates, startState, tape, startPos, blankChar, dim, cellSize, speed, FPS, historyBudget=DEFAULT_BUDGET):
     pygame.init()                                                                                                                       # Initialise pygame
     pygame.display.set_caption('Turing Machine Simulator')                                                                              # Set window caption
 
     sim = initialise(dim, cellSize)     # Initialise simulation
 
-    instructionObj = Instructions(instructions)                                                                                                 # Create instructions object
-    tapeObj = Tape(blankChar, tape)                                                                                                             # Create tape object
+    tapeObj = ArrayTape(blankChar, tape)                                                                                                        # Create tape object
+    instructionObj = compileMachine(Instructions(instructions), acceptStates, startState, tapeObj)                                              # Create compiled instructions object
     instructionTableObj = InstructionTable(instructions, blankChar, sim['ITcentre'], sim['ITwidth'], sim['ITheight'], sim['ITrowHeight'])       # Create instruction table ovject
-    machineObj = Machine(instructionObj, tapeObj, startState, acceptStates, startPos, sim['palette'], instructionTableObj, speed)               # Create machine object
+    machineObj = Machine(instructionObj, tapeObj, startState, acceptStates, startPos, sim['palette'], instructionTableObj, speed, historyBudget)  # Create machine object
 
     main(machineObj, sim['display'], FPS, sim['clock'], sim['fonts'], sim['palette'], dim, sim['dimMachine'], sim['centreMachine'], cellSize)   # Begin main loop
 
+# Initialises and begins the simulation of a multi-tape machine (tapes and startPositions have one entry per tape)
+def runMulti(instructions, acceptStates, startState, tapes, startPositions, blankChar, dim, cellSize, speed, FPS):
+    pygame.init()
+    pygame.display.set_caption('Turing Machine Simulator')
+
+    sim = initialise(dim, cellSize)
+
+    tapeObjs = createTapes(blankChar, tapes)
+    instructionObj = MultiInstructions(instructions)
+    instructionTableObj = InstructionTable(instructions, blankChar, sim['ITcentre'], sim['ITwidth'], sim['ITheight'], sim['ITrowHeight'])
+    machineObj = MultiMachine(instructionObj, tapeObjs, startState, acceptStates, startPositions, sim['palette'], instructionTableObj, speed)
+
+    main(machineObj, sim['display'], FPS, sim['clock'], sim['fonts'], sim['palette'], dim, sim['dimMachine'], sim['centreMachine'], cellSize)
+
 # Debugging example
-run(((0, None, '#', 'r', 0),(0, ':', 'o', 'l', 0), (0, '#', '[', 'r', 0)), (), 0, {'2':':'}, 0, '', (800, 600), 50, 1, 100)
+if __name__ == '__main__':
+    run(((0, None, '#', 'r', 0),(0, ':', 'o', 'l', 0), (0, '#', '[', 'r', 0)), (), 0, {'2':':'}, 0, '', (800, 600), 50, 1, 100)
@@ -0,0 +1,85 @@
+# Returns the sweep transitions of an Instructions object: for every state that, reading some value, writes the
+# same value back, moves and stays in the same state, the direction it moves in ({(state, value): direction})
+# While the machine is in such a state on a run of cells with that value, it just moves along the run
+def getSweeps(instructions, acceptStates):
+    sweeps = {}
+    for state, stateSet in instructions.instructions.items():
+        for read, (written, direction, next, index) in stateSet.items():
+            if written == read and next == state and next not in acceptStates:
+                sweeps[(state, read)] = {'l':-1, 'r':1}[direction]
+
+    return sweeps
+
+# Runs an engine (see engine.Engine, which must use a tapes.RunLengthTape) until it halts or until maxSteps more
+# steps have been executed (None for no limit), and returns the halt reason
+#
+# Whenever the machine is in a sweep (see getSweeps), the head jumps straight to the end of the run of cells that
+# it is sweeping over, and the steps it skipped are added to the step count, so a sweep takes O(log runs) time
+# however long the run is. If the machine would sweep over blank cells forever, it halts with the reason 'loop'.
+def runSweeping(engine, maxSteps=None):
+    if not engine.running:
+        return engine.halt
+
+    # Local references to avoid attribute lookups in the main loop
+    table = engine.instructions.instructions
+    tape = engine.tape
+    acceptStates = engine.acceptStates
+    sweeps = getSweeps(engine.instructions, acceptStates)
+    moves = {'l':-1, 'r':1}
+
+    state = engine.state
+    pos = engine.pos
+    steps = engine.steps
+    end = None if maxSteps is None else steps + maxSteps
+    halt = 'limit'
+
+    while steps != end:
+        cell = tape.get(pos)
+
+        # If sweeping, skip to the end of the run
+        direction = sweeps.get((state, cell))
+        if direction is not None:
+            length = tape.getRunLength(pos, direction)
+            if length is None:                              # If sweeping into the blank tape forever:
+                if end is None:
+                    halt = 'loop'
+                    engine.loopPeriod = 1
+                    engine.loopShift = direction
+                    engine.loopStart = steps
+                    break
+                length = end - steps
+            elif end is not None:
+                length = min(length, end - steps)
+
+            pos += direction * length
+            steps += length
+            continue
+
+        stateSet = table.get(state)                         # Get the instructions for the current state
+        instruction = None if stateSet is None else stateSet.get(cell)
+
+        # If transition not defined:
+        if instruction is None:
+            halt = 'crash'
+            break
+
+        written, direction, state, index = instruction      # Parse instruction
+        tape.set(pos, written)
+        steps += 1
+
+        # If reached an accept state:
+        if state in acceptStates:
+            halt = 'accept'
+            break
+
+        pos += moves[direction]
+
+    # Store the final configuration
+    engine.state = state
+    engine.pos = pos
+    engine.steps = steps
+    engine.halt = halt
+    if halt != 'limit':
+        engine.running = False
+
+    return halt
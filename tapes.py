@@ -0,0 +1,407 @@
+import mmap
+import os
+from array import array
+from bisect import bisect_right
+from collections.abc import MutableMapping
+
+# Array Tape class - a drop-in replacement for engine.Tape that stores cells in integer arrays
+#
+# Symbols are interned to small integers (0 is always the blank cell) and cells are stored in two
+# growable arrays, one for each direction from the origin:
+#   right[i] holds the cell at position i     (i >= 0)
+#   left[i]  holds the cell at position -i-1  (i >= 0)
+# The string-keyed dictionary used by the .tape format is only built when loading and saving.
+class ArrayTape:
+    typecode = 'H'  # Unsigned 16-bit cells (up to 65536 distinct symbols)
+
+    def __init__(self, blank, definition={}):
+        self.blank = blank              # Set blank character
+        self.symbols = [None]           # Symbol for each code (code 0 is the blank cell)
+        self.codes = {None:0}           # Code for each symbol
+        self.right = array(self.typecode)
+        self.left = array(self.typecode)
+
+        # Copy the cells of a tape that is already array-backed directly
+        if isinstance(definition, TapeDictionary):
+            source = definition.tape
+            self.symbols = list(source.symbols)
+            self.codes = dict(source.codes)
+            self.right = array(self.typecode, source.right)
+            self.left = array(self.typecode, source.left)
+            return
+
+        # Copy the dictionary that stores the values of (non-blank) cells
+        for pos, char in definition.items():
+            self.set(int(pos), char)
+
+    # Returns the code for the given symbol, interning it if it has not been seen before
+    def intern(self, char):
+        code = self.codes.get(char)
+        if code is None:                        # If the symbol is new:
+            code = len(self.symbols)
+            if code >= 1 << (8*array(self.typecode).itemsize):
+                raise ValueError('Too many distinct tape symbols')
+            self.symbols.append(char)
+            self.codes[char] = code
+
+        return code
+
+    # Makes sure that the given array has a cell at the given index (grows by at least doubling)
+    def grow(self, cells, index):
+        size = len(cells)
+        if index >= size:
+            newSize = max(index + 1, 2*size, 16)
+            cells.frombytes(bytes((newSize - size) * cells.itemsize))
+
+    # Gets the code of the cell at the given position (0 if the cell is blank)
+    def getCode(self, pos):
+        if pos >= 0:
+            cells = self.right
+        else:
+            cells = self.left
+            pos = -pos - 1
+
+        if pos < len(cells):
+            return cells[pos]
+        return 0
+
+    # Sets the code of the cell at the given position
+    def setCode(self, pos, code):
+        if pos >= 0:
+            cells = self.right
+        else:
+            cells = self.left
+            pos = -pos - 1
+
+        self.grow(cells, pos)
+        cells[pos] = code
+
+    # Gets the value of the cell at the given position (returns NoneType if cell is blank)
+    def get(self, pos):
+        return self.symbols[self.getCode(pos)]
+
+    # Sets the value of the cell at the given position to the given value
+    def set(self, pos, char):
+        self.setCode(pos, self.intern(char))
+
+    # Returns the string that represents a blank cell
+    def getBlank(self):
+        return self.blank
+
+    # Returns the tape as a dictionary in the .tape format (blank cells are not stored)
+    def toDict(self):
+        symbols = self.symbols
+        definition = {}
+
+        for i in range(len(self.left)-1, -1, -1):   # Negative positions (in increasing order)
+            code = self.left[i]
+            if code:
+                definition[str(-i-1)] = symbols[code]
+
+        for i, code in enumerate(self.right):       # Non-negative positions
+            if code:
+                definition[str(i)] = symbols[code]
+
+        return definition
+
+    # The string-keyed dictionary of non-blank cells (built on demand, for compatibility with engine.Tape)
+    @property
+    def definition(self):
+        return self.toDict()
+
+# Tape Dictionary class - a view of an ArrayTape as the string-keyed dictionary of non-blank cells used by the
+# .tape format, so that code written for tape dictionaries (such as the editor) can hold a large tape without
+# building one (setting a cell to NoneType or deleting it makes it blank)
+class TapeDictionary(MutableMapping):
+    def __init__(self, tape):
+        self.tape = tape    # ArrayTape that holds the cells
+
+    def __getitem__(self, key):
+        char = self.tape.get(int(key))
+        if char is None:
+            raise KeyError(key)
+
+        return char
+
+    def __setitem__(self, key, char):
+        self.tape.set(int(key), char)
+
+    def __delitem__(self, key):
+        if self.tape.getCode(int(key)) == 0:
+            raise KeyError(key)
+
+        self.tape.setCode(int(key), 0)
+
+    def __contains__(self, key):
+        try:
+            return self.tape.getCode(int(key)) != 0
+        except (TypeError, ValueError):
+            return False
+
+    # Iterates over the positions of the non-blank cells (in increasing order)
+    def __iter__(self):
+        left = self.tape.left
+        for i in range(len(left)-1, -1, -1):
+            if left[i]:
+                yield str(-i-1)
+
+        for i, code in enumerate(self.tape.right):
+            if code:
+                yield str(i)
+
+    def __len__(self):
+        tape = self.tape
+        return len(tape.left) - tape.left.count(0) + len(tape.right) - tape.right.count(0)
+
+# Run Length Tape class - a drop-in replacement for engine.Tape that stores runs of identical cells
+#
+# Each run of identical non-blank cells is stored as (start, end, char): the position of its first cell, the
+# position after its last cell, and the value of its cells. Runs never overlap, and adjacent runs always have
+# different values, so memory is proportional to the number of runs.
+#
+# The runs are split into two stacks at a cursor (a gap buffer), each stored as three parallel lists:
+#   leftStarts, leftEnds, leftChars:    the runs that start at or before the cursor, in order
+#   rightStarts, rightEnds, rightChars: the runs that start after the cursor, in reverse order
+# so the runs on either side of the cursor are at the ends of the lists. Every access first moves the cursor to
+# the position being accessed (moving the runs in between from one stack to the other, which is O(1) when the
+# position is near the cursor), and then reads, splits or merges only the runs at the ends of the stacks, so reads
+# and writes near the head are O(1) however many runs there are.
+class RunLengthTape:
+    def __init__(self, blank, definition={}):
+        self.blank = blank      # Set blank character
+        self.leftStarts = []
+        self.leftEnds = []
+        self.leftChars = []
+        self.rightStarts = []
+        self.rightEnds = []
+        self.rightChars = []
+
+        # Build the runs from the dictionary that stores the values of (non-blank) cells (with the cursor after them)
+        for pos, char in sorted((int(pos), char) for pos, char in definition.items() if char is not None):
+            if self.leftEnds and self.leftEnds[-1] == pos and self.leftChars[-1] == char:  # If the cell extends the last run:
+                self.leftEnds[-1] += 1
+            else:
+                self.leftStarts.append(pos)
+                self.leftEnds.append(pos + 1)
+                self.leftChars.append(char)
+
+    # Moves the cursor to the given position, so that every run on the left starts at or before it and every run
+    # on the right starts after it (the last run on the left is then the only one that can contain it)
+    def seek(self, pos):
+        leftStarts, rightStarts = self.leftStarts, self.rightStarts
+
+        # Move the runs that start after the position to the right
+        if leftStarts and leftStarts[-1] > pos:
+            i = bisect_right(leftStarts, pos)
+            for left, right in ((leftStarts, rightStarts), (self.leftEnds, self.rightEnds), (self.leftChars, self.rightChars)):
+                right.extend(reversed(left[i:]))
+                del left[i:]
+
+        # Move the runs that start at or before the position to the left
+        elif rightStarts and rightStarts[-1] <= pos:
+            i = bisectDescending(rightStarts, pos)
+            for left, right in ((leftStarts, rightStarts), (self.leftEnds, self.rightEnds), (self.leftChars, self.rightChars)):
+                left.extend(reversed(right[i:]))
+                del right[i:]
+
+    # Returns whether the cell at the given position is within a run (after moving the cursor to it)
+    def isInRun(self, pos):
+        self.seek(pos)
+        return bool(self.leftEnds) and pos < self.leftEnds[-1]
+
+    # Gets the value of the cell at the given position (returns NoneType if cell is blank)
+    def get(self, pos):
+        if self.isInRun(pos):
+            return self.leftChars[-1]
+        return None
+
+    # Sets the value of the cell at the given position to the given value
+    def set(self, pos, char):
+        leftStarts, leftEnds, leftChars = self.leftStarts, self.leftEnds, self.leftChars
+
+        # If the cell is within a run, split the run around the cell
+        if self.isInRun(pos):
+            old = leftChars[-1]
+            if old == char:
+                return
+
+            start = leftStarts.pop()
+            end = leftEnds.pop()
+            leftChars.pop()
+            if start < pos:
+                leftStarts.append(start)
+                leftEnds.append(pos)
+                leftChars.append(old)
+            if pos + 1 < end:
+                self.rightStarts.append(pos + 1)
+                self.rightEnds.append(end)
+                self.rightChars.append(old)
+
+        if char is None:    # Blank cells are not stored (so there is nothing to merge)
+            return
+
+        # Add a run for the cell, merging it with the runs on either side if they have the same value
+        if leftEnds and leftEnds[-1] == pos and leftChars[-1] == char:
+            leftEnds[-1] = pos + 1
+        else:
+            leftStarts.append(pos)
+            leftEnds.append(pos + 1)
+            leftChars.append(char)
+
+        if self.rightStarts and self.rightStarts[-1] == pos + 1 and self.rightChars[-1] == char:
+            self.rightStarts.pop()
+            leftEnds[-1] = self.rightEnds.pop()
+            self.rightChars.pop()
+
+    # Returns the number of cells from the given position (inclusive) in the given direction (-1 or 1) that have
+    # the same value as it, or None if they go on forever (blank cells beyond the last run in that direction)
+    def getRunLength(self, pos, direction):
+        # If the cell is within a run:
+        if self.isInRun(pos):
+            return self.leftEnds[-1] - pos if direction == 1 else pos - self.leftStarts[-1] + 1
+
+        # Otherwise the cell is in a gap of blank cells between runs
+        if direction == 1:
+            return self.rightStarts[-1] - pos if self.rightStarts else None
+        return pos - self.leftEnds[-1] + 1 if self.leftEnds else None
+
+    # Returns the string that represents a blank cell
+    def getBlank(self):
+        return self.blank
+
+    # Returns the number of runs stored
+    def getRunCount(self):
+        return len(self.leftStarts) + len(self.rightStarts)
+
+    # Returns an iterator over the runs, in order, as (start, end, char)
+    def getRuns(self):
+        yield from zip(self.leftStarts, self.leftEnds, self.leftChars)
+        yield from zip(reversed(self.rightStarts), reversed(self.rightEnds), reversed(self.rightChars))
+
+    # Returns the tape as a dictionary in the .tape format (blank cells are not stored)
+    def toDict(self):
+        definition = {}
+        for start, end, char in self.getRuns():
+            for pos in range(start, end):
+                definition[str(pos)] = char
+
+        return definition
+
+    # The string-keyed dictionary of non-blank cells (built on demand, for compatibility with engine.Tape)
+    @property
+    def definition(self):
+        return self.toDict()
+
+# Returns the index of the first value that is at or before the given position in a list sorted in reverse order
+def bisectDescending(values, pos):
+    low, high = 0, len(values)
+    while low < high:
+        middle = (low + high) // 2
+        if values[middle] <= pos:
+            high = middle
+        else:
+            low = middle + 1
+
+    return low
+
+CHARS = [None] + [chr(byte) for byte in range(1, 256)]   # Symbol for each byte value (the latin-1 character with that code, or blank for 0)
+
+# Mmap Tape class - a drop-in replacement for engine.Tape that reads its cells straight from a raw binary file
+#
+# The file is memory-mapped (read-only) and each field of width bytes is a cell: the cell at position i (i >= 0)
+# is bytes i*width to (i+1)*width of the file, as a string with one character per byte (as in the latin-1
+# encoding, so the byte 0x41 is the symbol 'A'). A cell whose bytes are all zero is blank, as are cells past the
+# end of the file and at negative positions (so blank cells are saved as zero bytes, and read back as blank).
+# Cells are only read (through a memoryview) when they are accessed, so a file of any size can be used without
+# being loaded into memory.
+#
+# Writes never change the file: they are stored in an overlay dictionary of the cells that have been written
+# (copy-on-write), which takes priority over the file, so memory is proportional to the number of cells written.
+class MmapTape:
+    def __init__(self, blank, path, width=1):
+        self.blank = blank      # Set blank character
+        self.width = width      # Number of bytes in each cell
+        self.overlay = {}       # Value of each cell that has been written (key: position (int))
+
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)    # The mapping stays valid after the file is closed
+            else:
+                self.map = b''                                                  # Empty files cannot be mapped
+
+        self.view = memoryview(self.map)
+        self.size = len(self.view) // width     # Number of cells in the file (a partial cell at the end is ignored)
+        self.zero = bytes(width)                # Bytes of a blank cell
+
+    # Gets the value of the cell at the given position (returns NoneType if cell is blank)
+    def get(self, pos):
+        overlay = self.overlay
+        if pos in overlay:
+            return overlay[pos]
+
+        if 0 <= pos < self.size:
+            if self.width == 1:
+                return CHARS[self.view[pos]]
+            i = pos * self.width
+            cell = self.view[i:i+self.width]
+            return None if cell == self.zero else str(cell, 'latin-1')
+
+        return None
+
+    # Sets the value of the cell at the given position to the given value
+    def set(self, pos, char):
+        self.overlay[pos] = char
+
+    # Returns the string that represents a blank cell
+    def getBlank(self):
+        return self.blank
+
+    # Returns the cells that have been written (in the .tape format, but including cells that were made blank as NoneType)
+    def getChanges(self):
+        return {str(pos):self.overlay[pos] for pos in sorted(self.overlay)}
+
+    # Writes the tape (the file with the written cells applied) to a raw binary file in the same format
+    # Blank cells (and the cells between the end of the file and the last written cell) are written as zero bytes,
+    # and every written value must be width characters of latin-1
+    def save(self, path):
+        width = self.width
+        end = max([self.size] + [pos + 1 for pos, char in self.overlay.items() if char is not None])
+        if any(pos < 0 and char is not None for pos, char in self.overlay.items()):
+            raise ValueError('Cells at negative positions cannot be saved')
+
+        with open(path, 'wb') as file:
+            # Copy the file in chunks, then pad it with blank cells
+            chunk = 1 << 24
+            for i in range(0, self.size * width, chunk):
+                file.write(self.view[i:min(i + chunk, self.size * width)])
+            file.write(bytes((end - self.size) * width))
+
+            # Apply the written cells
+            for pos, char in sorted(self.overlay.items()):
+                if pos < 0:
+                    continue
+                data = self.zero if char is None else char.encode('latin-1')
+                if len(data) != width:
+                    raise ValueError('Cell value {!r} is not {} bytes long'.format(char, width))
+                file.seek(pos * width)
+                file.write(data)
+
+    # Releases the memory map
+    def close(self):
+        self.view.release()
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+
+    # Returns the tape as a dictionary in the .tape format (blank cells are not stored)
+    # (this reads every cell of the file, so it should be avoided for large files)
+    def toDict(self):
+        definition = {str(pos):self.get(pos) for pos in range(self.size)}
+        for pos in sorted(self.overlay):
+            definition[str(pos)] = self.overlay[pos]
+
+        return {pos:char for pos, char in definition.items() if char is not None}
+
+    # The string-keyed dictionary of non-blank cells (built on demand, for compatibility with engine.Tape)
+    @property
+    def definition(self):
+        return self.toDict()
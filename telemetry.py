@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import sys
+import time
+from math import ceil
+from engine import createEngine
+from tapes import ArrayTape, RunLengthTape, MmapTape
+
+try:
+    import resource     # Not available on Windows
+except ImportError:
+    resource = None
+
+CHUNK = 1 << 16     # Number of steps run between checks of the clock
+
+# = Telemetry samples =
+# A sample is taken every interval seconds while a machine runs (and once when it stops), as a dictionary:
+#   time:       seconds since the run started
+#   steps:      number of steps executed so far
+#   rate:       steps per second since the previous sample
+#   extent:     [lowest, highest] position of a non-blank cell (NoneType if the tape is blank)
+#   nonBlank:   number of non-blank cells (NoneType if it cannot be counted without reading the whole tape)
+#   rss:        resident memory of the process in bytes (NoneType if it cannot be measured)
+#   halt:       halt reason (only in the last sample, NoneType in the others)
+# The engine runs a chunk of steps at a time at full speed (see engine.Engine.advance), and the clock is only
+# checked between chunks, so taking samples does not slow the machine down.
+
+# Returns the extent and number of non-blank cells of a tape (see above)
+def getTapeStats(tape):
+    if isinstance(tape, ArrayTape):
+        itemsize = tape.right.itemsize
+        left = tape.left.tobytes()
+        right = tape.right.tobytes()
+        nonBlank = len(tape.left) - tape.left.count(0) + len(tape.right) - tape.right.count(0)
+        if not nonBlank:
+            return None, 0
+
+        # Positions of the outermost non-blank cells (a non-blank cell can have zero bytes, so the number of
+        # cells is rounded up after stripping zeros from the end, and down after stripping them from the start)
+        lowest = -ceil(len(left.rstrip(b'\0')) / itemsize)
+        if lowest == 0:
+            lowest = (len(right) - len(right.lstrip(b'\0'))) // itemsize
+        highest = ceil(len(right.rstrip(b'\0')) / itemsize) - 1
+        if highest < 0:
+            highest = -((len(left) - len(left.lstrip(b'\0'))) // itemsize) - 1
+
+        return [lowest, highest], nonBlank
+
+    if isinstance(tape, RunLengthTape):
+        runs = list(tape.getRuns())
+        if not runs:
+            return None, 0
+        return [runs[0][0], runs[-1][1] - 1], sum(end - start for start, end, char in runs)
+
+    if isinstance(tape, MmapTape):      # Counting would mean reading the whole file, so only the extent is given
+        positions = [pos for pos, char in tape.overlay.items() if char is not None]
+        if tape.size:
+            positions += [0, tape.size - 1]
+        if not positions:
+            return None, None
+        return [min(positions), max(positions)], None
+
+    positions = [int(pos) for pos, char in tape.definition.items() if char is not None]
+    if not positions:
+        return None, 0
+    return [min(positions), max(positions)], len(positions)
+
+# Returns the resident memory of the process in bytes (the peak if the current value cannot be read), or NoneType
+def getRSS():
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024   # Bytes on macOS, kilobytes elsewhere
+
+# Returns a sample of an engine's progress (see above), given the time and steps of the previous sample
+def getSample(engine, start, now, previousTime, previousSteps):
+    extent, nonBlank = getTapeStats(engine.tape)
+    elapsed = now - previousTime
+
+    return {
+    'time':now - start,
+    'steps':engine.steps,
+    'rate':(engine.steps - previousSteps) / elapsed if elapsed > 0 else None,
+    'extent':extent,
+    'nonBlank':nonBlank,
+    'rss':getRSS(),
+    'halt':None
+    }
+
+# Runs an engine until it halts or until maxSteps more steps have been executed (None for no limit), calling
+# report with a sample (see above) every interval seconds and once it stops
+# Returns the engine's result (see engine.Engine.run)
+def runWithTelemetry(engine, report, interval=1, maxSteps=None, detectLoops=False, detectCyclers=False):
+    end = None if maxSteps is None else engine.steps + maxSteps
+    start = sampled = time.monotonic()
+    sampledSteps = engine.steps
+
+    while True:
+        chunk = CHUNK if end is None else min(CHUNK, end - engine.steps)
+        halt = engine.advance(chunk, detectLoops, detectCyclers)
+        if halt != 'limit' or engine.steps == end:
+            break
+
+        now = time.monotonic()
+        if now - sampled >= interval:
+            report(getSample(engine, start, now, sampled, sampledSteps))
+            sampled = now
+            sampledSteps = engine.steps
+
+    sample = getSample(engine, start, time.monotonic(), sampled, sampledSteps)
+    sample['halt'] = engine.halt
+    report(sample)
+    return engine.getResult()
+
+# Returns a report function that writes each sample to the given file as a line of JSON
+def writeJsonLines(file):
+    def report(sample):
+        file.write(json.dumps(sample) + '\n')
+        file.flush()
+
+    return report
+
+# Usage: python telemetry.py <machine file> <tape file> [options] (see --help)
+# Samples are written as JSON lines to the output file (or to stderr), and the result to stdout
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a machine, reporting its progress at a fixed interval.')
+    parser.add_argument('machine', help='.machine file')
+    parser.add_argument('tape', help='.tape file')
+    parser.add_argument('--interval', type=float, default=1, help='seconds between samples')
+    parser.add_argument('--max-steps', type=int, default=None, help='step budget')
+    parser.add_argument('--output', default=None, help='JSON-lines file to write the samples to (stderr if not given)')
+    parser.add_argument('--loops', action='store_true', help='stop machines whose configuration repeats')
+    parser.add_argument('--cyclers', action='store_true', help='stop machines that repeat a pattern while drifting along the tape')
+    parser.add_argument('--sweep', action='store_true', help='use a run-length tape (see tapes.RunLengthTape)')
+    args = parser.parse_args(argv)
+
+    engine = createEngine(args.machine, args.tape, RunLengthTape if args.sweep else ArrayTape)
+
+    if args.output is None:
+        result = runWithTelemetry(engine, writeJsonLines(sys.stderr), args.interval, args.max_steps, args.loops, args.cyclers)
+    else:
+        with open(args.output, 'w') as file:
+            result = runWithTelemetry(engine, writeJsonLines(file), args.interval, args.max_steps, args.loops, args.cyclers)
+    print(json.dumps(result))
+
+if __name__ == '__main__':
+    main()
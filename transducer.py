@@ -0,0 +1,188 @@
+import re
+from array import array
+from compiler import CONTINUE, ACCEPT, CRASH
+
+# = Right-only machines =
+# A machine that only ever moves right reads each cell exactly once, so it behaves like a finite-state
+# transducer: it reads the tape from the head onwards as a stream of symbols and writes one symbol for each,
+# and once it is past the last non-blank cell it only ever reads blanks. Instead of stepping the head, the
+# cells are copied into one contiguous byte buffer (one byte per symbol code) and processed in a single pass.
+#
+# For each state, the symbols that it loops on (transitions that move right and stay in the same state) are
+# turned into a regular expression that matches a run of them and a bytes.translate table of what it writes
+# over them, so a whole run (such as a scanner skipping over its input) is processed in one C-level operation.
+
+# Returns the set of state codes from which the compiled machine can only ever move right (states that have
+# no left-moving transition, and whose transitions only lead to other such states or halt)
+def getRightOnlyStates(compiled):
+    if compiled.rightOnly is None:
+        width = compiled.width
+        outcomes, moves, nexts = compiled.outcomes, compiled.moves, compiled.nexts
+
+        states = set(range(len(compiled.stateNames)))
+        changed = True
+        while changed:
+            changed = False
+            for s in list(states):
+                for t in range(s*width, (s+1)*width):
+                    if outcomes[t] == CONTINUE and (moves[t] < 0 or nexts[t] not in states):
+                        states.discard(s)
+                        changed = True
+                        break
+
+        compiled.rightOnly = states
+
+    return compiled.rightOnly
+
+# Returns whether the compiled machine can be run as a transducer from the given state code
+def isRightOnly(compiled, state):
+    return compiled.width <= 256 and state in getRightOnlyStates(compiled)
+
+# Returns the (pattern, translation table) of each state code: pattern matches a run of symbols that the
+# state loops on (None if there are none), and the table maps each of them to the symbol written over it
+def getTables(compiled):
+    if compiled.transducerTables is None:
+        width = compiled.width
+        tables = []
+        for s in range(len(compiled.stateNames)):
+            table = bytearray(range(256))
+            loops = []
+            for c in range(width):
+                t = s*width + c
+                if compiled.outcomes[t] == CONTINUE and compiled.nexts[t] == s:
+                    table[c] = compiled.writes[t]
+                    loops.append(re.escape(bytes([c])))
+
+            pattern = re.compile(b'[' + b''.join(loops) + b']+') if loops else None
+            tables.append((pattern, bytes(table)))
+
+        compiled.transducerTables = tables
+
+    return compiled.transducerTables
+
+# Returns the symbol codes of the cells from position a up to (but not including) position b as a bytearray
+def readBuffer(tape, a, b):
+    cells = bytearray()
+    if a < 0:
+        low, high = -min(b, 0), -a
+        part = tape.left[low:high].tolist()
+        part += [0] * (high - low - len(part))  # Cells beyond the end of the array are blank
+        cells = bytearray(reversed(part))
+    if b > 0:
+        low = max(a, 0)
+        part = tape.right[low:b].tolist()
+        part += [0] * (b - low - len(part))
+        cells += bytearray(part)
+
+    return cells
+
+# Writes the given symbol codes to the cells from position a onwards
+def writeBuffer(tape, a, cells):
+    b = a + len(cells)
+    split = min(max(0, -a), len(cells))     # Number of cells at negative positions
+
+    if split:
+        tape.grow(tape.left, -a - 1)
+        tape.left[-a-split:-a] = array(tape.left.typecode, reversed(cells[:split]))
+    if split < len(cells):
+        tape.grow(tape.right, b - 1)
+        tape.right[a+split:b] = array(tape.right.typecode, list(cells[split:]))
+
+# Runs a compiled right-only machine (see isRightOnly) on its tape as a transducer from the given configuration,
+# until it halts or until maxSteps more steps have been executed (None for no limit)
+#
+# Returns the final state code, head position, step count and halt reason, and (period, shift, start step) if
+# the halt reason is 'loop', which it is when the machine would run into the blank tape forever without halting
+def runTransducer(compiled, state, pos, steps, maxSteps=None):
+    tape = compiled.tape
+    width = compiled.width
+    writes, nexts, outcomes = compiled.writes, compiled.nexts, compiled.outcomes
+    tables = getTables(compiled)
+
+    # Copy the cells from the head to the last non-blank cell (or as far as the step budget reaches), reading
+    # only as far as the budget so that each call costs time proportional to its steps rather than to the tape
+    end = None if maxSteps is None else steps + maxSteps
+    stop = max(len(tape.right), pos)
+    if end is not None:
+        stop = min(stop, pos + maxSteps)
+    cells = readBuffer(tape, pos, stop).rstrip(b'\0')
+
+    i = 0                   # Index of the head in the buffer
+    halt = None
+    loop = None
+
+    while True:
+        if steps == end:
+            halt = 'limit'
+            break
+        if i == len(cells):     # If the head has gone past the last non-blank cell:
+            break
+
+        # Process a run of symbols that the state loops on in one go
+        pattern, table = tables[state]
+        if pattern is not None:
+            match = pattern.match(cells, i)
+            if match is not None:
+                j = match.end() if end is None else min(match.end(), i + end - steps)
+                cells[i:j] = cells[i:j].translate(table)
+                steps += j - i
+                i = j
+                continue
+
+        t = state*width + cells[i]
+        outcome = outcomes[t]
+        if outcome == CRASH:            # If transition not defined:
+            halt = 'crash'
+            break
+
+        cells[i] = writes[t]            # Write
+        state = nexts[t]                # Change state
+        steps += 1
+        if outcome == ACCEPT:           # If reached an accept state:
+            halt = 'accept'
+            break
+
+        i += 1                          # Move head
+
+    # Beyond the last non-blank cell, the machine only reads blanks, so it either halts within one step per
+    # state or goes round a cycle of states forever
+    if halt is None:
+        seen = {}   # Index in the buffer at which each state was first seen
+        order = []  # States in the order they were seen
+        while steps != end:
+            if state in seen:           # If the machine is in a cycle:
+                cycle = cells[seen[state]:]
+                if end is None:
+                    halt = 'loop'
+                    loop = (len(cycle), len(cycle), steps - len(cycle))
+                    break
+
+                reps, extra = divmod(end - steps, len(cycle))
+                cells += cycle*reps + cycle[:extra]
+                state = order[len(order) - len(cycle) + extra]
+                i = len(cells)
+                steps = end
+                break
+            seen[state] = i
+            order.append(state)
+
+            t = state*width
+            outcome = outcomes[t]
+            if outcome == CRASH:
+                halt = 'crash'
+                break
+
+            cells.append(writes[t])
+            state = nexts[t]
+            steps += 1
+            if outcome == ACCEPT:
+                halt = 'accept'
+                break
+
+            i += 1
+
+        if halt is None:
+            halt = 'limit'
+
+    writeBuffer(tape, pos, cells)
+    return state, pos + i, steps, halt, loop